@@ -0,0 +1,4 @@
+"""
+离线基准 / 准确率测试：不需要游戏窗口
+python -m benchmarks.run            运行并打印 p50 / p95 / 吞吐 / 准确率
+"""
@@ -0,0 +1,177 @@
+"""
+纯函数校验：基准只看端到端准确率，这里盯住几个容易悄悄改坏的底层函数
+python -m benchmarks.checks          逐项打印，任一失败退出码为 1
+benchmarks.run 默认先跑一遍（--no-checks 跳过）
+- nms：重叠框只留高分、输出按分数降序
+- batch_match：FFT 批量匹配与 cv2.matchTemplate(TM_CCOEFF_NORMED) 一致
+- game_state.diff / Change.__str__：变化事件与文字
+- IntentTracker：跟踪结果与整区域搜索一致，只在该整搜的时候整搜
+- DigitReader：没有字形时置信度为 0（退回 EasyOCR）；从渲染的数字收集字形后不再需要 EasyOCR
+"""
+import sys
+import tempfile
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+BATCH_TOL = 1e-4        # FFT(float32) 与 matchTemplate 的最大允许差
+
+
+def _nms() -> List[str]:
+    from tools.img_tool import nms
+    out = []
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [30, 30, 10, 10], [31, 30, 10, 10]], np.float32)
+    scores = np.array([0.8, 0.9, 0.7, 0.6], np.float32)
+    keep = nms(boxes, scores, 0.3).tolist()
+    if keep != [1, 2]:
+        out.append(f"重叠框应只留高分的 [1, 2]，得到 {keep}")
+    keep = nms(boxes[[0, 2]], np.array([0.5, 0.9], np.float32)).tolist()
+    if keep != [1, 0]:
+        out.append(f"不重叠的框应全部保留并按分数降序 [1, 0]，得到 {keep}")
+    if len(nms(np.empty((0, 4), np.float32), np.empty(0, np.float32))):
+        out.append("空输入应返回空")
+    return out
+
+
+def _batch_match() -> List[str]:
+    from tools.img_tool import batch_match
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 255, size=(30, 40, 3), dtype=np.uint8)
+    hay = cv2.resize(small, (160, 120), interpolation=cv2.INTER_LINEAR)
+    out = []
+    for color in (True, False):
+        h = hay if color else cv2.cvtColor(hay, cv2.COLOR_BGR2GRAY)
+        tpls = [("crop", h[40:64, 50:82].copy()), ("other", h[5:25, 100:150][::-1].copy())]
+        maps = batch_match(h, tpls)
+        for key, tpl in tpls:
+            ref = cv2.matchTemplate(h, tpl, cv2.TM_CCOEFF_NORMED)
+            got = maps.get(key)
+            if got is None or got.shape != ref.shape:
+                out.append(f"{key}（{'彩色' if color else '灰度'}）：响应图尺寸 "
+                           f"{None if got is None else got.shape} != {ref.shape}")
+                continue
+            err = float(np.abs(got - ref).max())
+            if err > BATCH_TOL:
+                out.append(f"{key}（{'彩色' if color else '灰度'}）：与 matchTemplate 最大差 {err:.2e}")
+    return out
+
+
+def _game_state_diff() -> List[str]:
+    from tools.game_state import CardState, Change, EnemyState, GameState, PlayerState, diff
+    old = GameState(scene="battle", player=PlayerState(hp=50, energy=3),
+                    enemies=(EnemyState(1, "attack", "攻击", 100, 50, 0.9),),
+                    hand=(CardState(1, "1", "attack", "攻击", 1),))
+    new = GameState(scene="battle", player=PlayerState(hp=44, energy=3),
+                    enemies=(EnemyState(1, "attack", "攻击", 102, 51, 0.8),
+                             EnemyState(2, "defend", "防御", 300, 50, 0.9)))
+    out = []
+    want = [Change("player.hp", 50, 44), Change("enemy.2.intent", None, "defend"),
+            Change("hand.1", "攻击(1)", None)]
+    got = diff(old, new)
+    if got != want:
+        out.append(f"diff 应为 {want}，得到 {got}")
+    texts = [str(c) for c in want]
+    if texts != ["hp 50→44", "enemy 2 intent +defend", "hand 1 -攻击(1)"]:
+        out.append(f"Change 文字不对：{texts}")
+    if diff(old, old):
+        out.append("同一快照不应有变化")
+    if diff(old, GameState(scene="map", player=old.player, enemies=old.enemies, hand=old.hand)) \
+            != [Change("scene", "battle", "map")]:
+        out.append("共享子状态时应只报场景变化")
+    return out
+
+
+def _intent_tracker() -> List[str]:
+    from tools import layout
+    from tools.frame import Frame
+    from tools.match_enemy import IntentTracker, detect_intents, shot_enemy_color
+    from benchmarks import synth
+
+    rng = np.random.default_rng(0)
+    sample = synth.intent_samples(1, rng)[0]
+    frame = Frame(bgr=sample.bgr)
+    lay = layout.active()
+    if lay is not None and (lay.width, lay.height) != (frame.shape[1], frame.shape[0]):
+        layout.reset()
+
+    def keys(hits) -> List[Tuple[str, int, int]]:
+        return [(h.key, h.x, h.y) for h in hits]
+
+    out = []
+    tracker = IntentTracker()
+    first = tracker.update(frame, "battle")
+    full = detect_intents(shot_enemy_color(frame), tracker.threshold)
+    if keys(first) != keys(full):
+        out.append(f"首次应整区域搜索：{keys(first)} != {keys(full)}")
+    if [h.key for h in first] != sample.labels["intents"]:
+        out.append(f"意图不对：{[h.key for h in first]} != {sample.labels['intents']}")
+    second = tracker.update(frame, "battle")
+    if keys(second) != keys(first):
+        out.append(f"跟踪结果与整区域搜索不同：{keys(second)} != {keys(first)}")
+    if (tracker.full_searches, tracker.tracked_updates) != (1, 1):
+        out.append(f"同场景第二帧应走跟踪：full={tracker.full_searches} tracked={tracker.tracked_updates}")
+    if tracker.stats()["last_ratio"] >= 1.0:
+        out.append(f"跟踪搜索的像素应少于整区域：{tracker.stats()['last_ratio']:.2f}")
+    tracker.update(frame, "elite")
+    if tracker.full_searches != 2:
+        out.append("场景变化后应整区域搜索")
+    return out
+
+
+def _digit_reader() -> List[str]:
+    from tools.digit_reader import DIGIT_MIN_CONF, DigitReader
+    from benchmarks.synth import put_number
+
+    def rendered(value: int) -> np.ndarray:
+        img = np.zeros((48, 160, 3), np.uint8)
+        put_number(img, (0, 0, 160, 48), value)
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    out = []
+    with tempfile.TemporaryDirectory() as tmp:
+        reader = DigitReader(Path(tmp))
+        r = reader.read(rendered(42))
+        if r.conf != 0.0:
+            out.append(f"没有字形时置信度应为 0（由 EasyOCR 兜底），得到 {r.conf:.2f}")
+        # 模拟 EasyOCR 兜底后的自动收集
+        for text in ("1234", "5678", "90"):
+            reader.harvest(rendered(int(text)), text)
+        for value in (7, 42, 305, 999, 16, 80):
+            r = reader.read(rendered(value))
+            if r.value != value or r.conf < DIGIT_MIN_CONF:
+                out.append(f"{value} 读成 {r.value}（置信度 {r.conf:.2f}）")
+    return out
+
+
+CHECKS: Tuple[Tuple[str, Callable[[], List[str]]], ...] = (
+    ("nms", _nms),
+    ("batch_match", _batch_match),
+    ("game_state.diff", _game_state_diff),
+    ("IntentTracker", _intent_tracker),
+    ("DigitReader", _digit_reader),
+)
+
+
+def run_all(verbose: bool = False) -> List[str]:
+    """返回失败描述，空列表表示全部通过；单项抛异常也算失败"""
+    failures = []
+    for name, fn in CHECKS:
+        try:
+            errs = fn()
+        except Exception as e:
+            errs = [f"{type(e).__name__}: {e}"]
+        failures += [f"{name}: {e}" for e in errs]
+        if verbose:
+            print(f"[CHECK] {name:<18}{'通过' if not errs else '失败'}")
+    return failures
+
+
+if __name__ == "__main__":
+    fails = run_all(verbose=True)
+    for f in fails:
+        print(f"[CHECK] {f}")
+    sys.exit(1 if fails else 0)
@@ -0,0 +1,72 @@
+"""
+样本与截图替身
+1. 带标注的真实截图：benchmarks/corpus/ 下放截图 + labels.json
+   {
+     "battle_01.png": {
+       "scene": "battle",                               # SCENE_MAP 的键
+       "intents": ["attack1", "defend"],                # INTENT_MAP 的键，按从左到右
+       "card": {"type": "attack", "energy": 1},         # 当前选中的卡牌
+       "hand": [{"type": "attack", "cost": 1}, ...],    # 整手牌，按从左到右
+       "state": {"player_hp": 54, "gold": 99}           # 固定 ROI 数字，可只写一部分
+     }
+   }
+   每个识别器只在带有对应标注的样本上计时 / 计分
+2. synth.py 合成的样本，格式相同
+"""
+import json
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+from tools.capture import CaptureBackend, Region
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+LABELS_FILE = "labels.json"
+
+
+class Sample(NamedTuple):
+    name: str
+    bgr: np.ndarray                 # 全屏 BGR
+    labels: Dict[str, Any]
+
+
+def load_corpus(corpus_dir: Path = CORPUS_DIR) -> List[Sample]:
+    """读取标注截图；目录或 labels.json 不存在时返回空列表"""
+    labels_path = Path(corpus_dir) / LABELS_FILE
+    if not labels_path.exists():
+        return []
+    labels = json.loads(labels_path.read_text(encoding="utf-8"))
+    samples = []
+    for name, lab in sorted(labels.items()):
+        img = cv2.imread(str(Path(corpus_dir) / name), cv2.IMREAD_COLOR)
+        if img is None:
+            print(f"[WARN] 语料截图缺失：{name}")
+            continue
+        samples.append(Sample(name, img, lab))
+    return samples
+
+
+class FeedBackend(CaptureBackend):
+    """
+    截图替身：始终返回当前样本（区域截图裁当前样本）
+    基准里识别器即使自己补拍（例如意图共识补拍）也不会碰真实屏幕
+    """
+    name = "feed"
+
+    def __init__(self):
+        super().__init__()
+        self._current: Optional[np.ndarray] = None
+
+    def feed(self, bgr: np.ndarray):
+        self._current = bgr
+
+    def grab(self, region: Region = None, copy: bool = True) -> np.ndarray:
+        if self._current is None:
+            raise RuntimeError("FeedBackend 还没有喂入样本")
+        img = self._current
+        if region is not None:
+            x, y, w, h = region
+            img = img[y:y + h, x:x + w]
+        return img.copy() if copy else img
@@ -0,0 +1,411 @@
+"""
+识别器基准：截图换成 FeedBackend，逐样本计时并对照标注打分
+python -m benchmarks.run                              合成样本 + corpus/ 里的标注截图
+python -m benchmarks.run --n 20 --only scene intents
+python -m benchmarks.run --save-baseline              把结果写成 baseline.json
+python -m benchmarks.run --baseline benchmarks/baseline.json   与基线比较，退化时退出码为 1
+python -m benchmarks.run --trace trace.json           同时记录各阶段耗时并导出 Chrome trace
+python -m benchmarks.run --imports-only               只检查各模块的导入耗时
+python -m benchmarks.run --only intents intents_clf card card_clf   模板匹配与分类器后端并排比较
+python -m benchmarks.run --screens 2560x1440 1920x1080   合成样本的屏幕尺寸（默认两种都测）
+每个样本计时前清空 ROI 缓存、重置场景引擎，测的是“冷”路径
+样本尺寸和当前布局不同时先 layout.reset()，由识别器自己的调用路径重新选布局
+intents_live 不传帧，走截图后端，检查没有共享帧的调用路径也用对了布局
+纯函数校验（nms / batch_match / GameState.diff / IntentTracker）见 checks.py，默认一起跑，失败时退出码为 1
+第一次调用（读模板、建 OCR 识别器）单独记为 first_ms，不计入分位数；每种分辨率的第一个样本先空跑一次
+导入预算：每个模块在全新解释器里导入，超过 IMPORT_BUDGET_MS 或带进了重依赖都算失败（退出码 1）
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from tools import layout
+from tools.capture import set_backend
+from tools.config import INTENT_MAP, SCENE_MAP
+from tools.frame import Frame
+from tools.roi_cache import get_cache
+from tools import trace
+
+from benchmarks.corpus import CORPUS_DIR, FeedBackend, Sample, load_corpus
+from benchmarks import checks, synth
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+LATENCY_TOL = 0.5       # p50 比基线慢超过 50% 视为退化（不同机器请各自存基线）
+ACCURACY_TOL = 0.02
+
+# 短命的工作进程只做识别，导入这些模块不应该拖进 OCR / 键鼠 / 截图库
+IMPORT_MODULES = ("tools.match_scene", "tools.match_enemy", "tools.hand_parser",
+                  "tools.march_card", "tools.ocr_tool", "tools.perception", "tools.daemon",
+                  "tools.game_state", "tools.classifier")
+HEAVY_MODULES = ("easyocr", "torch", "pyautogui", "mss", "PIL.ImageGrab")
+IMPORT_BUDGET_MS = 1000.0
+IMPORT_REPEAT = 3       # 取最快一次，排除磁盘缓存等噪声
+
+
+class Recognizer(NamedTuple):
+    name: str
+    label: str                                      # 样本里需要的标注键
+    predict: Callable[[Frame], Any]
+    score: Callable[[Any, Dict[str, Any]], float]   # (预测, 标注) -> 0..1
+
+
+# ================= 识别器适配 =================
+def _intent_names(keys: List[str]) -> List[str]:
+    return [INTENT_MAP[k][0] for k in keys]
+
+
+def _scene() -> Recognizer:
+    from tools.match_scene import match_current_scene
+    from tools.scene_engine import get_engine
+
+    def predict(frame: Frame):
+        get_engine().reset()
+        return match_current_scene(frame)
+
+    return Recognizer("scene", "scene", predict,
+                      lambda pred, lab: float(pred == SCENE_MAP[lab["scene"]][0]))
+
+
+def _intents() -> Recognizer:
+    from tools.match_enemy import count_enemies_and_intent
+    return Recognizer("intents", "intents", lambda frame: count_enemies_and_intent(frame=frame)[1],
+                      lambda pred, lab: float(pred == _intent_names(lab["intents"])))
+
+
+def _intents_live() -> Recognizer:
+    from tools.match_enemy import count_enemies_and_intent
+    return Recognizer("intents_live", "intents", lambda _frame: count_enemies_and_intent()[1],
+                      lambda pred, lab: float(pred == _intent_names(lab["intents"])))
+
+
+def _card() -> Recognizer:
+    from tools.march_card import recognize_card_and_energy
+
+    def score(pred, lab) -> float:
+        _ok, _name, energy, card_type = pred
+        return (float(card_type == lab["card"]["type"]) + float(energy == lab["card"]["energy"])) / 2
+
+    return Recognizer("card", "card", lambda frame: recognize_card_and_energy(0, frame), score)
+
+
+def _hand() -> Recognizer:
+    from tools.hand_parser import parse_hand
+
+    def score(pred, lab) -> float:
+        want = [(c["type"], c["cost"]) for c in lab["hand"]]
+        got = [(c.type, c.cost) for c in pred]
+        # 按槽位逐张比较，多认 / 少认的牌都算错
+        return sum(a == b for a, b in zip(got, want)) / max(len(got), len(want), 1)
+
+    return Recognizer("hand", "hand", parse_hand, score)
+
+
+def _battle_state() -> Recognizer:
+    from tools.ocr_tool import battle_state
+    if importlib.util.find_spec("easyocr") is None:   # ocr_tool 延迟导入 easyocr，这里提前检查
+        raise ImportError("未安装 easyocr")
+
+    def score(pred, lab) -> float:
+        state = lab["state"]
+        hits = [pred.get(k) == v for k, v in state.items()]
+        if "intents" in lab:
+            hits.append(pred.get("enemy_intents") == _intent_names(lab["intents"]))
+        return sum(hits) / len(hits) if hits else 0.0
+
+    return Recognizer("battle_state", "state", battle_state, score)
+
+
+def _with_classifier(factory: Callable[[], Recognizer], name: str) -> Callable[[], Recognizer]:
+    """同一识别器只在 predict 期间改走分类器后端，报告里和模板匹配并排比较准确率 / 耗时"""
+    def make() -> Recognizer:
+        from tools import classifier
+        rec = factory()
+
+        def predict(frame: Frame):
+            was = classifier.enabled()
+            classifier.enable()
+            try:
+                return rec.predict(frame)
+            finally:
+                if not was:
+                    classifier.disable()
+
+        return rec._replace(name=name, predict=predict)
+
+    return make
+
+
+FACTORIES: Dict[str, Callable[[], Recognizer]] = {
+    "scene": _scene,
+    "intents": _intents,
+    "intents_live": _intents_live,
+    "intents_clf": _with_classifier(_intents, "intents_clf"),
+    "card": _card,
+    "card_clf": _with_classifier(_card, "card_clf"),
+    "hand": _hand,
+    "battle_state": _battle_state,
+}
+
+
+def load_recognizers(names: Optional[List[str]] = None) -> Tuple[List[Recognizer], Dict[str, str]]:
+    """导入失败的识别器（缺 easyocr / pyautogui 等）跳过并记下原因"""
+    recs, skipped = [], {}
+    for name in names or FACTORIES:
+        try:
+            recs.append(FACTORIES[name]())
+        except Exception as e:      # ImportError 以及导入时的初始化错误
+            skipped[name] = f"{type(e).__name__}: {e}"
+    return recs, skipped
+
+
+# ================= 计时 =================
+def _pct(ms: List[float], q: float) -> float:
+    return float(np.percentile(ms, q)) if ms else 0.0
+
+
+def bench(rec: Recognizer, samples: List[Sample], feed: FeedBackend) -> Dict[str, Any]:
+    samples = [s for s in samples if rec.label in s.labels]
+    if not samples:
+        return {"n": 0, "skipped": "没有带标注的样本"}
+    quiet = io.StringIO()
+
+    def timed(frame: Frame) -> Tuple[Any, float]:
+        with contextlib.redirect_stdout(quiet):      # 识别器的打印不计入耗时
+            t0 = time.perf_counter()
+            pred = rec.predict(frame)
+            dt = (time.perf_counter() - t0) * 1000
+        quiet.seek(0)
+        quiet.truncate()
+        return pred, dt
+
+    def feed_frame(s: Sample) -> Frame:
+        feed.feed(s.bgr)
+        get_cache().clear()
+        lay = layout.active()
+        if lay is not None and (lay.width, lay.height) != (s.bgr.shape[1], s.bgr.shape[0]):
+            layout.reset()
+        return Frame(bgr=s.bgr)
+
+    # 首次调用包含读模板、建识别器等一次性开销，单独记录；
+    # 换分辨率（换布局：模板重新缩放、分类器按新比例加载）后同样先空跑一次，不计入分位数
+    first_ms: Optional[float] = None
+    warmed = set()
+    ms: List[float] = []
+    scores: List[float] = []
+    misses: List[str] = []
+    for s in samples:
+        if s.bgr.shape[:2] not in warmed:
+            warmed.add(s.bgr.shape[:2])
+            _, dt = timed(feed_frame(s))
+            first_ms = dt if first_ms is None else first_ms
+        pred, dt = timed(feed_frame(s))
+        ms.append(dt)
+        sc = rec.score(pred, s.labels)
+        scores.append(sc)
+        if sc < 1.0:
+            misses.append(s.name)
+    total_s = sum(ms) / 1000
+    return {
+        "n": len(samples),
+        "first_ms": round(first_ms, 2),
+        "p50_ms": round(_pct(ms, 50), 2),
+        "p95_ms": round(_pct(ms, 95), 2),
+        "mean_ms": round(float(np.mean(ms)), 2),
+        "throughput_per_s": round(len(ms) / total_s, 2) if total_s else 0.0,
+        "accuracy": round(float(np.mean(scores)), 4),
+        "misses": misses,
+    }
+
+
+def run(samples: List[Sample], names: Optional[List[str]] = None) -> Dict[str, Any]:
+    feed = FeedBackend()
+    set_backend(feed)
+    recs, skipped = load_recognizers(names)
+    results: Dict[str, Any] = {name: {"n": 0, "skipped": why} for name, why in skipped.items()}
+    for rec in recs:
+        results[rec.name] = bench(rec, samples, feed)
+    return {
+        "meta": {"python": platform.python_version(), "machine": platform.machine(),
+                 "platform": platform.platform(), "samples": len(samples),
+                 "time": time.strftime("%Y-%m-%d %H:%M:%S")},
+        "recognizers": {name: results[name] for name in (names or FACTORIES) if name in results},
+    }
+
+
+# ================= 导入耗时 =================
+_IMPORT_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+ms = (time.perf_counter() - t0) * 1000
+print(json.dumps({{"ms": ms, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def import_times(modules: Tuple[str, ...] = IMPORT_MODULES,
+                 repeat: int = IMPORT_REPEAT) -> Dict[str, Dict[str, Any]]:
+    """每个模块在全新解释器里导入 repeat 次，记录最快耗时和被带进来的重依赖"""
+    out: Dict[str, Dict[str, Any]] = {}
+    for module in modules:
+        code = _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)
+        best: Optional[Dict[str, Any]] = None
+        for _ in range(repeat):
+            proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                                  capture_output=True, text=True)
+            if proc.returncode != 0:
+                err = proc.stderr.strip().splitlines()
+                best = {"error": err[-1] if err else f"退出码 {proc.returncode}"}
+                break
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            if best is None or r["ms"] < best["ms"]:
+                best = r
+        if "ms" in best:
+            best["ms"] = round(best["ms"], 1)
+        out[module] = best
+    return out
+
+
+def check_imports(imports: Dict[str, Dict[str, Any]], budget_ms: float = IMPORT_BUDGET_MS) -> List[str]:
+    """返回超预算 / 带进重依赖 / 导入失败的描述，空列表表示通过"""
+    out = []
+    for module, r in imports.items():
+        if "error" in r:
+            out.append(f"{module}: 导入失败 {r['error']}")
+            continue
+        if r["ms"] > budget_ms:
+            out.append(f"{module}: 导入 {r['ms']:.0f}ms 超过预算 {budget_ms:.0f}ms")
+        if r["heavy"]:
+            out.append(f"{module}: 导入时带进了 {', '.join(r['heavy'])}")
+    return out
+
+
+# ================= 报告 / 基线 =================
+def report(result: Dict[str, Any]) -> str:
+    lines = []
+    if result["recognizers"]:
+        lines.append(f"{'识别器':<14}{'样本':>6}{'首次ms':>10}{'p50ms':>10}{'p95ms':>10}{'次/秒':>9}{'准确率':>9}")
+    for name, r in result["recognizers"].items():
+        if r.get("skipped"):
+            lines.append(f"{name:<14}{'跳过':>6}  {r['skipped']}")
+            continue
+        lines.append(f"{name:<14}{r['n']:>6}{r['first_ms']:>10.1f}{r['p50_ms']:>10.1f}"
+                     f"{r['p95_ms']:>10.1f}{r['throughput_per_s']:>9.2f}{r['accuracy']:>9.3f}")
+    if result.get("imports"):
+        if lines:
+            lines.append("")
+        lines.append(f"{'模块':<22}{'导入ms':>10}  重依赖")
+        for module, r in result["imports"].items():
+            if "error" in r:
+                lines.append(f"{module:<22}{'失败':>10}  {r['error']}")
+            else:
+                lines.append(f"{module:<22}{r['ms']:>10.1f}  {', '.join(r['heavy']) or '-'}")
+    return "\n".join(lines)
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any],
+            latency_tol: float = LATENCY_TOL, accuracy_tol: float = ACCURACY_TOL) -> List[str]:
+    """返回退化描述列表，空列表表示没有退化"""
+    out = []
+    for name, base in baseline.get("recognizers", {}).items():
+        cur = result["recognizers"].get(name)
+        if cur is None or cur.get("skipped") or base.get("skipped"):
+            continue
+        if cur["accuracy"] < base["accuracy"] - accuracy_tol:
+            out.append(f"{name}: 准确率 {base['accuracy']:.3f} -> {cur['accuracy']:.3f}")
+        if base["p50_ms"] > 0 and cur["p50_ms"] > base["p50_ms"] * (1 + latency_tol):
+            out.append(f"{name}: p50 {base['p50_ms']:.1f}ms -> {cur['p50_ms']:.1f}ms")
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="识别器离线基准")
+    ap.add_argument("--n", type=int, default=6, help="每类合成样本数")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--scales", default="1.0", help="合成样本的模板尺度，逗号分隔")
+    ap.add_argument("--screens", nargs="+", default=[f"{w}x{h}" for w, h in synth.SCREENS],
+                    help="合成样本的屏幕尺寸，如 2560x1440 1920x1080")
+    ap.add_argument("--corpus", type=Path, default=CORPUS_DIR, help="标注截图目录")
+    ap.add_argument("--no-synth", action="store_true", help="只用标注截图")
+    ap.add_argument("--only", nargs="+", choices=list(FACTORIES), help="只跑这些识别器")
+    ap.add_argument("--out", type=Path, help="结果 JSON 输出路径")
+    ap.add_argument("--baseline", type=Path, help="与该基线比较")
+    ap.add_argument("--save-baseline", action="store_true", help=f"结果写入 {BASELINE.name}")
+    ap.add_argument("--latency-tol", type=float, default=LATENCY_TOL)
+    ap.add_argument("--trace", type=Path, help="导出 Chrome trace JSON 并打印分阶段汇总")
+    ap.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    ap.add_argument("--no-imports", action="store_true", help="跳过导入耗时检查")
+    ap.add_argument("--imports-only", action="store_true", help="只检查导入耗时")
+    ap.add_argument("--no-checks", action="store_true", help="跳过纯函数校验")
+    ap.add_argument("--classifier", action="store_true", help="全部识别器的意图 / 卡牌类型改走分类器后端（默认关闭，intents_clf / card_clf 只在自己计时期间打开）")
+    args = ap.parse_args(argv)
+    if args.trace:
+        trace.enable()
+    if args.classifier:
+        from tools import classifier
+        classifier.enable()
+
+    import_failures: List[str] = []
+    imports: Dict[str, Dict[str, Any]] = {}
+    if not args.no_imports:
+        imports = import_times()
+        import_failures = check_imports(imports, args.import_budget_ms)
+        for f in import_failures:
+            print(f"[IMPORT] {f}")
+    if args.imports_only:
+        print(report({"recognizers": {}, "imports": imports}))
+        return 1 if import_failures else 0
+
+    check_failures: List[str] = []
+    if not args.no_checks:
+        check_failures = checks.run_all()
+        for f in check_failures:
+            print(f"[CHECK] {f}")
+
+    samples = load_corpus(args.corpus)
+    if not args.no_synth:
+        scales = [float(s) for s in args.scales.split(",") if s]
+        screens = [tuple(int(v) for v in s.lower().split("x")) for s in args.screens]
+        samples += synth.make_all(args.n, args.seed, scales, screens=screens)
+    print(f"[BENCH] 样本数：{len(samples)}")
+
+    result = run(samples, args.only)
+    if imports:
+        result["imports"] = imports
+    print(report(result))
+    for name, r in result["recognizers"].items():
+        if r.get("misses"):
+            print(f"[BENCH] {name} 未全对：{', '.join(r['misses'])}")
+
+    if args.trace:
+        print(trace.summary())
+        trace.export_chrome(args.trace)
+        print(f"[BENCH] trace 已导出：{args.trace}")
+    if args.out:
+        args.out.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        BASELINE.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"[BENCH] 基线已保存：{BASELINE}")
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(result, baseline, args.latency_tol)
+        for r in regressions:
+            print(f"[REGRESSION] {r}")
+        return 1 if regressions or import_failures or check_failures else 0
+    return 1 if import_failures or check_failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+合成样本：把 data/ 里的模板按已知位置 / 尺度贴到噪声背景上，自带标注
+没有真实截图时也能测速度和准确率；真实截图见 corpus.py
+screens 里每个分辨率各生成一份：ROI 和模板比例取 layout.scaled_layout 的换算结果，
+识别时要靠 layout 自动选对布局才能认对（基准分辨率以外的布局问题会体现为准确率下降）
+"""
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from tools.config import HAND_SCALES, INTENT_MAP, LAYOUT_BASE_SIZE
+from tools.img_tool import dict2tuple, rotate_bound
+from tools.layout import scaled_layout
+from tools.tpl_bank import TemplateBank
+
+from benchmarks.corpus import Sample
+
+SCREEN_W, SCREEN_H = LAYOUT_BASE_SIZE   # 默认屏幕尺寸（基准布局）
+SCREENS: Tuple[Tuple[int, int], ...] = (LAYOUT_BASE_SIZE, (1920, 1080))
+ROT_INTENTS = ("debuff", "debuff2")
+ROT_ANGLES = (0, 15, 30, 45, 90, 180, 270)
+MAX_INTENTS = 3
+HAND_CARDS = (2, 6)                     # 合成手牌的张数范围
+STATE_FIELDS = ("player_hp", "player_hp_max", "player_energy",
+                "player_energy_max", "player_block", "gold")
+
+
+class Screen(NamedTuple):
+    """一种屏幕尺寸下的合成参数"""
+    w: int
+    h: int
+    tpl_scale: float                        # 模板相对基准的缩放
+    rois: Dict[str, Dict[str, int]]         # AREA_MAP 同名 ROI
+
+    def roi(self, name: str) -> Tuple[int, int, int, int]:
+        return dict2tuple(self.rois[name])
+
+    @property
+    def tag(self) -> str:
+        return "" if (self.w, self.h) == tuple(LAYOUT_BASE_SIZE) else f"_{self.w}x{self.h}"
+
+
+def screen(w: int = SCREEN_W, h: int = SCREEN_H) -> Screen:
+    lay = scaled_layout(w, h)
+    return Screen(w, h, lay.tpl_scale, lay.rois)
+
+
+_BANK: Optional[TemplateBank] = None
+
+
+def _bank() -> TemplateBank:
+    """原始比例的模板（进程里的共享模板库可能已被布局切到别的比例）"""
+    global _BANK
+    if _BANK is None:
+        _BANK = TemplateBank(scale=1.0)
+    return _BANK
+
+
+def background(rng: np.random.Generator, w: int = SCREEN_W, h: int = SCREEN_H) -> np.ndarray:
+    """低对比度的模糊噪声，避免纯色背景让匹配分数虚高"""
+    small = rng.integers(30, 110, size=(h // 8, w // 8, 3), dtype=np.uint8)
+    img = cv2.resize(small, (w, h), interpolation=cv2.INTER_LINEAR)
+    noise = rng.integers(0, 12, size=img.shape, dtype=np.uint8)
+    return cv2.add(img, noise)
+
+
+def paste(canvas: np.ndarray, tpl: np.ndarray, x: int, y: int) -> Tuple[int, int, int, int]:
+    """把模板贴到 (x, y)，返回 (x, y, w, h)"""
+    h, w = tpl.shape[:2]
+    canvas[y:y + h, x:x + w] = tpl
+    return x, y, w, h
+
+
+def _scaled(tpl: np.ndarray, s: float) -> np.ndarray:
+    return tpl if s == 1.0 else cv2.resize(tpl, None, fx=s, fy=s, interpolation=cv2.INTER_AREA)
+
+
+def _place(rng: np.random.Generator, area: Tuple[int, int, int, int], w: int, h: int,
+           sc: Optional[Screen] = None) -> Tuple[int, int]:
+    sw, sh = (sc.w, sc.h) if sc is not None else (SCREEN_W, SCREEN_H)
+    ax, ay, aw, ah = area
+    aw, ah = min(aw, sw - ax), min(ah, sh - ay)
+    return int(rng.integers(ax, ax + max(aw - w, 1))), int(rng.integers(ay, ay + max(ah - h, 1)))
+
+
+# ================= 各识别器的样本 =================
+def scene_samples(n: int, rng: np.random.Generator, scales: Sequence[float] = (1.0,),
+                  sc: Optional[Screen] = None) -> List[Sample]:
+    """每帧贴一个场景模板，轮流覆盖全部场景"""
+    sc = sc or screen()
+    items = _bank().items("scene", color=True)
+    out = []
+    for i in range(n):
+        key, _cn, tpl = items[i % len(items)]
+        s = float(scales[i % len(scales)])
+        img = background(rng, sc.w, sc.h)
+        t = _scaled(tpl, s * sc.tpl_scale)
+        paste(img, t, *_place(rng, (0, 0, sc.w, sc.h), t.shape[1], t.shape[0], sc))
+        out.append(Sample(f"scene{sc.tag}_{i:03d}_{key}@{s:g}", img, {"scene": key}))
+    return out
+
+
+def _paste_intents(img: np.ndarray, rng: np.random.Generator, scale: float = 1.0,
+                   sc: Optional[Screen] = None) -> List[str]:
+    """在敌人区域里按列贴 1..MAX_INTENTS 个意图图标，返回从左到右的键"""
+    sc = sc or screen()
+    bank = _bank()
+    keys = [k for k in INTENT_MAP if bank.get("enemy", k, color=True) is not None]
+    ex, ey, ew, eh = sc.roi("enemy")
+    count = int(rng.integers(1, MAX_INTENTS + 1))
+    col_w = ew // count
+    placed = []
+    for c in range(count):
+        key = keys[int(rng.integers(len(keys)))]
+        tpl = _scaled(bank.get("enemy", key, color=True), scale * sc.tpl_scale)
+        if key in ROT_INTENTS:
+            angle = ROT_ANGLES[int(rng.integers(len(ROT_ANGLES)))]
+            if angle:
+                tpl = rotate_bound(tpl, angle)
+        x, y = _place(rng, (ex + c * col_w, ey, col_w, eh), tpl.shape[1], tpl.shape[0], sc)
+        paste(img, tpl, x, y)
+        placed.append((x, key))
+    return [key for _x, key in sorted(placed)]
+
+
+def intent_samples(n: int, rng: np.random.Generator, scales: Sequence[float] = (1.0,),
+                   sc: Optional[Screen] = None) -> List[Sample]:
+    sc = sc or screen()
+    out = []
+    for i in range(n):
+        s = float(scales[i % len(scales)])
+        img = background(rng, sc.w, sc.h)
+        keys = _paste_intents(img, rng, s, sc)
+        out.append(Sample(f"intent{sc.tag}_{i:03d}@{s:g}", img, {"intents": keys}))
+    return out
+
+
+def card_samples(n: int, rng: np.random.Generator, scales: Sequence[float] = (1.0,),
+                 sc: Optional[Screen] = None) -> List[Sample]:
+    """选中卡牌：卡牌区域下半部分贴类型，对应的能量 ROI 里贴能量"""
+    sc = sc or screen()
+    bank = _bank()
+    kinds = bank.items("card_kind", color=True)
+    cx, cy, cw, ch = sc.roi("card")
+    out = []
+    for i in range(n):
+        key, _cn, tpl = kinds[i % len(kinds)]
+        s = float(scales[i % len(scales)])
+        img = background(rng, sc.w, sc.h)
+        t = _scaled(tpl, s * sc.tpl_scale)
+        paste(img, t, *_place(rng, (cx, cy + ch // 2, cw, ch // 2), t.shape[1], t.shape[0], sc))
+        roi_key, group = ("small_card_energy", "small_energy") if key == "attack" \
+            else ("big_card_energy", "big_energy")
+        energies = bank.items(group, color=True)
+        ekey, _ecn, etpl = energies[int(rng.integers(len(energies)))]
+        e = _scaled(etpl, s * sc.tpl_scale)
+        paste(img, e, *_place(rng, sc.roi(roi_key), e.shape[1], e.shape[0], sc))
+        out.append(Sample(f"card{sc.tag}_{i:03d}_{key}@{s:g}", img,
+                          {"card": {"type": key, "energy": int(ekey.split("_")[1])}}))
+    return out
+
+
+def hand_samples(n: int, rng: np.random.Generator, scales: Sequence[float] = (1.0,),
+                 sc: Optional[Screen] = None) -> List[Sample]:
+    """
+    整手牌：手牌区域里从左到右每列一张牌，类型图标按 HAND_SCALES 之一缩放，
+    能量球贴在类型图标左上方（攻击牌用小能量球）
+    """
+    sc = sc or screen()
+    bank = _bank()
+    kinds = bank.items("card_kind", color=True)
+    orbs = {g: bank.items(g, color=True) for g in ("big_energy", "small_energy")}
+    hx, hy, hw, hh = sc.roi("hand")
+    out = []
+    for i in range(n):
+        s = float(scales[i % len(scales)])
+        img = background(rng, sc.w, sc.h)
+        count = int(rng.integers(HAND_CARDS[0], HAND_CARDS[1] + 1))
+        col_w = hw // count
+        cards = []
+        for c in range(count):
+            key, _cn, tpl = kinds[int(rng.integers(len(kinds)))]
+            fan = float(HAND_SCALES[int(rng.integers(len(HAND_SCALES)))]) * s * sc.tpl_scale
+            t = _scaled(tpl, fan)
+            group = "small_energy" if key == "attack" else "big_energy"
+            ekey, _ecn, etpl = orbs[group][int(rng.integers(len(orbs[group])))]
+            e = _scaled(etpl, fan)
+            eh, ew = e.shape[:2]
+            # 类型图标上方和左侧留出能量球的位置
+            x, y = _place(rng, (hx + c * col_w + ew // 2, hy + eh + 4, col_w - ew // 2, hh - eh - 4),
+                          t.shape[1], t.shape[0], sc)
+            paste(img, e, x - ew // 2, y - eh - 4)
+            paste(img, t, x, y)
+            cards.append({"type": key, "cost": int(ekey.split("_")[1])})
+        out.append(Sample(f"hand{sc.tag}_{i:03d}@{s:g}", img, {"hand": cards}))
+    return out
+
+
+def put_number(img: np.ndarray, roi: Tuple[int, int, int, int], value: int):
+    """深色底 + 白色数字，字号按 ROI 大小自适应"""
+    x, y, w, h = roi
+    img[y:y + h, x:x + w] = (24, 24, 24)
+    text = str(value)
+    font, thick = cv2.FONT_HERSHEY_SIMPLEX, 2
+    (tw, th), _ = cv2.getTextSize(text, font, 1.0, thick)
+    fs = min(0.8 * w / tw, 0.6 * h / th)
+    (tw, th), _ = cv2.getTextSize(text, font, fs, thick)
+    cv2.putText(img, text, (x + (w - tw) // 2, y + (h + th) // 2), font, fs,
+                (240, 240, 240), thick, cv2.LINE_AA)
+
+
+def battle_samples(n: int, rng: np.random.Generator, scales: Sequence[float] = (1.0,),
+                   sc: Optional[Screen] = None) -> List[Sample]:
+    """战斗画面：固定 ROI 数字 + 敌人意图"""
+    sc = sc or screen()
+    ranges: Dict[str, Tuple[int, int]] = {
+        "player_hp": (1, 99), "player_hp_max": (50, 99), "player_energy": (0, 5),
+        "player_energy_max": (3, 5), "player_block": (0, 40), "gold": (0, 999),
+    }
+    out = []
+    for i in range(n):
+        img = background(rng, sc.w, sc.h)
+        state = {}
+        for name in STATE_FIELDS:
+            lo, hi = ranges[name]
+            state[name] = int(rng.integers(lo, hi + 1))
+            put_number(img, sc.roi(name), state[name])
+        keys = _paste_intents(img, rng, float(scales[i % len(scales)]), sc)
+        out.append(Sample(f"battle{sc.tag}_{i:03d}", img, {"state": state, "intents": keys}))
+    return out
+
+
+def make_all(n: int, seed: int = 0, scales: Sequence[float] = (1.0,),
+             kinds: Optional[Sequence[str]] = None,
+             screens: Sequence[Tuple[int, int]] = SCREENS) -> List[Sample]:
+    """
+    kinds: scene / intent / card / hand / battle 的子集，None 为全部
+    screens: 屏幕尺寸列表，每种尺寸各生成 n 个；同一尺寸的样本排在一起，识别时少切换布局
+    """
+    rng = np.random.default_rng(seed)
+    gens = {"scene": scene_samples, "intent": intent_samples,
+            "card": card_samples, "hand": hand_samples, "battle": battle_samples}
+    out: List[Sample] = []
+    for kind in kinds or gens:
+        for w, h in screens:
+            out.extend(gens[kind](n, rng, scales, screen(w, h)))
+    return out
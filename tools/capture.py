@@ -0,0 +1,243 @@
+"""
+截图后端：mss（只抓 ROI）、PIL（兜底）、目录 / 视频回放（无桌面环境）
+所有后端统一返回 BGR uint8 图像
+后端通过 config.CAPTURE_BACKEND 选择，环境变量 STS_CAPTURE 可覆盖
+录制的帧库（见 recorder.py）用 "store" 后端回放，"replay" 指向帧库目录时也会自动使用它
+"""
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from tools.config import CAPTURE_BACKEND, CAPTURE_REPLAY_SOURCE
+
+log = logging.getLogger(__name__)
+
+Region = Optional[Tuple[int, int, int, int]]     # (x, y, w, h)，None 表示全屏
+
+IMG_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp"}
+VIDEO_SUFFIXES = {".mp4", ".avi", ".mkv", ".mov"}
+
+
+class CaptureBackend:
+    """截图后端基类"""
+    name = "base"
+
+    def __init__(self):
+        # (h, w) -> 预分配的 BGR 缓冲区
+        self._bufs: Dict[Tuple[int, int], np.ndarray] = {}
+
+    def _buffer(self, h: int, w: int) -> np.ndarray:
+        buf = self._bufs.get((h, w))
+        if buf is None:
+            buf = self._bufs[(h, w)] = np.empty((h, w, 3), dtype=np.uint8)
+        return buf
+
+    def grab(self, region: Region = None, copy: bool = True) -> np.ndarray:
+        """
+        截取 region（None 为全屏），返回 BGR
+        copy=False 时直接返回内部缓冲区，下一次同尺寸截图会覆盖它，适合轮询
+        """
+        raise NotImplementedError
+
+    def screen_size(self) -> Tuple[int, int]:
+        """返回 (宽, 高)"""
+        h, w = self.grab(copy=False).shape[:2]
+        return w, h
+
+    def close(self):
+        self._bufs.clear()
+
+
+# ================= mss =================
+class MssBackend(CaptureBackend):
+    """mss 截图：只抓请求的区域，BGRA -> BGR 写进预分配缓冲区"""
+    name = "mss"
+
+    def __init__(self, monitor: int = 1):
+        super().__init__()
+        import mss                         # noqa: F401  提前暴露缺失依赖
+        self._monitor_idx = monitor
+        self._local = threading.local()    # mss 实例不能跨线程使用
+
+    def _sct(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            import mss
+            sct = self._local.sct = mss.mss()
+        return sct
+
+    def _monitor(self) -> Dict[str, int]:
+        return self._sct().monitors[self._monitor_idx]
+
+    def screen_size(self) -> Tuple[int, int]:
+        mon = self._monitor()
+        return mon["width"], mon["height"]
+
+    def grab(self, region: Region = None, copy: bool = True) -> np.ndarray:
+        mon = self._monitor()
+        if region is None:
+            box = {"left": mon["left"], "top": mon["top"],
+                   "width": mon["width"], "height": mon["height"]}
+        else:
+            x, y, w, h = region
+            box = {"left": mon["left"] + x, "top": mon["top"] + y, "width": w, "height": h}
+        shot = self._sct().grab(box)
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        out = self._buffer(shot.height, shot.width)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=out)
+        return out.copy() if copy else out
+
+    def close(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+        super().close()
+
+
+# ================= PIL =================
+class PilBackend(CaptureBackend):
+    """PIL.ImageGrab 截图（兜底），region 通过 bbox 传给 ImageGrab"""
+    name = "pil"
+
+    def __init__(self):
+        super().__init__()
+        from PIL import ImageGrab
+        self._grab = ImageGrab.grab
+
+    def grab(self, region: Region = None, copy: bool = True) -> np.ndarray:
+        bbox = None
+        if region is not None:
+            x, y, w, h = region
+            bbox = (x, y, x + w, y + h)
+        img_rgb = np.asarray(self._grab(bbox=bbox))
+        out = self._buffer(*img_rgb.shape[:2])
+        cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR, dst=out)
+        return out.copy() if copy else out
+
+
+# ================= 回放 =================
+class ReplayBackend(CaptureBackend):
+    """
+    从截图目录或视频文件回放，供无桌面环境（Linux CI）使用
+    全屏 grab 前进到下一帧；带 region 的 grab 只裁当前帧，不前进
+    """
+    name = "replay"
+
+    def __init__(self, source: Union[str, Path], loop: bool = True):
+        super().__init__()
+        self.source = Path(source)
+        self.loop = loop
+        self._files: List[Path] = []
+        self._video: Optional[cv2.VideoCapture] = None
+        self._idx = -1
+        self._current: Optional[np.ndarray] = None
+        if self.source.is_dir():
+            self._files = sorted(p for p in self.source.iterdir() if p.suffix.lower() in IMG_SUFFIXES)
+            if not self._files:
+                raise FileNotFoundError(f"回放目录里没有图片：{self.source}")
+        elif self.source.suffix.lower() in VIDEO_SUFFIXES:
+            self._video = cv2.VideoCapture(str(self.source))
+            if not self._video.isOpened():
+                raise FileNotFoundError(f"无法打开回放视频：{self.source}")
+        elif self.source.suffix.lower() in IMG_SUFFIXES and self.source.exists():
+            self._files = [self.source]
+        else:
+            raise FileNotFoundError(f"回放源不存在：{self.source}")
+
+    @property
+    def index(self) -> int:
+        return self._idx
+
+    def next_frame(self) -> np.ndarray:
+        """前进一帧并返回（只读，调用方需要改写时请 copy）"""
+        if self._video is not None:
+            ok, img = self._video.read()
+            if not ok and self.loop:
+                self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, img = self._video.read()
+            if not ok:
+                raise EOFError("回放视频已结束")
+            self._idx += 1
+        else:
+            nxt = self._idx + 1
+            if nxt >= len(self._files):
+                if not self.loop:
+                    raise EOFError("回放目录已结束")
+                nxt = 0
+            img = cv2.imread(str(self._files[nxt]), cv2.IMREAD_COLOR)
+            self._idx = nxt
+        self._current = img
+        return img
+
+    def grab(self, region: Region = None, copy: bool = True) -> np.ndarray:
+        if region is None or self._current is None:
+            self.next_frame()
+        img = self._current
+        if region is not None:
+            x, y, w, h = region
+            img = img[y:y + h, x:x + w]
+        return img.copy() if copy else img
+
+    def close(self):
+        if self._video is not None:
+            self._video.release()
+        super().close()
+
+
+# ================= 选择 / 单例 =================
+def make_backend(name: str = CAPTURE_BACKEND, source: Optional[str] = None) -> CaptureBackend:
+    """
+    name: "auto" | "mss" | "pil" | "replay" | "store"
+    auto：优先 mss，缺依赖时退回 PIL
+    """
+    name = name.lower()
+    if name in ("replay", "store"):
+        src = source or CAPTURE_REPLAY_SOURCE
+        if not src:
+            raise ValueError(f"{name} 后端需要回放源（config.CAPTURE_REPLAY_SOURCE 或 STS_REPLAY）")
+        from tools.recorder import StoreBackend, is_store
+        if name == "store" or is_store(src):
+            return StoreBackend(src)
+        return ReplayBackend(src)
+    if name == "mss":
+        return MssBackend()
+    if name == "pil":
+        return PilBackend()
+    if name == "auto":
+        try:
+            return MssBackend()
+        except ImportError:
+            log.warning("未安装 mss，截图退回 PIL")
+            return PilBackend()
+    raise ValueError(f"未知截图后端：{name}")
+
+
+_BACKEND: Optional[CaptureBackend] = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def get_backend() -> CaptureBackend:
+    global _BACKEND
+    if _BACKEND is None:
+        with _BACKEND_LOCK:
+            if _BACKEND is None:
+                _BACKEND = make_backend(os.environ.get("STS_CAPTURE", CAPTURE_BACKEND),
+                                        os.environ.get("STS_REPLAY"))
+    return _BACKEND
+
+
+def set_backend(backend: Union[str, CaptureBackend], source: Optional[str] = None,
+                close_old: bool = True) -> CaptureBackend:
+    """切换进程内的截图后端（传名称或实例）；close_old=False 时不关闭旧后端（例如被包装复用）"""
+    global _BACKEND
+    with _BACKEND_LOCK:
+        if _BACKEND is not None and close_old:
+            _BACKEND.close()
+        _BACKEND = make_backend(backend, source) if isinstance(backend, str) else backend
+    return _BACKEND
@@ -0,0 +1,537 @@
+"""
+轻量分类器（可选后端）：敌人意图图标 / 卡牌类型
+模板匹配的耗时随模板数线性增长；这里换成一个纯 numpy 的两层 MLP，耗时与类别数基本无关
+  训练：data/ 里的模板做增强（旋转、缩放、亮度、噪声、平移）贴到随机背景上，另加一个“背景”类
+  特征：HOG（梯度方向直方图）+ 每格平均颜色，每层缩放图只算一次格子，滑动窗口直接切格子
+  推理：候选 = 几种尺寸的方形滑动窗口（尺寸由模板大小决定，与类别数无关），
+        全部窗口一次批量前向得到各类概率 → 过阈值的窗口去重 → 附近逐像素细调位置
+模型按模板内容指纹缓存在 TPL_CACHE_DIR/models/，模板或布局比例变化时自动重新训练
+开关：config.CLASSIFIER_ENABLED，环境变量 STS_CLASSIFIER=1 可覆盖；运行中用 enable() / disable()
+打开后 match_enemy.detect_intents 和 march_card.score_card_kind 改走分类器，接口不变
+python -m tools.classifier train enemy card_kind      预先训练（否则第一次使用时训练）
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from tools.config import CLASSIFIER_ENABLED, TPL_CACHE_DIR
+from tools.img_tool import BestMatch, rotate_bound
+from tools.tpl_bank import get_bank
+from tools.trace import span, traced
+
+log = logging.getLogger(__name__)
+
+_ENABLED = os.environ.get("STS_CLASSIFIER", "1" if CLASSIFIER_ENABLED else "0") not in ("0", "", "false")
+
+MODEL_DIR = TPL_CACHE_DIR / "models"
+MODEL_VERSION = 2
+INPUT = 24                  # 窗口缩放到的边长
+CELL = 4                    # HOG 格子边长
+BINS = 9                    # 梯度方向分箱（0–180°）
+HOG_EPS = 200.0             # 归一化时加在梯度能量上，平坦背景的特征接近 0
+HIDDEN = 128
+CROP_PAD = 1.2              # 方形窗口边长 = 模板长边 * CROP_PAD
+SIZE_STEP = 1.25            # 窗口尺寸按这个比例从最小模板排到最大模板
+STRIDE = 1                  # 滑动步长（格子数，INPUT 尺度下 CELL 像素，窗口的 1/6）
+MAX_REFINE = 16             # 最多细调多少个候选
+
+# 训练
+POS_PER_CLASS = 300
+NEG_RATIO = 1.0             # 背景样本数 = 正样本总数 * NEG_RATIO
+EPOCHS = 15
+BATCH = 128
+LR = 2e-3
+SEED = 0
+MINING_ROUNDS = 2           # 难例挖掘轮数：背景图上的误检窗口加入背景类再训练
+MINING_IMAGES = 8
+MINING_SIZE = 512
+MINING_EPOCHS = 10
+MINING_OBJECTS = 4          # 每张挖掘图上贴几个模板
+# 这些模板在画面里会旋转（见 match_enemy.ROT_TPL_NAMES），训练时做全角度旋转
+FULL_ROTATION: Dict[str, Tuple[str, ...]] = {"enemy": ("debuff", "debuff2")}
+
+
+def enabled() -> bool:
+    return _ENABLED
+
+
+def enable():
+    global _ENABLED
+    _ENABLED = True
+
+
+def disable():
+    global _ENABLED
+    _ENABLED = False
+
+
+# ================= 特征 / 网络 =================
+def _cells(imgs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (N, H, W, 3) uint8 -> 每 CELL 见方一格：梯度方向直方图 (N, H/CELL, W/CELL, BINS)
+    和平均颜色 (N, H/CELL, W/CELL, 3)；整张缩放图算一次，滑动窗口直接切格子
+    """
+    n, H, W = imgs.shape[:3]
+    hc, wc = H // CELL, W // CELL
+    f = imgs[:, :hc * CELL, :wc * CELL].astype(np.float32)
+    g = f.mean(axis=3)
+    gx = np.zeros_like(g)
+    gy = np.zeros_like(g)
+    gx[:, :, 1:-1] = g[:, :, 2:] - g[:, :, :-2]
+    gy[:, 1:-1, :] = g[:, 2:, :] - g[:, :-2, :]
+    mag = np.hypot(gx, gy)
+    bins = np.minimum((np.arctan2(gy, gx) % np.pi * (BINS / np.pi)).astype(np.int64), BINS - 1)
+    cy = np.arange(hc * CELL) // CELL
+    cx = np.arange(wc * CELL) // CELL
+    idx = ((np.arange(n)[:, None, None] * hc + cy[None, :, None]) * wc + cx[None, None, :]) * BINS + bins
+    hog = np.bincount(idx.ravel(), weights=mag.ravel(), minlength=n * hc * wc * BINS)
+    hog = hog.reshape(n, hc, wc, BINS).astype(np.float32)
+    color = f.reshape(n, hc, CELL, wc, CELL, 3).mean(axis=(2, 4)) / 255.0
+    return hog, color
+
+
+def _normalize(hog: np.ndarray, color: np.ndarray) -> np.ndarray:
+    """
+    每个窗口的格子特征 (M, c*c*BINS) + (M, c*c*3) -> (M, D)
+    HOG 整窗 L2 归一化后截断（对亮度 / 对比度不敏感），颜色减去整窗均值（只保留颜色分布）
+    """
+    hog = hog / (np.linalg.norm(hog, axis=1, keepdims=True) + HOG_EPS)
+    np.minimum(hog, 0.2, out=hog)
+    hog /= np.linalg.norm(hog, axis=1, keepdims=True) + 1e-6
+    color = color - color.mean(axis=1, keepdims=True)
+    return np.concatenate([hog * np.sqrt(hog.shape[1]), color * 3.0], axis=1)
+
+
+def _features(crops: np.ndarray) -> np.ndarray:
+    """(N, INPUT, INPUT, 3) uint8 -> (N, D) float32"""
+    hog, color = _cells(crops)
+    n = len(crops)
+    return _normalize(hog.reshape(n, -1), color.reshape(n, -1))
+
+
+class MLP:
+    """输入 -> ReLU 隐层 -> softmax"""
+
+    def __init__(self, w1: np.ndarray, b1: np.ndarray, w2: np.ndarray, b2: np.ndarray):
+        self.w1, self.b1, self.w2, self.b2 = w1, b1, w2, b2
+
+    @classmethod
+    def init(cls, d_in: int, d_hidden: int, d_out: int, rng: np.random.Generator) -> "MLP":
+        return cls((rng.standard_normal((d_in, d_hidden)) * np.sqrt(2.0 / d_in)).astype(np.float32),
+                   np.zeros(d_hidden, np.float32),
+                   (rng.standard_normal((d_hidden, d_out)) * np.sqrt(1.0 / d_hidden)).astype(np.float32),
+                   np.zeros(d_out, np.float32))
+
+    def forward(self, x: np.ndarray) -> np.ndarray:
+        h = np.maximum(x @ self.w1 + self.b1, 0)
+        return _softmax(h @ self.w2 + self.b2)
+
+    def fit(self, x: np.ndarray, y: np.ndarray, epochs: int, rng: np.random.Generator):
+        """Adam + 交叉熵"""
+        params = [self.w1, self.b1, self.w2, self.b2]
+        m = [np.zeros_like(p) for p in params]
+        v = [np.zeros_like(p) for p in params]
+        b1, b2, step = 0.9, 0.999, 0
+        for epoch in range(epochs):
+            order = rng.permutation(len(x))
+            loss = 0.0
+            for i in range(0, len(x), BATCH):
+                idx = order[i:i + BATCH]
+                xb, yb = x[idx], y[idx]
+                h_pre = xb @ self.w1 + self.b1
+                h = np.maximum(h_pre, 0)
+                p = _softmax(h @ self.w2 + self.b2)
+                loss += float(-np.log(p[np.arange(len(yb)), yb] + 1e-9).sum())
+                d_out = p
+                d_out[np.arange(len(yb)), yb] -= 1
+                d_out /= len(yb)
+                d_h = (d_out @ self.w2.T) * (h_pre > 0)
+                grads = [xb.T @ d_h, d_h.sum(0), h.T @ d_out, d_out.sum(0)]
+                step += 1
+                lr = LR * (0.5 * (1 + np.cos(np.pi * epoch / epochs)))     # 余弦退火
+                for j, (prm, g) in enumerate(zip(params, grads)):
+                    m[j] = b1 * m[j] + (1 - b1) * g
+                    v[j] = b2 * v[j] + (1 - b2) * g * g
+                    prm -= lr * (m[j] / (1 - b1 ** step)) / (np.sqrt(v[j] / (1 - b2 ** step)) + 1e-8)
+            log.debug("epoch %d/%d loss=%.4f", epoch + 1, epochs, loss / len(x))
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+# ================= 训练数据 =================
+def _texture(rng: np.random.Generator, size: int, textures: List[np.ndarray]) -> np.ndarray:
+    """背景：模糊噪声 / 纯色 + 噪声 / 场景模板（真实游戏画面）的随机局部"""
+    kind = rng.integers(3)
+    if kind == 0 or not textures:
+        cells = max(size // int(rng.integers(4, 16)), 2)
+        small = rng.integers(20, 140, size=(cells, cells, 3), dtype=np.uint8)
+        img = cv2.resize(small, (size, size), interpolation=cv2.INTER_LINEAR)
+    elif kind == 1:
+        img = np.full((size, size, 3), rng.integers(0, 200, size=3), dtype=np.uint8)
+    else:
+        src = textures[int(rng.integers(len(textures)))]
+        h, w = src.shape[:2]
+        c = int(rng.integers(min(h, w) // 3, min(h, w) + 1))
+        y, x = int(rng.integers(0, h - c + 1)), int(rng.integers(0, w - c + 1))
+        img = cv2.resize(src[y:y + c, x:x + c], (size, size), interpolation=cv2.INTER_LINEAR)
+    noise = rng.integers(0, 12, size=img.shape, dtype=np.uint8)
+    return cv2.add(img, noise)
+
+
+def _render(tpl: np.ndarray, rng: np.random.Generator, textures: List[np.ndarray], full_rotation: bool,
+            shift: float, zoom: float) -> np.ndarray:
+    """
+    把增强后的模板贴到随机背景中央，裁出方形窗口缩到 INPUT
+    shift: 中心偏移（相对窗口边长），zoom: 模板相对“刚好合适”的缩放
+    """
+    s = zoom * rng.uniform(0.88, 1.12)
+    t = cv2.resize(tpl, None, fx=s, fy=s, interpolation=cv2.INTER_AREA if s < 1 else cv2.INTER_LINEAR)
+    angle = rng.uniform(0, 360) if full_rotation else rng.uniform(-6, 6)
+    rot = rotate_bound(t, angle)
+    mask = rotate_bound(np.full(t.shape[:2], 255, np.uint8), angle) > 127
+    if full_rotation and rng.random() < 0.3:
+        mask[:] = True                          # 旋转后的黑角也贴上（与合成样本一致）
+    side = int(round(max(tpl.shape[:2]) * CROP_PAD))
+    canvas_side = side * 3
+    canvas = _texture(rng, canvas_side, textures)
+    h, w = rot.shape[:2]
+    a = rng.uniform(0, 2 * np.pi)
+    cx = canvas_side // 2 + int(round(shift * side * np.cos(a)))
+    cy = canvas_side // 2 + int(round(shift * side * np.sin(a)))
+    x0, y0 = cx - w // 2, cy - h // 2
+    x1, y1 = max(x0, 0), max(y0, 0)
+    x2, y2 = min(x0 + w, canvas_side), min(y0 + h, canvas_side)
+    if x2 > x1 and y2 > y1:
+        region = canvas[y1:y2, x1:x2]
+        sub_m = mask[y1 - y0:y2 - y0, x1 - x0:x2 - x0]
+        region[sub_m] = rot[y1 - y0:y2 - y0, x1 - x0:x2 - x0][sub_m]
+    c0 = canvas_side // 2 - side // 2
+    crop = canvas[c0:c0 + side, c0:c0 + side]
+    crop = cv2.resize(crop, (INPUT, INPUT), interpolation=cv2.INTER_AREA)
+    # 亮度 / 对比度 / 噪声
+    crop = cv2.convertScaleAbs(crop, alpha=rng.uniform(0.75, 1.25), beta=rng.uniform(-30, 30))
+    return cv2.add(crop, rng.integers(0, 8, size=crop.shape, dtype=np.uint8))
+
+
+def _dataset(tpls: List[np.ndarray], rot: List[bool], rng: np.random.Generator,
+             textures: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """类别 0..K-1 为模板，K 为背景；背景含纯背景、偏离中心 / 尺寸不对的模板（学会定位和尺度）"""
+    k = len(tpls)
+    crops, labels = [], []
+    for c, (tpl, full) in enumerate(zip(tpls, rot)):
+        for _ in range(POS_PER_CLASS):
+            crops.append(_render(tpl, rng, textures, full, rng.uniform(0, 0.08), 1.0))
+            labels.append(c)
+    n_neg = int(POS_PER_CLASS * k * NEG_RATIO)
+    for i in range(n_neg):
+        kind = i % 3
+        if kind == 0:
+            crops.append(cv2.resize(_texture(rng, INPUT * 4, textures), (INPUT, INPUT),
+                                    interpolation=cv2.INTER_AREA))
+        else:
+            c = int(rng.integers(k))
+            if kind == 1:       # 偏离中心
+                crops.append(_render(tpls[c], rng, textures, rot[c], rng.uniform(0.4, 0.75), 1.0))
+            else:               # 太小 / 太大
+                zoom = rng.uniform(0.35, 0.55) if rng.random() < 0.5 else rng.uniform(1.7, 2.2)
+                crops.append(_render(tpls[c], rng, textures, rot[c], rng.uniform(0, 0.1), zoom))
+        labels.append(k)
+    return _features(np.stack(crops)), np.asarray(labels, np.int64)
+
+
+# ================= 分类器 =================
+class Classifier:
+    """某个模板组（enemy / card_kind）的分类器"""
+
+    def __init__(self, group: str, keys: List[str], names: List[str],
+                 tpl_sizes: np.ndarray, model: MLP):
+        self.group = group
+        self.keys = keys
+        self.names = names
+        self.tpl_sizes = tpl_sizes          # (K, 2)：各类模板 (h, w)
+        self.model = model
+        lo = int(round(tpl_sizes.max(axis=1).min() * CROP_PAD))
+        hi = int(round(tpl_sizes.max(axis=1).max() * CROP_PAD))
+        n = int(np.ceil(np.log(hi / lo) / np.log(SIZE_STEP))) + 1 if hi > lo else 1
+        self.sizes = sorted({int(round(lo * SIZE_STEP ** i)) for i in range(n)} | {hi})
+        # 各类模板原始大小对应的窗口（best_match 不搜尺度，只用这几种）
+        self.native = sorted({int(round(s * CROP_PAD)) for s in tpl_sizes.max(axis=1)})
+
+    def predict(self, crops: np.ndarray) -> np.ndarray:
+        """(N, INPUT, INPUT, 3) -> (N, K+1) 概率，最后一列为背景"""
+        return self.model.forward(_features(crops))
+
+    def _pyramid(self, hay: np.ndarray, sizes: Optional[Sequence[int]] = None) -> List[Tuple[int, np.ndarray]]:
+        """每种窗口尺寸 S（默认 self.sizes）：把 hay 缩放 INPUT/S，窗口在缩放图上就是 INPUT 见方"""
+        if hay.ndim == 2:
+            hay = cv2.cvtColor(hay, cv2.COLOR_GRAY2BGR)
+        H, W = hay.shape[:2]
+        out = []
+        for S in sizes or self.sizes:
+            if S > H or S > W:
+                continue
+            r = INPUT / S
+            small = cv2.resize(hay, (max(int(round(W * r)), INPUT), max(int(round(H * r)), INPUT)),
+                               interpolation=cv2.INTER_AREA)
+            out.append((S, small))
+        return out
+
+    def _windows(self, pyramid: List[Tuple[int, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+        """全部滑动窗口 -> (特征 (N, D), meta (N, 3)：层号, 缩放图上的 x, y)；步长 STRIDE 个格子"""
+        c = INPUT // CELL
+        feats, meta = [], []
+        for li, (_S, small) in enumerate(pyramid):
+            hog, color = _cells(small[None])
+            hv = sliding_window_view(hog[0], (c, c), axis=(0, 1))[::STRIDE, ::STRIDE]
+            cv = sliding_window_view(color[0], (c, c), axis=(0, 1))[::STRIDE, ::STRIDE]
+            ny, nx = hv.shape[:2]
+            # sliding_window_view 把窗口轴放在最后：(ny, nx, F, c, c) -> (ny*nx, c, c, F)
+            feats.append(_normalize(hv.transpose(0, 1, 3, 4, 2).reshape(ny * nx, -1),
+                                    cv.transpose(0, 1, 3, 4, 2).reshape(ny * nx, -1)))
+            ys, xs = np.mgrid[0:ny, 0:nx]
+            step = STRIDE * CELL
+            meta.append(np.stack([np.full(ny * nx, li), xs.ravel() * step, ys.ravel() * step], axis=1))
+        if not feats:
+            return np.empty((0, 0), np.float32), np.empty((0, 3), np.int64)
+        return np.concatenate(feats), np.concatenate(meta)
+
+    @traced("classifier.detect")
+    def detect(self, hay: np.ndarray, threshold: float) -> List[Tuple[str, int, int, int, int, float]]:
+        """找出全部目标 [(key, x, y, w, h, 概率), ...]，坐标为 hay 内的模板框"""
+        pyramid = self._pyramid(hay)
+        feats, meta = self._windows(pyramid)
+        if not len(feats):
+            return []
+        with span("classifier.forward", n=len(feats)):
+            probs = self.model.forward(feats)
+        cls = probs[:, :-1].argmax(axis=1)
+        conf = probs[np.arange(len(probs)), cls]
+        keep = np.flatnonzero(conf >= threshold * 0.8)      # 细调前先放宽一点
+        if not len(keep):
+            return []
+        sizes = np.array([pyramid[li][0] for li in meta[keep, 0]], np.float32)
+        r = INPUT / sizes
+        boxes = np.stack([meta[keep, 1] / r, meta[keep, 2] / r, sizes, sizes], axis=1).astype(np.float32)
+        keep = keep[_suppress(boxes, conf[keep])][:MAX_REFINE]
+        return self._refine(pyramid, meta[keep], cls[keep], threshold)
+
+    def _refine(self, pyramid, meta: np.ndarray, cls: np.ndarray,
+                threshold: float) -> List[Tuple[str, int, int, int, int, float]]:
+        """每个候选在 ±半个步长范围内逐像素平移，取该类概率最高的位置（全部候选一次前向）"""
+        half = STRIDE * CELL // 2
+        offs = [(dx, dy) for dy in range(-half, half + 1) for dx in range(-half, half + 1)]
+        crops, origin = [], []
+        for i, (li, x, y) in enumerate(meta):
+            small = pyramid[li][1]
+            hs, ws = small.shape[:2]
+            for dx, dy in offs:
+                xx = min(max(x + dx, 0), ws - INPUT)
+                yy = min(max(y + dy, 0), hs - INPUT)
+                crops.append(small[yy:yy + INPUT, xx:xx + INPUT])
+                origin.append((i, xx, yy))
+        probs = self.predict(np.stack(crops)).reshape(len(meta), len(offs), -1)
+        out = []
+        boxes, scores = [], []
+        for i, (li, _x, _y) in enumerate(meta):
+            c = int(cls[i])
+            j = int(probs[i, :, c].argmax())
+            p = float(probs[i, j, c])
+            if p < threshold:
+                continue
+            S = pyramid[li][0]
+            r = INPUT / S
+            _, xx, yy = origin[i * len(offs) + j]
+            cx, cy = (xx + INPUT / 2) / r, (yy + INPUT / 2) / r
+            th, tw = self.tpl_sizes[c]
+            est = S / (max(th, tw) * CROP_PAD)             # 窗口尺寸反推的模板缩放
+            w, h = int(round(tw * est)), int(round(th * est))
+            out.append((self.keys[c], int(round(cx - w / 2)), int(round(cy - h / 2)), w, h, p))
+            boxes.append((cx - w / 2, cy - h / 2, w, h))
+            scores.append(p)
+        if len(out) > 1:
+            out = [out[i] for i in _suppress(np.array(boxes, np.float32), np.array(scores, np.float32))]
+        return out
+
+    @traced("classifier.best_match")
+    def best_match(self, hay: np.ndarray, threshold: float, min_margin: float) -> BestMatch:
+        """与 img_tool.best_match 相同的返回格式；分数为各类在全部窗口上的最高概率（模板原始尺寸，不搜尺度）"""
+        feats, _meta = self._windows(self._pyramid(hay, self.native))
+        if not len(feats):
+            return BestMatch(None, 0.0, 0.0, False, {})
+        per_class = self.model.forward(feats)[:, :-1].max(axis=0)
+        scores = {k: float(p) for k, p in zip(self.keys, per_class)}
+        order = np.argsort(per_class)[::-1]
+        best = float(per_class[order[0]])
+        second = float(per_class[order[1]]) if len(order) > 1 else 0.0
+        margin = best - second
+        if best < threshold:
+            return BestMatch(None, best, margin, False, scores)
+        return BestMatch(self.keys[order[0]], best, margin, margin < min_margin, scores)
+
+    # ---------------- 存取 ----------------
+    def save(self, path: Path, fingerprint: str):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        m = self.model
+        np.savez(path, w1=m.w1, b1=m.b1, w2=m.w2, b2=m.b2, tpl_sizes=self.tpl_sizes,
+                 keys=np.array(self.keys), names=np.array(self.names), fingerprint=np.array(fingerprint))
+
+    @classmethod
+    def load(cls, path: Path, group: str, fingerprint: str) -> Optional["Classifier"]:
+        """指纹不符（模板 / 比例 / 超参变了）时返回 None"""
+        try:
+            with np.load(path) as z:
+                if str(z["fingerprint"]) != fingerprint:
+                    return None
+                return cls(group, [str(k) for k in z["keys"]], [str(n) for n in z["names"]],
+                           z["tpl_sizes"], MLP(z["w1"], z["b1"], z["w2"], z["b2"]))
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def _fingerprint(group: str, items: Sequence[Tuple[str, str, np.ndarray]]) -> str:
+    h = hashlib.blake2b(digest_size=12)
+    h.update(repr((MODEL_VERSION, INPUT, CELL, BINS, HOG_EPS, HIDDEN, CROP_PAD, STRIDE, POS_PER_CLASS, NEG_RATIO, EPOCHS, SEED,
+                   MINING_ROUNDS, MINING_IMAGES, MINING_SIZE, MINING_EPOCHS, MINING_OBJECTS, group, FULL_ROTATION.get(group))).encode())
+    for key, _cn, tpl in items:
+        h.update(key.encode())
+        h.update(np.asarray(tpl.shape, np.int32).tobytes())
+        h.update(np.ascontiguousarray(tpl))
+    return h.hexdigest()
+
+
+def _mine(clf: "Classifier", tpls: List[np.ndarray], rot: List[bool], rng: np.random.Generator,
+          textures: List[np.ndarray], limit: int) -> np.ndarray:
+    """
+    难例挖掘：背景图上随机贴几个模板后滑窗，被认成目标、但位置 / 尺寸和真实图标对不上的窗口
+    （纯背景、半个图标、大窗口套小图标等）作为新的背景样本
+    """
+    found = []
+    for _ in range(MINING_IMAGES):
+        canvas = _texture(rng, MINING_SIZE, textures)
+        truth = []                                  # (cx, cy, 合适的窗口边长)
+        for _ in range(MINING_OBJECTS):
+            c = int(rng.integers(len(tpls)))
+            t = tpls[c]
+            sc = rng.uniform(0.9, 1.1)
+            t = cv2.resize(t, None, fx=sc, fy=sc, interpolation=cv2.INTER_AREA)
+            angle = rng.uniform(0, 360) if rot[c] else 0.0
+            if angle:
+                t = rotate_bound(t, angle)
+            h, w = t.shape[:2]
+            if h >= MINING_SIZE or w >= MINING_SIZE:
+                continue
+            x, y = int(rng.integers(0, MINING_SIZE - w)), int(rng.integers(0, MINING_SIZE - h))
+            canvas[y:y + h, x:x + w] = t
+            truth.append((x + w / 2, y + h / 2, max(tpls[c].shape[:2]) * sc * CROP_PAD))
+        pyramid = clf._pyramid(canvas)
+        feats, meta = clf._windows(pyramid)
+        hit = clf.model.forward(feats)[:, :-1].max(axis=1) > 0.3
+        sizes = np.array([pyramid[li][0] for li in meta[:, 0]], np.float32)
+        r = INPUT / sizes
+        cx, cy = (meta[:, 1] + INPUT / 2) / r, (meta[:, 2] + INPUT / 2) / r
+        good = np.zeros(len(feats), bool)
+        for tx, ty, ts in truth:
+            good |= ((np.hypot(cx - tx, cy - ty) < 0.2 * ts) & (sizes > ts / 1.3) & (sizes < ts * 1.3))
+        found.append(feats[hit & ~good])
+    hard = np.concatenate(found)
+    if len(hard) > limit:
+        hard = hard[rng.choice(len(hard), limit, replace=False)]
+    return hard
+
+
+def _suppress(boxes: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """按分数降序保留，中心落在已保留框内的丢掉（大窗口套小窗口时 IoU 很小，普通 NMS 去不掉）"""
+    keep: List[int] = []
+    for i in np.argsort(-scores):
+        cx, cy = boxes[i, 0] + boxes[i, 2] / 2, boxes[i, 1] + boxes[i, 3] / 2
+        if not any(boxes[k, 0] <= cx <= boxes[k, 0] + boxes[k, 2] and
+                   boxes[k, 1] <= cy <= boxes[k, 1] + boxes[k, 3] for k in keep):
+            keep.append(int(i))
+    return np.asarray(keep, np.int64)
+
+
+def train(group: str, seed: int = SEED) -> Classifier:
+    """用模板组当前比例的模板训练一个分类器（不落盘）"""
+    bank = get_bank()
+    items = bank.items(group, color=True)
+    if not items:
+        raise ValueError(f"模板组 {group} 没有可用模板")
+    rng = np.random.default_rng(seed)
+    textures = [tpl for _k, _cn, tpl in bank.items("scene", color=True) if min(tpl.shape[:2]) >= 16]
+    rot = [key in FULL_ROTATION.get(group, ()) for key, _cn, _t in items]
+    k = len(items)
+    t0 = time.perf_counter()
+    with span("classifier.train", group=group):
+        tpls = [t for _k, _cn, t in items]
+        x, y = _dataset(tpls, rot, rng, textures)
+        model = MLP.init(x.shape[1], HIDDEN, k + 1, rng)
+        clf = Classifier(group, [key for key, _cn, _t in items], [cn for _k, cn, _t in items],
+                         np.array([t.shape[:2] for _k, _cn, t in items], np.int32), model)
+        model.fit(x, y, EPOCHS, rng)
+        for r in range(MINING_ROUNDS):
+            hard = _mine(clf, tpls, rot, rng, textures, len(x) // 2)
+            log.debug("难例挖掘第 %d 轮：%d 个误检窗口", r + 1, len(hard))
+            if not len(hard):
+                break
+            x = np.concatenate([x, hard])
+            y = np.concatenate([y, np.full(len(hard), k, np.int64)])
+            model.fit(x, y, MINING_EPOCHS, rng)
+    acc = float((model.forward(x).argmax(axis=1) == y).mean())
+    log.info("分类器 %s：%d 类，%d 个样本，训练集准确率 %.3f，%.1fs",
+             group, k, len(x), acc, time.perf_counter() - t0)
+    return clf
+
+
+# ================= 进程级缓存 =================
+_CLASSIFIERS: Dict[Tuple[str, float], Classifier] = {}
+_LOCK = threading.Lock()
+
+
+def get_classifier(group: str) -> Classifier:
+    """按 (模板组, 模板比例) 缓存；磁盘上有指纹相同的模型就直接读，否则训练并保存"""
+    bank = get_bank()
+    ck = (group, bank.scale)
+    clf = _CLASSIFIERS.get(ck)
+    if clf is not None:
+        return clf
+    with _LOCK:
+        clf = _CLASSIFIERS.get(ck)
+        if clf is None:
+            items = bank.items(group, color=True)
+            fp = _fingerprint(group, items)
+            path = MODEL_DIR / f"{group}_x{bank.scale:.4f}.npz"
+            clf = Classifier.load(path, group, fp) if path.exists() else None
+            if clf is None:
+                log.info("训练分类器 %s（模板比例 %.3f）…", group, bank.scale)
+                clf = train(group)
+                clf.save(path, fp)
+            _CLASSIFIERS[ck] = clf
+    return clf
+
+
+if __name__ == "__main__":
+    import argparse
+    from tools.trace import setup_logging
+    setup_logging()
+    ap = argparse.ArgumentParser(description="训练意图 / 卡牌类型分类器")
+    ap.add_argument("cmd", choices=["train"])
+    ap.add_argument("groups", nargs="+", choices=["enemy", "card_kind"])
+    args = ap.parse_args()
+    for g in args.groups:
+        _CLASSIFIERS.clear()
+        for p in MODEL_DIR.glob(f"{g}_x*.npz"):
+            p.unlink()                      # 强制重新训练
+        c = get_classifier(g)
+        print(f"{g}: {len(c.keys)} 类，窗口尺寸 {c.sizes}")
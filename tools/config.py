@@ -1,5 +1,6 @@
+import tempfile
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 
 ROOT = Path(__file__).resolve().parent.parent
 
@@ -7,8 +8,46 @@ ROOT = Path(__file__).resolve().parent.parent
 DATA_SCENE = ROOT / 'data' / 'scene'
 DATA_ENEMY = ROOT / 'data' / 'enemy'
 DATA_CARD = ROOT / 'data' / 'card'
+DATA_DIGIT = ROOT / 'data' / 'digit'      # 数字字形模板：0.png … 9.png，同一数字多份样本用 3_1.png 这种命名
+DATA_LAYOUT = ROOT / 'data' / 'layouts'   # 分辨率 / UI 缩放布局（ROI 工具导出的 JSON）
+ROI_TOOL_CONFIG = ROOT / 'tools' / '识图小工具' / 'roi_config.json'   # ROI 工具的保存文件，带 _meta 时直接当一份布局
+TPL_CACHE_DIR = ROOT / 'data' / 'cache'   # 按布局预缩放的模板缓存（自动生成）
 
 MATCH_THRESHOLD = 0.75
+# 场景金字塔匹配（match_scene / scene_engine 共用）
+SCENE_PYRAMID_SCALE = 0.25
+SCENE_COARSE_SLACK = 0.3        # 粗匹配分数比阈值低这么多就不再精修
+
+# ---------- 截图后端 ----------
+# "auto"（优先 mss，缺依赖退回 PIL）| "mss" | "pil" | "replay"
+# 环境变量 STS_CAPTURE / STS_REPLAY 可覆盖
+CAPTURE_BACKEND = "auto"
+CAPTURE_REPLAY_SOURCE = ""      # replay 后端的截图目录或视频文件
+
+# ---------- ROI 结果缓存 ----------
+ROI_CACHE_SIZE = 256            # LRU 最大条目数
+ROI_CACHE_TOLERANT = False      # True：用感知哈希，容忍轻微像素差异
+
+# ---------- 布局 ----------
+# 下面的 ROI / 模板都是在 LAYOUT_BASE_SIZE 下截取的，其他分辨率见 tools/layout.py
+LAYOUT_BASE_SIZE = (2560, 1440)
+LAYOUT_PROFILE = "auto"         # "auto"：按首帧尺寸自动选择 | "base"：不缩放 | data/layouts 下的文件名（不含 .json）
+
+# ---------- 计时 ----------
+TRACE_ENABLED = False           # True：记录各阶段耗时（tools/trace.py），环境变量 STS_TRACE=1 可覆盖
+TRACE_MAX_EVENTS = 100_000      # 保留最近多少个 span（导出 Chrome trace 用）
+TRACE_HIST_WINDOW = 512         # 每个阶段按最近多少次计算分位数
+
+# ---------- 分类器后端 ----------
+CLASSIFIER_ENABLED = False      # True：意图 / 卡牌类型改用 tools/classifier.py 的小模型，环境变量 STS_CLASSIFIER=1 可覆盖
+
+# ---------- 常驻识别服务 ----------
+# tools/daemon.py：Linux / macOS 监听 Unix socket，Windows 监听本机 TCP
+DAEMON_SOCKET = Path(tempfile.gettempdir()) / 'sts-recognizer.sock'
+DAEMON_TCP = ("127.0.0.1", 47815)
+
+# ---------- OCR ----------
+OCR_WARMUP = False              # True：导入 ocr_tool 时在后台线程预热 EasyOCR
 
 # ---------- 全屏场景模板 ----------
 SCENE_MAP: Dict[str, Tuple[str, str]] = {
@@ -31,6 +70,28 @@ SCENE_MAP: Dict[str, Tuple[str, str]] = {
     "lose2": ("失败2", "lose2.png"),
 }
 
+# ---------- 场景转移图 ----------
+# 上一场景 -> 最可能的下一场景（按可能性排序），场景引擎据此决定检查顺序
+SCENE_TRANSITIONS: Dict[str, List[str]] = {
+    "start": ["chose_mode"],
+    "chose_mode": ["chose_person"],
+    "chose_person": ["first_chose"],
+    "first_chose": ["map"],
+    "map": ["battle", "???room", "shop", "rest", "Box"],
+    "battle": ["battle_settlement", "failure", "lose1", "lose2"],
+    "battle_settlement": ["chose_one_card", "map", "advance"],
+    "chose_one_card": ["battle_settlement", "map", "advance"],
+    "advance": ["map"],
+    "shop": ["map", "advance"],
+    "rest": ["map", "advance"],
+    "Box": ["map", "advance"],
+    "???room": ["battle", "map", "advance"],
+    "failure": ["lose1", "lose2", "start"],
+    "victory": ["start"],
+    "lose1": ["lose2", "start"],
+    "lose2": ["start"],
+}
+
 # ---------- 敌人意图模板 ----------
 INTENT_MAP: Dict[str, Tuple[str, str]] = {
     "attack1": ("攻击1", "attack1.png"),
@@ -76,7 +137,7 @@ SMALL_ENERGY_MAP: Dict[str, Tuple[str, str]] = {
 # - 大能量：energy_0.png, energy_1.png, energy_2.png, energy_3.png
 # - 小能量：energy_0_small.png, energy_1_small.png, energy_2_small.png, energy_3_small.png
 
-# ========== 战斗画面固定 ROI（1920×1080） ==========
+# ========== 战斗画面固定 ROI（LAYOUT_BASE_SIZE） ==========
 ROI_MAP = {
     "player_hp": {"left": 424, "top": 6, "width": 57, "height": 70},
     "player_hp_max": { "left": 642,"top": 1165,"width": 40,"height": 43},
@@ -92,4 +153,8 @@ ROI_MAP = {
 
 # ---------- 动态识别区域 ----------
 Card_AREA = {"left": 736,"top": 302,"width": 965,"height": 940}
+# 未选中时整副手牌的扇形区域（用 ROI 工具框选后替换）
+HAND_AREA = {"left": 420, "top": 1010, "width": 1720, "height": 430}
+# 手牌中卡牌相对选中放大卡牌（模板来源）的缩放比例，多尺度搜索
+HAND_SCALES = (0.55, 0.65, 0.75)
 ENEMY_AREA = {"left": 1298, "top": 525, "width": 1265, "height": 708}
\ No newline at end of file
@@ -0,0 +1,317 @@
+"""
+常驻识别进程：模板库、EasyOCR、截图后端只初始化一次，通过本地 socket 提供识别
+  python -m tools.daemon                  启动（Linux / macOS 用 Unix socket，Windows 用本机 TCP）
+  from tools.daemon import Client
+  with Client() as c:
+      c.scene(); c.battle_state(); c.enemy_intents(); c.hand()
+      c.state()                              # 增量 GameState + 变化事件（见 game_state.py）
+      c.batch(["scene", "enemy_intents"])    # 同一帧上做多项识别
+协议：每条消息 = 4 字节大端长度 + UTF-8 JSON
+  请求 {"id": 1, "op": "scene"} 或 {"id": 2, "op": "batch", "ops": [...]}
+  响应 {"id": 1, "ok": true, "result": ..., "ms": 12.3} / {"id": 1, "ok": false, "error": "..."}
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import fields, is_dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from tools.config import DAEMON_SOCKET, DAEMON_TCP
+from tools.frame import Frame, ensure_frame
+
+log = logging.getLogger(__name__)
+
+_HEADER = struct.Struct(">I")
+MAX_MESSAGE = 16 * 1024 * 1024
+USE_UNIX = sys.platform != "win32"
+
+
+# ================= 编解码 =================
+def encode(msg: Dict[str, Any]) -> bytes:
+    body = json.dumps(msg, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+    return _HEADER.pack(len(body)) + body
+
+
+def _default(obj: Any) -> Any:
+    """NamedTuple -> dict，numpy 标量 -> Python 数字"""
+    if hasattr(obj, "_asdict"):
+        return obj._asdict()
+    if hasattr(obj, "item"):
+        return obj.item()
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"无法序列化：{type(obj).__name__}")
+
+
+def _jsonable(value: Any) -> Any:
+    """NamedTuple 在 json 里会被当成列表、dataclass 不能直接序列化，先递归转成 dict"""
+    if is_dataclass(value) and not isinstance(value, type):
+        return {f.name: _jsonable(getattr(value, f.name)) for f in fields(value)}
+    if hasattr(value, "_asdict"):
+        return {k: _jsonable(v) for k, v in value._asdict().items()}
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+# ================= 服务端 =================
+class RequestError(ValueError):
+    """请求本身有问题（无效 JSON、未知操作、消息过长），不记录堆栈"""
+
+
+def _parse(body: bytes) -> Dict[str, Any]:
+    """请求体 -> dict；不是合法 JSON 对象时报 RequestError（回错误响应，连接保持）"""
+    try:
+        req = json.loads(body)
+    except ValueError as e:         # JSONDecodeError / UnicodeDecodeError
+        raise RequestError(f"无效 JSON：{e}") from None
+    if not isinstance(req, dict):
+        raise RequestError(f"请求应为 JSON 对象，收到 {type(req).__name__}")
+    return req
+
+
+def _ops() -> Dict[str, Callable[[Frame], Any]]:
+    """op 名 -> fn(frame)；模块按需导入，缺依赖的 op 调用时报错"""
+    def scene(frame):
+        from tools.match_scene import match_current_scene
+        return match_current_scene(frame)
+
+    def battle_state(frame):
+        from tools.ocr_tool import battle_state as bs
+        return bs(frame)
+
+    def enemy_intents(frame):
+        from tools.match_enemy import scan_intents
+        return scan_intents(frame)
+
+    def hand(frame):
+        from tools.hand_parser import parse_hand
+        return parse_hand(frame)
+
+    def state(frame):
+        from tools.game_state import get_tracker
+        st, changes = get_tracker().update(frame)
+        return {"state": st, "changes": [{"path": c.path, "old": c.old, "new": c.new, "text": str(c)}
+                                         for c in changes]}
+
+    return {"scene": scene, "battle_state": battle_state,
+            "enemy_intents": enemy_intents, "hand": hand, "state": state}
+
+
+class Daemon:
+    """asyncio 服务端：每个请求现截一帧（batch 内共用），识别放在线程池里跑"""
+
+    def __init__(self, workers: int = 4):
+        self.ops = _ops()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="daemon")
+        self._locks = {name: threading.Lock() for name in self.ops}   # StateTracker 等有状态，同一 op 串行（场景引擎自带锁）
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._conns: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self.started = time.time()
+        self.served = 0
+
+    def warm(self):
+        """预热：截图后端、布局、模板库、OCR 识别器"""
+        from tools.tpl_bank import get_bank
+        t0 = time.perf_counter()
+        ensure_frame(None)
+        n = get_bank().preload()
+        try:
+            from tools.ocr_tool import warmup_reader
+            warmup_reader(background=False)
+        except ImportError as e:
+            log.warning("OCR 不可用，battle_state 将报错：%s", e)
+        log.info("预热完成：%d 个模板，%.2fs", n, time.perf_counter() - t0)
+
+    def _run(self, names: List[str]) -> Dict[str, Any]:
+        frame = ensure_frame(None)
+        out = {}
+        for name in names:
+            with self._locks[name]:
+                out[name] = self.ops[name](frame)
+        return out
+
+    async def _handle(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        op = req.get("op")
+        if op == "ping":
+            return {"pid": os.getpid(), "uptime": time.time() - self.started, "served": self.served}
+        if op == "stats":
+            from tools import trace
+            return {"trace": trace.get_tracer().stats(), "served": self.served}
+        if op == "shutdown":
+            self._stopped.set()
+            return None
+        names = req.get("ops") if op == "batch" else [op]
+        unknown = [n for n in names or [] if n not in self.ops]
+        if not names or unknown:
+            raise RequestError(f"未知操作：{unknown or op}")
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self._executor, self._run, names)
+        return result if op == "batch" else result[op]
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._conns[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    head = await reader.readexactly(_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                (n,) = _HEADER.unpack(head)
+                if n > MAX_MESSAGE:
+                    # 后面的字节流已经对不上了，先回错误响应再断开
+                    err = f"消息过长：{n}（上限 {MAX_MESSAGE}）"
+                    writer.write(encode({"id": None, "ok": False, "error": err}))
+                    await writer.drain()
+                    raise RequestError(err)
+                try:
+                    body = await reader.readexactly(n)
+                except asyncio.IncompleteReadError:
+                    break
+                t0 = time.perf_counter()
+                req: Dict[str, Any] = {}
+                try:
+                    req = _parse(body)
+                    result = await self._handle(req)
+                    resp = {"id": req.get("id"), "ok": True, "result": _jsonable(result)}
+                except RequestError as e:
+                    resp = {"id": req.get("id"), "ok": False, "error": str(e)}
+                except Exception as e:
+                    log.exception("处理请求出错：%s", req.get("op"))
+                    resp = {"id": req.get("id"), "ok": False, "error": f"{type(e).__name__}: {e}"}
+                resp["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+                self.served += 1
+                writer.write(encode(resp))
+                await writer.drain()
+        except (ConnectionError, RequestError) as e:
+            log.warning("连接异常断开：%s", e)
+        finally:
+            self._conns.pop(writer, None)
+            writer.close()
+
+    async def serve(self, address: Union[str, Tuple[str, int], None] = None):
+        self._stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.warm)
+        if USE_UNIX and not isinstance(address, tuple):
+            path = str(address or DAEMON_SOCKET)
+            if os.path.exists(path):
+                os.unlink(path)               # 上次异常退出留下的 socket 文件
+            self._server = await asyncio.start_unix_server(self._client, path)
+            where = path
+        else:
+            host, port = address if isinstance(address, tuple) else DAEMON_TCP
+            self._server = await asyncio.start_server(self._client, host, port)
+            where = f"{host}:{port}"
+        log.info("识别服务已启动：%s", where)
+        async with self._server:
+            await self._stopped.wait()
+            for writer in list(self._conns):       # 关掉其他客户端的连接，读循环随之退出
+                writer.close()
+            await asyncio.gather(*self._conns.values(), return_exceptions=True)
+        self._executor.shutdown(wait=False)
+        log.info("识别服务已退出")
+
+
+# ================= 客户端 =================
+class DaemonError(RuntimeError):
+    pass
+
+
+class Client:
+    """同步客户端，一个实例一条连接（线程间不共享）"""
+
+    def __init__(self, address: Union[str, Tuple[str, int], None] = None, timeout: float = 30.0):
+        if USE_UNIX and not isinstance(address, tuple):
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            target: Any = str(address or DAEMON_SOCKET)
+        else:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            target = address if isinstance(address, tuple) else DAEMON_TCP
+        self._sock.settimeout(timeout)
+        self._sock.connect(target)
+        self._id = 0
+
+    def _recv(self, n: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self._sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("识别服务断开连接")
+            buf += chunk
+        return bytes(buf)
+
+    def request(self, op: str, **kw) -> Any:
+        self._id += 1
+        self._sock.sendall(encode({"id": self._id, "op": op, **kw}))
+        (n,) = _HEADER.unpack(self._recv(_HEADER.size))
+        resp = json.loads(self._recv(n))
+        if not resp.get("ok"):
+            raise DaemonError(resp.get("error"))
+        return resp.get("result")
+
+    def ping(self) -> Dict[str, Any]:
+        return self.request("ping")
+
+    def scene(self) -> Optional[str]:
+        return self.request("scene")
+
+    def battle_state(self) -> Dict[str, Any]:
+        return self.request("battle_state")
+
+    def enemy_intents(self) -> List[Dict[str, Any]]:
+        return self.request("enemy_intents")
+
+    def hand(self) -> List[Dict[str, Any]]:
+        return self.request("hand")
+
+    def state(self) -> Dict[str, Any]:
+        """增量状态：{"state": GameState 字段, "changes": 自上次请求以来的变化}"""
+        return self.request("state")
+
+    def batch(self, ops: List[str]) -> Dict[str, Any]:
+        """多项识别共用同一帧"""
+        return self.request("batch", ops=ops)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.request("stats")
+
+    def shutdown(self):
+        self.request("shutdown")
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+if __name__ == "__main__":
+    import argparse
+    from tools.trace import setup_logging
+    setup_logging()
+    ap = argparse.ArgumentParser(description="常驻识别服务")
+    ap.add_argument("--socket", help="Unix socket 路径")
+    ap.add_argument("--tcp", metavar="HOST:PORT", help="改用 TCP 监听")
+    ap.add_argument("--workers", type=int, default=4)
+    args = ap.parse_args()
+    addr: Union[str, Tuple[str, int], None] = args.socket
+    if args.tcp:
+        host, port = args.tcp.rsplit(":", 1)
+        addr = (host, int(port))
+    asyncio.run(Daemon(args.workers).serve(addr))
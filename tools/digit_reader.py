@@ -0,0 +1,182 @@
+"""
+数字识别：专门读游戏字体的 HP / 能量 / 格挡 / 金币
+二值化 -> 连通域切分 -> 与字形模板做向量化最近邻，给出每一位的置信度
+字形模板放在 data/digit/（0.png … 9.png，可有多份样本 3_1.png）
+仓库不带字形（游戏字体随分辨率 / 缩放变化）：没有字形时 read 的置信度为 0，调用方退回 EasyOCR，
+并默认把 EasyOCR 的读数存成字形（ocr_tool.DIGIT_AUTO_HARVEST），之后同样的数字就不再走 EasyOCR
+"""
+import logging
+import threading
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from tools.config import DATA_DIGIT
+from tools.trace import traced
+
+log = logging.getLogger(__name__)
+
+GLYPH_W, GLYPH_H = 12, 16       # 字形统一缩放到的尺寸
+MIN_HEIGHT_RATIO = 0.45         # 连通域高度低于最高连通域的这个比例视为噪点
+MIN_AREA = 6
+DIGIT_MIN_CONF = 0.80           # 每一位的相似度都不低于它才直接采信
+MAX_SAMPLES = 5                 # harvest 每个数字最多存几份样本
+
+
+class DigitRead(NamedTuple):
+    value: Optional[int]                 # 识别出的整数，切不出数字时为 None
+    conf: float                          # 各位置信度的最小值（无模板 / 无数字时为 0）
+    digits: List[Tuple[int, float]]      # [(数字, 置信度), ...] 从左到右
+
+
+# ================= 切分 =================
+def binarize(patch: np.ndarray) -> np.ndarray:
+    """Otsu 二值化，保证数字为前景（白）"""
+    gray = patch if patch.ndim == 2 else cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY)
+    _, bw = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # 边框像素大多是白的说明背景被当成了前景，反转
+    border = np.concatenate([bw[0], bw[-1], bw[:, 0], bw[:, -1]])
+    if np.count_nonzero(border) > border.size // 2:
+        bw = cv2.bitwise_not(bw)
+    return bw
+
+def _tight(bw: np.ndarray) -> np.ndarray:
+    """裁到前景的外接矩形"""
+    pts = cv2.findNonZero(bw)
+    if pts is None:
+        return bw
+    x, y, w, h = cv2.boundingRect(pts)
+    return bw[y:y + h, x:x + w]
+
+def segment(patch: np.ndarray) -> List[np.ndarray]:
+    """按连通域切出每一位数字的二值图，从左到右"""
+    bw = binarize(patch)
+    n, _labels, stats, _ = cv2.connectedComponentsWithStats(bw, connectivity=8)
+    if n <= 1:
+        return []
+    stats = stats[1:]                              # 去掉背景
+    stats = stats[stats[:, cv2.CC_STAT_AREA] >= MIN_AREA]
+    if len(stats) == 0:
+        return []
+    max_h = stats[:, cv2.CC_STAT_HEIGHT].max()
+    stats = stats[stats[:, cv2.CC_STAT_HEIGHT] >= MIN_HEIGHT_RATIO * max_h]
+    stats = stats[np.argsort(stats[:, cv2.CC_STAT_LEFT])]
+    return [bw[y:y + h, x:x + w] for x, y, w, h, _a in stats]
+
+def _vectorize(glyphs: List[np.ndarray]) -> np.ndarray:
+    """字形 -> (N, GLYPH_W*GLYPH_H) 零均值单位长度向量"""
+    if not glyphs:
+        return np.empty((0, GLYPH_W * GLYPH_H), dtype=np.float32)
+    vecs = np.stack([cv2.resize(g, (GLYPH_W, GLYPH_H), interpolation=cv2.INTER_AREA).ravel()
+                     for g in glyphs]).astype(np.float32)
+    vecs -= vecs.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs / np.maximum(norms, 1e-6)
+
+
+# ================= 识别器 =================
+class DigitReader:
+    """
+    reader = DigitReader()
+    reader.read(patch)  -> DigitRead
+    """
+
+    def __init__(self, glyph_dir: Path = DATA_DIGIT):
+        self.glyph_dir = Path(glyph_dir)
+        self._tpl: Optional[np.ndarray] = None       # (M, D)
+        self._labels: Optional[np.ndarray] = None    # (M,)
+        self._lock = threading.Lock()
+        self._warned = False
+
+    def reload(self):
+        """重新读取字形目录"""
+        glyphs, labels = [], []
+        if self.glyph_dir.is_dir():
+            for path in sorted(self.glyph_dir.glob("*.png")):
+                label = path.stem.split("_")[0]
+                if not label.isdigit() or len(label) != 1:
+                    continue
+                img = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+                if img is None:
+                    continue
+                # 字形文件可能是已经二值化的单个字符（harvest 存的），也可能是原图截块
+                if np.isin(img, (0, 255)).all():
+                    glyphs.append(_tight(img))
+                else:
+                    parts = segment(img)
+                    glyphs.append(parts[0] if len(parts) == 1 else _tight(binarize(img)))
+                labels.append(int(label))
+        with self._lock:
+            self._tpl = _vectorize(glyphs)
+            self._labels = np.asarray(labels, dtype=np.int32)
+        if not labels and not self._warned:
+            self._warned = True
+            log.warning("没有数字字形（%s），数字全部由 EasyOCR 读取，直到收集到字形", self.glyph_dir)
+
+    @property
+    def ready(self) -> bool:
+        if self._tpl is None:
+            self.reload()
+        return len(self._labels) > 0
+
+    def classify(self, glyphs: List[np.ndarray]) -> List[Tuple[int, float]]:
+        """对切好的字形批量分类，返回 [(数字, 相似度), ...]"""
+        if not glyphs or not self.ready:
+            return []
+        sims = _vectorize(glyphs) @ self._tpl.T                    # (N, M)
+        # 每个数字取该类样本里的最高相似度
+        per_cls = np.full((len(glyphs), 10), -1.0, dtype=np.float32)
+        for d in np.unique(self._labels):
+            per_cls[:, d] = sims[:, self._labels == d].max(axis=1)
+        best = per_cls.argmax(axis=1)
+        conf = per_cls[np.arange(len(glyphs)), best]
+        return [(int(d), float(c)) for d, c in zip(best, conf)]
+
+    @traced("digit.read")
+    def read(self, patch: np.ndarray) -> DigitRead:
+        digits = self.classify(segment(patch))
+        if not digits:
+            return DigitRead(None, 0.0, [])
+        value = int("".join(str(d) for d, _ in digits))
+        return DigitRead(value, min(c for _, c in digits), digits)
+
+    def harvest(self, patch: np.ndarray, text: str) -> int:
+        """
+        用已确认的读数（例如 EasyOCR 的结果）把 patch 切出的字形存为新样本
+        切出的字形数与数字位数一致才保存，每个数字最多 MAX_SAMPLES 份，返回保存的个数
+        """
+        digits = "".join(c for c in text if c.isdigit())
+        glyphs = segment(patch)
+        if not digits or len(glyphs) != len(digits):
+            return 0
+        self.glyph_dir.mkdir(parents=True, exist_ok=True)
+        saved = 0
+        for d, g in zip(digits, glyphs):
+            if sum(p.stem.split("_")[0] == d for p in self.glyph_dir.glob("*.png")) >= MAX_SAMPLES:
+                continue
+            name, k = f"{d}.png", 1
+            while (self.glyph_dir / name).exists():
+                name, k = f"{d}_{k}.png", k + 1
+            cv2.imwrite(str(self.glyph_dir / name), g)
+            saved += 1
+        if saved:
+            log.info("收集数字字形：%s（%d 个）", digits, saved)
+            self.reload()
+        return saved
+
+
+# ================= 进程级单例 =================
+_READER: Optional[DigitReader] = None
+
+
+def get_digit_reader() -> DigitReader:
+    global _READER
+    if _READER is None:
+        _READER = DigitReader()
+    return _READER
+
+
+def read_digits(patch: np.ndarray) -> DigitRead:
+    return get_digit_reader().read(patch)
@@ -0,0 +1,113 @@
+"""
+单次截图快照：一次识别流程里所有识别器共用同一帧
+灰度 / BGR 按需转换并缓存，ROI 按名称返回零拷贝视图
+"""
+import time
+from typing import Dict, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from tools.config import ROI_MAP, Card_AREA, ENEMY_AREA, HAND_AREA
+from tools.img_tool import dict2tuple, crop
+from tools.trace import span
+
+# 名称 -> ROI 字典（ROI_MAP 全部键 + 两个动态区域）
+AREA_MAP: Dict[str, Dict[str, int]] = {
+    **ROI_MAP,
+    "card": Card_AREA,
+    "enemy": ENEMY_AREA,
+    "hand": HAND_AREA,
+}
+
+RoiLike = Union[str, Dict[str, int], Tuple[int, int, int, int], None]
+
+
+def _ensure_layout(frame: Optional["Frame"] = None):
+    """按名称取 ROI 前先确定布局，否则没有共享帧的调用路径会用到基准分辨率的 ROI"""
+    from tools.layout import ensure_layout
+    ensure_layout(frame)
+
+
+def resolve_roi(roi: RoiLike) -> Optional[Tuple[int, int, int, int]]:
+    """名称 / ROI 字典 / (x, y, w, h) 统一转成元组；名称按当前布局解析（第一次会先选择布局）"""
+    if roi is None or isinstance(roi, tuple):
+        return roi
+    if isinstance(roi, str):
+        _ensure_layout()
+        if roi not in AREA_MAP:
+            raise KeyError(f"未知 ROI 名称：{roi}")
+        roi = AREA_MAP[roi]
+    return dict2tuple(roi)
+
+
+class Frame:
+    """
+    一帧截图
+    frame = Frame.grab()
+    frame.gray / frame.bgr        -> 全屏图（首次访问时转换）
+    frame.roi("player_hp")        -> 灰度 ROI 视图
+    frame.roi("enemy", color=True) -> BGR ROI 视图
+    """
+    __slots__ = ("_rgb", "_bgr", "_gray", "_levels", "ts")
+
+    def __init__(self, rgb: Optional[np.ndarray] = None, bgr: Optional[np.ndarray] = None,
+                 ts: Optional[float] = None):
+        if rgb is None and bgr is None:
+            raise ValueError("Frame 需要 rgb 或 bgr 图像")
+        self._rgb = rgb
+        self._bgr = bgr
+        self._gray: Optional[np.ndarray] = None
+        self._levels: Dict[bool, Dict[float, np.ndarray]] = {}
+        self.ts = time.time() if ts is None else ts
+
+    @classmethod
+    def grab(cls) -> "Frame":
+        """用当前截图后端截一次全屏"""
+        from tools.capture import get_backend
+        with span("capture.grab"):
+            return cls(bgr=get_backend().grab())
+
+    # ---------------- 颜色空间 ----------------
+    @property
+    def bgr(self) -> np.ndarray:
+        if self._bgr is None:
+            with span("frame.cvt_bgr"):
+                self._bgr = cv2.cvtColor(self._rgb, cv2.COLOR_RGB2BGR)
+        return self._bgr
+
+    @property
+    def gray(self) -> np.ndarray:
+        if self._gray is None:
+            with span("frame.cvt_gray"):
+                if self._bgr is not None:
+                    self._gray = cv2.cvtColor(self._bgr, cv2.COLOR_BGR2GRAY)
+                else:
+                    self._gray = cv2.cvtColor(self._rgb, cv2.COLOR_RGB2GRAY)
+        return self._gray
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        src = self._bgr if self._bgr is not None else self._rgb
+        return src.shape[:2]
+
+    def image(self, color: bool = False) -> np.ndarray:
+        return self.bgr if color else self.gray
+
+    def levels(self, color: bool = False) -> Dict[float, np.ndarray]:
+        """缩小图缓存 {scale: img}，供 img_tool.match_pyramid 复用"""
+        return self._levels.setdefault(color, {})
+
+    # ---------------- ROI ----------------
+    def roi(self, roi: RoiLike, color: bool = False) -> np.ndarray:
+        """返回 ROI 视图（与整帧共享内存，需要改写时请自行 copy）"""
+        if isinstance(roi, str):
+            _ensure_layout(self)            # 还没有布局时按这一帧的尺寸选
+        return crop(self.image(color), resolve_roi(roi))
+
+
+def ensure_frame(frame: Optional[Frame]) -> Frame:
+    """没有传入帧时现截一帧；第一帧到来时确定布局（见 layout.py）"""
+    frame = frame if frame is not None else Frame.grab()
+    _ensure_layout(frame)
+    return frame
@@ -0,0 +1,254 @@
+"""
+增量游戏状态：类型化快照 + 变化事件
+tracker = StateTracker()
+state, changes = tracker.update(frame)      # frame 省略时现截一帧
+for c in changes:
+    print(c)                                 # "hp 54→48"、"enemy 2 intent attack1→defend"
+只有 ROI 像素变了的子状态才重新识别（像素哈希，见 roi_cache.py）；场景变化时全部重算
+快照是不可变的 slotted dataclass，没变的子状态在新旧快照之间共享同一个对象；
+整帧都没变化时 update 直接返回上一份快照和空列表
+"""
+import logging
+from dataclasses import dataclass, fields, replace
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from tools.config import ROI_CACHE_TOLERANT
+from tools.frame import Frame, ensure_frame, resolve_roi
+from tools.roi_cache import roi_hash, roi_phash
+from tools.trace import traced
+
+log = logging.getLogger(__name__)
+
+# 这些场景里才识别玩家数值、敌人、手牌
+BATTLE_SCENES = ("battle",)
+# PlayerState 字段 -> AREA_MAP 里的数字 ROI
+PLAYER_ROIS: Dict[str, str] = {
+    "hp": "player_hp",
+    "hp_max": "player_hp_max",
+    "energy": "player_energy",
+    "energy_max": "player_energy_max",
+    "block": "player_block",
+    "gold": "gold",
+}
+
+
+# ================= 快照 =================
+@dataclass(frozen=True, slots=True)
+class PlayerState:
+    hp: Optional[int] = None
+    hp_max: Optional[int] = None
+    energy: Optional[int] = None
+    energy_max: Optional[int] = None
+    block: Optional[int] = None
+    gold: Optional[int] = None
+
+
+@dataclass(frozen=True, slots=True)
+class EnemyState:
+    """每个意图图标算一个敌人，从左到右编号"""
+    index: int                  # 1..n
+    intent: str                 # INTENT_MAP 的键
+    name: str                   # 中文名
+    x: int                      # 意图图标中心在全屏上的坐标
+    y: int
+    score: float
+
+
+@dataclass(frozen=True, slots=True)
+class CardState:
+    slot: int                   # 从左到右 1..n
+    hotkey: str
+    type: str                   # CARD_KIND_MAP 的键
+    name: str
+    cost: Optional[int]
+
+
+@dataclass(frozen=True, slots=True)
+class GameState:
+    seq: int = 0                            # 每次有变化 +1
+    ts: float = 0.0                         # 最近一次变化所在帧的截图时间
+    scene: Optional[str] = None             # SCENE_MAP 的键，未识别为 None
+    player: PlayerState = PlayerState()
+    enemies: Tuple[EnemyState, ...] = ()
+    hand: Tuple[CardState, ...] = ()
+
+
+class Change(NamedTuple):
+    """一条变化事件；old / new 为 None 表示出现 / 消失"""
+    path: str                   # "scene"、"player.hp"、"enemy.2.intent"、"hand.3"
+    old: Any
+    new: Any
+
+    def __str__(self) -> str:
+        label = self.path.split(".", 1)[-1] if self.path.startswith("player.") \
+            else self.path.replace(".", " ")
+        if self.old is None:
+            return f"{label} +{self.new}"
+        if self.new is None:
+            return f"{label} -{self.old}"
+        return f"{label} {self.old}→{self.new}"
+
+
+# ================= 比较 =================
+def _diff_player(old: PlayerState, new: PlayerState) -> List[Change]:
+    if old is new:
+        return []
+    return [Change(f"player.{f.name}", getattr(old, f.name), getattr(new, f.name))
+            for f in fields(PlayerState) if getattr(old, f.name) != getattr(new, f.name)]
+
+
+def _diff_enemies(old: Tuple[EnemyState, ...], new: Tuple[EnemyState, ...]) -> List[Change]:
+    if old is new:
+        return []
+    out = []
+    for i in range(max(len(old), len(new))):
+        a = old[i].intent if i < len(old) else None
+        b = new[i].intent if i < len(new) else None
+        if a != b:
+            out.append(Change(f"enemy.{i + 1}.intent", a, b))
+    return out
+
+
+def _card_label(card: Optional[CardState]) -> Optional[str]:
+    if card is None:
+        return None
+    return card.name if card.cost is None else f"{card.name}({card.cost})"
+
+
+def _diff_hand(old: Tuple[CardState, ...], new: Tuple[CardState, ...]) -> List[Change]:
+    if old is new:
+        return []
+    out = []
+    for i in range(max(len(old), len(new))):
+        a = _card_label(old[i]) if i < len(old) else None
+        b = _card_label(new[i]) if i < len(new) else None
+        if a != b:
+            out.append(Change(f"hand.{i + 1}", a, b))
+    return out
+
+
+def diff(old: GameState, new: GameState) -> List[Change]:
+    """两份快照之间的变化（共享的子状态直接跳过）"""
+    out = [Change("scene", old.scene, new.scene)] if old.scene != new.scene else []
+    out += _diff_player(old.player, new.player)
+    out += _diff_enemies(old.enemies, new.enemies)
+    out += _diff_hand(old.hand, new.hand)
+    return out
+
+
+# ================= 增量更新 =================
+class StateTracker:
+    """
+    维护当前 GameState，每次 update 只重算 ROI 变了的部分
+    tolerant: ROI 哈希用感知哈希（默认跟随 ROI_CACHE_TOLERANT）
+    """
+
+    def __init__(self, battle_scenes: Tuple[str, ...] = BATTLE_SCENES,
+                 tolerant: bool = ROI_CACHE_TOLERANT):
+        self.battle_scenes = battle_scenes
+        self.tolerant = tolerant
+        self.state = GameState()
+        self._hashes: Dict[str, bytes] = {}
+        self.recomputed: Dict[str, int] = {}    # 子状态 -> 重新识别次数
+        self.skipped: Dict[str, int] = {}       # 子状态 -> 因 ROI 未变跳过的次数
+
+    def reset(self):
+        self.state = GameState()
+        self._hashes.clear()
+
+    def _dirty(self, name: str, patch, tolerant: Optional[bool] = None) -> bool:
+        """ROI 内容和上次不同（或第一次见）时返回 True 并记下新哈希"""
+        h = roi_phash(patch) if (self.tolerant if tolerant is None else tolerant) else roi_hash(patch)
+        if self._hashes.get(name) == h:
+            self.skipped[name] = self.skipped.get(name, 0) + 1
+            return False
+        self._hashes[name] = h
+        self.recomputed[name] = self.recomputed.get(name, 0) + 1
+        return True
+
+    # ---------------- 各子状态 ----------------
+    def _scene(self, frame: Frame) -> Optional[str]:
+        # 场景按整帧缩略图判断：数值、意图的小变化不会触发场景重算
+        if not self._dirty("scene", frame.gray, tolerant=True):
+            return self.state.scene
+        from tools.scene_engine import get_engine
+        return get_engine().detect(frame).key
+
+    def _player(self, frame: Frame) -> PlayerState:
+        old = self.state.player
+        changed = {attr: roi for attr, roi in PLAYER_ROIS.items()
+                   if self._dirty(roi, frame.roi(roi))}
+        if not changed:
+            return old
+        from tools.ocr_tool import read_fixed_rois
+        values = read_fixed_rois(list(changed.values()), frame)
+        new = replace(old, **{attr: values[roi] for attr, roi in changed.items()})
+        return old if new == old else new
+
+    def _enemies(self, frame: Frame, scene: Optional[str]) -> Tuple[EnemyState, ...]:
+        old = self.state.enemies
+        if not self._dirty("enemy", frame.roi("enemy", color=True)):
+            return old
+        from tools.match_enemy import track_intents     # 只搜已知图标附近，见 IntentTracker
+        ax, ay = resolve_roi("enemy")[:2]
+        new = tuple(EnemyState(i, h.key, h.name, ax + h.x + h.w // 2, ay + h.y + h.h // 2, h.score)
+                    for i, h in enumerate(track_intents(frame, scene), 1))
+        # 位置 / 分数的抖动不算变化，意图没变就沿用旧对象
+        return old if [e.intent for e in new] == [e.intent for e in old] else new
+
+    def _hand(self, frame: Frame) -> Tuple[CardState, ...]:
+        old = self.state.hand
+        if not self._dirty("hand", frame.roi("hand")):
+            return old
+        from tools.hand_parser import parse_hand
+        new = tuple(CardState(c.slot, c.hotkey, c.type, c.name, c.cost) for c in parse_hand(frame))
+        return old if new == old else new
+
+    # ---------------- 对外接口 ----------------
+    @traced("state.update")
+    def update(self, frame: Optional[Frame] = None) -> Tuple[GameState, List[Change]]:
+        frame = ensure_frame(frame)
+        old = self.state
+        saved = dict(self._hashes)
+        try:
+            scene = self._scene(frame)
+            if scene != old.scene:                  # 换场景：其他子状态全部重算
+                self._hashes = {k: v for k, v in self._hashes.items() if k == "scene"}
+            if scene in self.battle_scenes:
+                player, enemies, hand = self._player(frame), self._enemies(frame, scene), self._hand(frame)
+            else:                                   # 离开战斗：数值保留，敌人和手牌清空
+                player, enemies, hand = old.player, (), ()
+        except Exception:
+            self._hashes = saved                    # 识别失败时不记哈希，下一帧重试
+            raise
+        new = GameState(old.seq + 1, frame.ts, scene, player, enemies, hand)
+        changes = diff(old, new)
+        if not changes:
+            return old, []
+        self.state = new
+        for c in changes:
+            log.debug("状态变化：%s", c)
+        return new, changes
+
+
+_TRACKER: Optional[StateTracker] = None
+
+
+def get_tracker() -> StateTracker:
+    """进程级单例"""
+    global _TRACKER
+    if _TRACKER is None:
+        _TRACKER = StateTracker()
+    return _TRACKER
+
+
+if __name__ == "__main__":
+    import time
+    from tools.trace import setup_logging
+    setup_logging()
+    tracker = get_tracker()
+    while True:
+        _state, events = tracker.update()
+        for ev in events:
+            print(ev)
+        time.sleep(0.2)
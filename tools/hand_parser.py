@@ -0,0 +1,87 @@
+"""
+整手牌识别：一张截图里找出扇形手牌的每一张牌，不再逐张按热键选中
+1. 在 HAND_AREA 里对卡牌类型模板做多尺度多目标匹配（find_all + NMS）
+2. 同样找出大 / 小能量球，分配给最近的卡牌
+3. 按从左到右排序，槽位 1..n 对应热键 1–9、0
+"""
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from tools.config import HAND_SCALES, MATCH_THRESHOLD
+from tools.img_tool import find_all, nms
+from tools.frame import Frame, ensure_frame, resolve_roi
+from tools.tpl_bank import get_bank
+from tools.trace import traced
+
+NMS_IOU = 0.3
+MAX_HAND = 10
+
+
+class HandCard(NamedTuple):
+    slot: int                           # 从左到右 1..n
+    hotkey: str                         # 游戏热键 "1"–"9"、第 10 张为 "0"
+    type: str                           # CARD_KIND_MAP 的键
+    name: str                           # 中文名
+    cost: Optional[int]                 # 能量消耗，未找到能量球为 None
+    bbox: Tuple[int, int, int, int]     # 卡牌类型框在全屏上的 (x, y, w, h)
+    score: float
+
+
+def _find_multi(hay: np.ndarray, groups: Tuple[str, ...], threshold: float) -> List[Tuple[str, str, int, int, int, int, float]]:
+    """多尺度、多模板找全部命中，跨模板 / 尺度做 NMS，返回 [(key, 中文名, x, y, w, h, 分数), ...]"""
+    bank = get_bank()
+    hits = []
+    for group in groups:
+        for key, cn_name, _tpl in bank.items(group):
+            for s in HAND_SCALES:
+                t = bank.resized(group, key, s)         # 缩放结果缓存在模板库里
+                th, tw = t.shape[:2]
+                if min(th, tw) < 6:
+                    continue
+                hits.extend((key, cn_name, x, y, tw, th, sc) for x, y, sc in find_all(hay, t, threshold, NMS_IOU))
+    if len(hits) > 1:
+        boxes = np.array([h[2:6] for h in hits], dtype=np.float32)
+        scores = np.array([h[6] for h in hits], dtype=np.float32)
+        hits = [hits[i] for i in nms(boxes, scores, NMS_IOU)]
+    return hits
+
+
+def _energy_value(key: str) -> Optional[int]:
+    """energy_2 / energy_1_small -> 2 / 1"""
+    try:
+        return int(key.split("_")[1])
+    except (IndexError, ValueError):
+        return None
+
+
+@traced("hand.parse")
+def parse_hand(frame: Optional[Frame] = None, threshold: float = MATCH_THRESHOLD) -> List[HandCard]:
+    """从一帧截图解析整手牌，返回按槽位排序的 HandCard 列表"""
+    frame = ensure_frame(frame)
+    ox, oy, _w, _h = resolve_roi("hand")
+    hay = frame.roi("hand")
+
+    kinds = _find_multi(hay, ("card_kind",), threshold)
+    kinds.sort(key=lambda h: h[2] + h[4] / 2)
+    kinds = kinds[:MAX_HAND]
+    orbs = _find_multi(hay, ("big_energy", "small_energy"), threshold)
+
+    # 能量球在牌的左上角：每张牌取距离其类型框左上角最近、且没被别的牌占用的能量球
+    used = set()
+    cards: List[HandCard] = []
+    for slot, (key, cn_name, x, y, w, h, score) in enumerate(kinds, start=1):
+        best, best_d = None, float(max(w, h) * 2)
+        for i, (_okey, _ocn, bx, by, bw, bh, _os) in enumerate(orbs):
+            if i in used:
+                continue
+            d = float(np.hypot(bx + bw / 2 - x, by + bh / 2 - y))
+            if d < best_d:
+                best, best_d = i, d
+        cost = None
+        if best is not None:
+            used.add(best)
+            cost = _energy_value(orbs[best][0])
+        hotkey = str(slot % 10)
+        cards.append(HandCard(slot, hotkey, key, cn_name, cost, (ox + x, oy + y, w, h), score))
+    return cards
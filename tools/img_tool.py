@@ -2,7 +2,9 @@
 import cv2
 import numpy as np
 from pathlib import Path
-from typing import Tuple, Optional, Dict, Any
+from typing import Tuple, Optional, Dict, Any, Iterable, List, NamedTuple
+
+from tools.trace import span, traced
 
 def load_tpl(path: Path, color: bool = False) -> np.ndarray:
     """
@@ -13,18 +15,61 @@ def load_tpl(path: Path, color: bool = False) -> np.ndarray:
     flag = cv2.IMREAD_COLOR if color else cv2.IMREAD_GRAYSCALE
     return cv2.imread(str(path), flag)
 
-def screen_shot(color: bool = False) -> np.ndarray:
+def screen_shot(color: bool = False, roi: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
     """
-    全屏截图
+    截图（后端见 capture.py）
     color=False -> 返回单通道灰度
     color=True  -> 返回三通道 BGR（OpenCV 默认顺序）
+    roi=(x, y, w, h) -> 只抓该区域，None 为全屏
+    第一次截图前按屏幕尺寸确定布局（见 layout.py），之后的 ROI / 模板比例都按该布局
     """
-    from PIL import ImageGrab
-    img_rgb = ImageGrab.grab()          # RGB 顺序
-    img_np = np.array(img_rgb, dtype=np.uint8)
+    from tools.capture import get_backend
+    from tools.layout import ensure_layout
+    ensure_layout()
+    with span("capture.grab", roi=roi):
+        img_bgr = get_backend().grab(roi)
     if color:
-        return cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR)
-    return cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY)
+        return img_bgr
+    with span("img_tool.cvt_gray"):
+        return cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
+
+def wait_until_stable(roi: Optional[Tuple[int, int, int, int]] = None, max_wait: float = 0.5,
+                      eps: float = 2.0, interval: float = 0.02, scale: float = 0.25,
+                      settle: int = 2, expect_change: bool = False) -> Tuple[bool, float]:
+    """
+    轮询 roi 的低分辨率灰度图，画面不再变化时立即返回，代替固定 sleep
+    eps: 相邻两帧平均绝对差 <= eps 视为没变
+    settle: 需要连续多少次“没变”
+    expect_change: 先等画面发生一次变化（按键后动画还没开始时避免误判为已稳定）
+    返回 (是否稳定, 实际等待秒数)；超过 max_wait 返回 (False, max_wait 附近)
+    """
+    import time
+    from tools.capture import get_backend
+    backend = get_backend()
+
+    def _thumb() -> np.ndarray:
+        img = backend.grab(roi, copy=False)
+        small = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    start = time.perf_counter()
+    prev = _thumb()
+    changed = not expect_change
+    calm = 0
+    while True:
+        elapsed = time.perf_counter() - start
+        if elapsed >= max_wait:
+            return False, elapsed
+        time.sleep(interval)
+        cur = _thumb()
+        diff = float(cv2.absdiff(cur, prev).mean())
+        prev = cur
+        if not changed:
+            changed = diff > eps
+            continue
+        calm = calm + 1 if diff <= eps else 0
+        if calm >= settle:
+            return True, time.perf_counter() - start
 
 def dict2tuple(roi: Optional[Dict[str, int]]) -> Optional[Tuple[int, int, int, int]]:
     if roi is None:
@@ -40,4 +85,377 @@ def crop(img: np.ndarray, roi: Optional[Tuple[int, int, int, int]]) -> np.ndarra
 def match_once(hay: np.ndarray, needle: np.ndarray, threshold: float = 0.8) -> bool:
     """单模板匹配，返回是否命中（hay/needle 同通道即可）"""
     res = cv2.matchTemplate(hay, needle, cv2.TM_CCOEFF_NORMED)
-    return cv2.minMaxLoc(res)[1] >= threshold
\ No newline at end of file
+    return cv2.minMaxLoc(res)[1] >= threshold
+
+def rotate_bound(img: np.ndarray, angle: float) -> np.ndarray:
+    """旋转图像并扩大画布，防止裁切（空白处填黑）"""
+    h, w = img.shape[:2]
+    center = (w // 2, h // 2)
+    M = cv2.getRotationMatrix2D(center, angle, 1.0)
+    cos, sin = np.abs(M[0, 0]), np.abs(M[0, 1])
+    new_w = int((h * sin) + (w * cos))
+    new_h = int((h * cos) + (w * sin))
+    M[0, 2] += (new_w / 2) - center[0]
+    M[1, 2] += (new_h / 2) - center[1]
+    return cv2.warpAffine(img, M, (new_w, new_h), borderValue=(0, 0, 0))
+
+
+# ================= 金字塔匹配（粗到细） =================
+def _downscale(img: np.ndarray, scale: float) -> np.ndarray:
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+def _pick_scale(tpl_shape: Tuple[int, ...], scale: float, min_side: int) -> float:
+    """模板缩小后最短边不能小于 min_side，否则逐级放大比例"""
+    s = scale
+    while s < 1.0 and min(tpl_shape[:2]) * s < min_side:
+        s *= 2
+    return min(s, 1.0)
+
+@traced("img_tool.match_pyramid")
+def match_pyramid(hay: np.ndarray, tpl: np.ndarray, scale: float = 0.25,
+                  min_side: int = 16, pad: int = 4,
+                  reject_below: Optional[float] = None,
+                  levels: Optional[Dict[float, np.ndarray]] = None) -> Tuple[float, Tuple[int, int]]:
+    """
+    粗到细模板匹配，返回 (相似度, 左上角坐标)
+    1. hay / tpl 缩小到 scale（1/4、1/8）做全图匹配
+    2. 只在最佳候选附近的小窗口里用原尺寸精修
+    reject_below: 粗匹配分数低于它时直接返回粗分数，不再精修
+    levels: 缩小后的 hay 缓存 {scale: img}，同一张 hay 匹配多个模板时传同一个 dict
+    """
+    H, W = hay.shape[:2]
+    th, tw = tpl.shape[:2]
+    if th > H or tw > W:
+        return 0.0, (0, 0)
+    s = _pick_scale(tpl.shape, scale, min_side)
+    if s >= 1.0:
+        _, val, _, loc = cv2.minMaxLoc(cv2.matchTemplate(hay, tpl, cv2.TM_CCOEFF_NORMED))
+        return float(val), loc
+
+    if levels is None:
+        levels = {}
+    small = levels.get(s)
+    if small is None:
+        small = levels[s] = _downscale(hay, s)
+    res = cv2.matchTemplate(small, _downscale(tpl, s), cv2.TM_CCOEFF_NORMED)
+    _, cval, _, cloc = cv2.minMaxLoc(res)
+    cx, cy = int(cloc[0] / s), int(cloc[1] / s)
+    if reject_below is not None and cval < reject_below:
+        return float(cval), (cx, cy)
+
+    # 原尺寸精修：窗口半径 = 一个粗像素对应的原像素 + pad
+    r = int(np.ceil(1.0 / s)) + pad
+    x0, y0 = max(cx - r, 0), max(cy - r, 0)
+    x1, y1 = min(cx + r + tw, W), min(cy + r + th, H)
+    res = cv2.matchTemplate(hay[y0:y1, x0:x1], tpl, cv2.TM_CCOEFF_NORMED)
+    _, val, _, loc = cv2.minMaxLoc(res)
+    return float(val), (x0 + loc[0], y0 + loc[1])
+
+def match_topk(hay: np.ndarray, tpls: Iterable[Tuple[str, np.ndarray]], k: int = 3,
+               scale: float = 0.25, levels: Optional[Dict[float, np.ndarray]] = None,
+               **kwargs: Any) -> List[Tuple[str, float, Tuple[int, int]]]:
+    """对多个模板做金字塔匹配，按相似度降序返回前 k 个 [(key, 相似度, 左上角), ...]"""
+    if levels is None:
+        levels = {}
+    scored = [(key, *match_pyramid(hay, tpl, scale, levels=levels, **kwargs)) for key, tpl in tpls]
+    scored.sort(key=lambda t: t[1], reverse=True)
+    return scored[:k]
+
+
+# ================= 多目标匹配（一次响应图 + NMS） =================
+def nms(boxes: np.ndarray, scores: np.ndarray, iou: float = 0.3) -> np.ndarray:
+    """
+    非极大值抑制，boxes 为 (N, 4) 的 [x, y, w, h]
+    返回保留下来的下标（按分数降序）
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    x1, y1 = boxes[:, 0].astype(np.float32), boxes[:, 1].astype(np.float32)
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    areas = boxes[:, 2].astype(np.float32) * boxes[:, 3]
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        ih = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = iw * ih
+        ious = inter / (areas[i] + areas[rest] - inter)
+        order = rest[ious <= iou]
+    return np.asarray(keep, dtype=np.int64)
+
+def response_peaks(res: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """响应图里 >= threshold 的局部极大值，返回 (xs, ys, scores)"""
+    local_max = cv2.dilate(res, np.ones((3, 3), np.uint8))
+    ys, xs = np.nonzero((res >= threshold) & (res >= local_max))
+    return xs, ys, res[ys, xs]
+
+@traced("img_tool.find_all")
+def find_all(hay: np.ndarray, tpl: np.ndarray, threshold: float = 0.8,
+             nms_iou: float = 0.3) -> List[Tuple[int, int, float]]:
+    """
+    单模板多目标匹配：只算一次响应图，取全部峰值后做 NMS
+    返回 [(x, y, 相似度), ...]，按相似度降序；不修改 hay
+    """
+    th, tw = tpl.shape[:2]
+    if th > hay.shape[0] or tw > hay.shape[1]:
+        return []
+    res = cv2.matchTemplate(hay, tpl, cv2.TM_CCOEFF_NORMED)
+    return peaks_in_response(res, (th, tw), threshold, nms_iou)
+
+def peaks_in_response(res: np.ndarray, tpl_size: Tuple[int, int], threshold: float = 0.8,
+                      nms_iou: float = 0.3) -> List[Tuple[int, int, float]]:
+    """已算好的响应图 -> [(x, y, 相似度), ...]（峰值 + NMS，按相似度降序）"""
+    th, tw = tpl_size[:2]
+    xs, ys, scores = response_peaks(res, threshold)
+    if len(scores) == 0:
+        return []
+    boxes = np.stack([xs, ys, np.full_like(xs, tw), np.full_like(xs, th)], axis=1)
+    keep = nms(boxes, scores, nms_iou)
+    return [(int(xs[i]), int(ys[i]), float(scores[i])) for i in keep]
+
+
+# ================= 旋转模板匹配（粗角度小尺度 -> 细角度原尺度） =================
+class RotStack(NamedTuple):
+    """同一模板的多角度版本，堆叠成一个连续数组（左上角对齐，空白填黑）"""
+    stack: np.ndarray      # (N, H, W[, C])
+    sizes: np.ndarray      # (N, 2)，每个角度的实际 (h, w)
+    angles: np.ndarray     # (N,)
+
+    def tpl(self, i: int) -> np.ndarray:
+        h, w = self.sizes[i]
+        return self.stack[i, :h, :w]
+
+def build_rot_stack(img: np.ndarray, step: int = 15, scale: float = 1.0) -> RotStack:
+    """生成 0°–360° 每 step 度的旋转模板（可先缩放），堆叠为 RotStack"""
+    if scale != 1.0:
+        img = _downscale(img, scale)
+    rots = [rotate_bound(img, angle) for angle in range(0, 360, step)]
+    sizes = np.array([r.shape[:2] for r in rots], dtype=np.int32)
+    H, W = sizes.max(axis=0)
+    stack = np.zeros((len(rots), H, W) + img.shape[2:], dtype=img.dtype)
+    for i, r in enumerate(rots):
+        stack[i, :r.shape[0], :r.shape[1]] = r
+    return RotStack(stack, sizes, np.arange(0, 360, step, dtype=np.float32))
+
+@traced("img_tool.find_rotated")
+def find_rotated(hay: np.ndarray, full: RotStack, small: RotStack, scale: float,
+                 threshold: float = 0.8, coarse_every: int = 2, refine_span: int = 1,
+                 slack: float = 0.2, nms_iou: float = 0.3, pad: int = 4,
+                 hay_small: Optional[np.ndarray] = None) -> List[Tuple[int, int, int, int, float, float]]:
+    """
+    旋转不变的多目标匹配，返回 [(x, y, w, h, 相似度, 角度), ...]
+    1. 缩小到 scale，每隔 coarse_every 个角度做一次全图匹配，取 >= threshold - slack 的峰值
+    2. 对每个候选，在原尺度的小窗口里细查最佳粗角度左右 refine_span 个粗步长内的全部角度
+    full / small: 同一模板原尺度 / 缩小后的 RotStack（角度一一对应）
+    """
+    if hay_small is None:
+        hay_small = _downscale(hay, scale)
+    n = len(full.angles)
+    hs, ws = hay_small.shape[:2]
+
+    # ---------- 粗搜：小尺度 + 稀疏角度 ----------
+    cand = []   # (中心 x, 中心 y, 粗 w, 粗 h, 分数, 角度下标)，小尺度坐标
+    for i in range(0, n, coarse_every):
+        t = small.tpl(i)
+        th, tw = t.shape[:2]
+        if th > hs or tw > ws:
+            continue
+        res = cv2.matchTemplate(hay_small, t, cv2.TM_CCOEFF_NORMED)
+        xs, ys, sc = response_peaks(res, threshold - slack)
+        cand.extend((x + tw / 2, y + th / 2, tw, th, s, i) for x, y, s in zip(xs, ys, sc))
+    if not cand:
+        return []
+    arr = np.asarray(cand, dtype=np.float32)
+    boxes = np.stack([arr[:, 0] - arr[:, 2] / 2, arr[:, 1] - arr[:, 3] / 2, arr[:, 2], arr[:, 3]], axis=1)
+    keep = nms(boxes, arr[:, 4], nms_iou)
+
+    # ---------- 细查：原尺度 + 邻近角度 ----------
+    H, W = hay.shape[:2]
+    r = int(np.ceil(1.0 / scale)) + pad
+    out = []
+    for k in keep:
+        cx, cy, idx = arr[k, 0] / scale, arr[k, 1] / scale, int(arr[k, 5])
+        best = None
+        for d in range(-refine_span * coarse_every, refine_span * coarse_every + 1):
+            j = (idx + d) % n
+            t = full.tpl(j)
+            th, tw = t.shape[:2]
+            x0 = max(int(cx - tw / 2) - r, 0)
+            y0 = max(int(cy - th / 2) - r, 0)
+            sub = hay[y0:min(int(cy + th / 2) + r + 1, H), x0:min(int(cx + tw / 2) + r + 1, W)]
+            if sub.shape[0] < th or sub.shape[1] < tw:
+                continue
+            _, val, _, loc = cv2.minMaxLoc(cv2.matchTemplate(sub, t, cv2.TM_CCOEFF_NORMED))
+            if best is None or val > best[4]:
+                best = (x0 + loc[0], y0 + loc[1], tw, th, float(val), float(full.angles[j]))
+        if best is not None and best[4] >= threshold:
+            out.append(best)
+    if len(out) > 1:
+        o = np.asarray(out, dtype=np.float32)
+        out = [out[i] for i in nms(o[:, :4], o[:, 4], nms_iou)]
+    return out
+
+
+# ================= 多模板取最优（并行打分） =================
+class BestMatch(NamedTuple):
+    key: Optional[str]          # 最高分且过阈值的模板，否则 None
+    score: float                # 最高分
+    margin: float               # 最高分 - 第二名
+    ambiguous: bool             # 过了阈值但领先不足 min_margin
+    scores: Dict[str, float]    # 每个候选的分数
+
+_POOL = None
+
+def _pool():
+    """匹配线程池（cv2.matchTemplate 会释放 GIL）"""
+    global _POOL
+    if _POOL is None:
+        import os
+        from concurrent.futures import ThreadPoolExecutor
+        _POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 2, thread_name_prefix="match")
+    return _POOL
+
+def _max_score(hay: np.ndarray, tpl: np.ndarray) -> float:
+    th, tw = tpl.shape[:2]
+    if th > hay.shape[0] or tw > hay.shape[1]:
+        return 0.0
+    return float(cv2.minMaxLoc(cv2.matchTemplate(hay, tpl, cv2.TM_CCOEFF_NORMED))[1])
+
+@traced("img_tool.best_match")
+def best_match(hay: np.ndarray, candidates: Iterable[Tuple[str, np.ndarray]], threshold: float = 0.8,
+               min_margin: float = 0.05, parallel: bool = True) -> BestMatch:
+    """
+    给所有候选模板打分（默认线程池并行），取最高分而不是第一个过阈值的
+    最高分领先第二名不足 min_margin 时标记 ambiguous
+    """
+    cands = list(candidates)
+    if not cands:
+        return BestMatch(None, 0.0, 0.0, False, {})
+    if parallel and len(cands) > 1:
+        vals = list(_pool().map(lambda kv: _max_score(hay, kv[1]), cands))
+    else:
+        vals = [_max_score(hay, tpl) for _, tpl in cands]
+    scores = {key: v for (key, _), v in zip(cands, vals)}
+    order = np.argsort(vals)[::-1]
+    best = float(vals[order[0]])
+    second = float(vals[order[1]]) if len(vals) > 1 else 0.0
+    margin = best - second
+    if best < threshold:
+        return BestMatch(None, best, margin, False, scores)
+    return BestMatch(cands[order[0]][0], best, margin, margin < min_margin, scores)
+
+
+# ================= 频域批量匹配（多模板对同一张图） =================
+def fft_shape(hay_shape: Tuple[int, ...]) -> Tuple[int, int]:
+    """hay 的 FFT 尺寸：不小于 hay 的最优 DFT 尺寸（有效区域不会发生循环卷绕）"""
+    return cv2.getOptimalDFTSize(hay_shape[0]), cv2.getOptimalDFTSize(hay_shape[1])
+
+def tpl_spectrum(tpl: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+    """零均值模板补零到 shape 后的频谱 (PH, PW//2+1, C)，可缓存复用"""
+    t = tpl.astype(np.float32)
+    if t.ndim == 2:
+        t = t[:, :, None]
+    t = t - t.reshape(-1, t.shape[2]).mean(axis=0)
+    return np.fft.rfft2(t, s=shape, axes=(0, 1)).astype(np.complex64)
+
+class FFTHaystack:
+    """
+    一张 hay 的频谱 + 积分图，只算一次，之后任意模板都只需一次逐元素乘法和逆变换
+    结果与 cv2.TM_CCOEFF_NORMED 一致（彩色图各通道分别去均值、合并归一化）
+    """
+
+    def __init__(self, hay: np.ndarray):
+        img = hay.astype(np.float32)
+        if img.ndim == 2:
+            img = img[:, :, None]
+        self.shape = img.shape[:2]
+        self.channels = img.shape[2]
+        self.fft_shape = fft_shape(self.shape)
+        self.spec = np.fft.rfft2(img, s=self.fft_shape, axes=(0, 1)).astype(np.complex64)
+        # 每个通道的 Σx 积分图，以及所有通道合计的 Σx² 积分图
+        self._s1 = []
+        self._s2 = np.zeros((self.shape[0] + 1, self.shape[1] + 1), np.float64)
+        for c in range(self.channels):
+            a, b = cv2.integral2(np.ascontiguousarray(img[:, :, c]), sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+            self._s1.append(a)
+            self._s2 += b
+        self._var: Dict[Tuple[int, int], np.ndarray] = {}
+
+    def _window_var(self, h: int, w: int) -> np.ndarray:
+        """每个窗口 Σ_c [Σx_c² - (Σx_c)²/n]，同尺寸模板共享"""
+        v = self._var.get((h, w))
+        if v is None:
+            def win(ii):
+                return ii[h:, w:] - ii[:-h, w:] - ii[h:, :-w] + ii[:-h, :-w]
+            n = h * w
+            v = win(self._s2)
+            for s1 in self._s1:
+                v = v - win(s1) ** 2 / n
+            self._var[(h, w)] = v = np.maximum(v, 0.0)
+        return v
+
+    def correlate(self, specs: np.ndarray, sizes: List[Tuple[int, int]],
+                  norms: List[float]) -> List[np.ndarray]:
+        """
+        specs: (K, PH, PWr, C) 同一 FFT 尺寸的零均值模板频谱
+        sizes / norms: 各模板的 (h, w) 和 ||T - mean||
+        返回 K 张归一化响应图（尺寸同 cv2.matchTemplate）
+        """
+        prod = (self.spec[None] * np.conj(specs)).sum(axis=3)
+        num = np.fft.irfft2(prod, s=self.fft_shape, axes=(1, 2))
+        H, W = self.shape
+        out = []
+        for k, ((h, w), tn) in enumerate(zip(sizes, norms)):
+            den = np.sqrt(self._window_var(h, w)) * tn
+            res = num[k, :H - h + 1, :W - w + 1] / np.maximum(den, 1e-6)
+            res[den < 1e-3] = 0.0             # 纯色窗口没有相关性可言
+            out.append(res.astype(np.float32))
+        return out
+
+def tpl_norm(tpl: np.ndarray) -> float:
+    """||T - mean||（彩色模板各通道分别去均值）"""
+    t = tpl.astype(np.float64)
+    if t.ndim == 2:
+        t = t[:, :, None]
+    t = t - t.reshape(-1, t.shape[2]).mean(axis=0)
+    return float(np.sqrt((t * t).sum()))
+
+# 一次逆变换的复数缓冲上限，模板多时分批
+FFT_BATCH_BYTES = 256 * 1024 * 1024
+
+@traced("img_tool.batch_match")
+def batch_match(hay: Any, tpls: Iterable[Tuple[str, np.ndarray]],
+                spectrum: Optional[Any] = None) -> Dict[str, np.ndarray]:
+    """
+    多模板对同一张 hay 的批量匹配，hay 的频谱只算一次
+    hay: ndarray 或已构建的 FFTHaystack（多次调用可复用）
+    spectrum: 可选 (key, tpl, fft_shape) -> 频谱 的缓存函数（见 TemplateBank.spectrum）
+    返回 {key: 归一化响应图}
+    """
+    fh = hay if isinstance(hay, FFTHaystack) else FFTHaystack(hay)
+    H, W = fh.shape
+    items = [(k, t) for k, t in tpls if t.shape[0] <= H and t.shape[1] <= W]
+    if not items:
+        return {}
+    per = fh.spec[..., 0].size * 16 * fh.channels
+    chunk = max(1, FFT_BATCH_BYTES // per)
+    out: Dict[str, np.ndarray] = {}
+    for i in range(0, len(items), chunk):
+        part = items[i:i + chunk]
+        specs = np.stack([spectrum(k, t, fh.fft_shape) if spectrum is not None
+                          else tpl_spectrum(t, fh.fft_shape) for k, t in part])
+        maps = fh.correlate(specs, [t.shape[:2] for _, t in part], [tpl_norm(t) for _, t in part])
+        out.update({k: m for (k, _), m in zip(part, maps)})
+    return out
+
+def batch_peaks(hay: Any, tpls: Iterable[Tuple[str, np.ndarray]],
+                spectrum: Optional[Any] = None) -> Dict[str, Tuple[float, Tuple[int, int]]]:
+    """batch_match 的简化版：只返回每个模板的 (最高分, 左上角)"""
+    out = {}
+    for key, res in batch_match(hay, tpls, spectrum).items():
+        _, val, _, loc = cv2.minMaxLoc(res)
+        out[key] = (float(val), loc)
+    return out
@@ -0,0 +1,233 @@
+"""
+布局：按分辨率 / UI 缩放选择 ROI 和模板比例
+config 里的 ROI、data/ 里的模板都是在 LAYOUT_BASE_SIZE 下截取的（基准布局）
+data/layouts/ 下每个 JSON 是一份布局，格式与 ROI 工具（识图小工具/roi_config.json）相同：
+  {"_meta": {"width": 1920, "height": 1080, "ui_scale": 1.0},
+   "player_hp": {"left": ..., "top": ..., "width": ..., "height": ...}, ...}
+  没有 _meta 时从文件名读取尺寸：1920x1080.json、1920x1080@1.25.json（@ 后为 UI 缩放）
+  文件里没有框选的区域按分辨率从基准布局等比换算；AREA_MAP 里没有的名称忽略
+ROI 工具保存的 roi_config.json（config.ROI_TOOL_CONFIG）带 _meta 时也直接作为一份布局，不用复制；
+  同一台机器要保留多份时再复制到 data/layouts/宽x高.json
+第一次需要 ROI 时（ensure_frame / 按名称 resolve_roi / screen_shot）按屏幕尺寸自动选择一次布局
+（同尺寸有多份时截一帧用场景模板校准），之后：
+  frame.AREA_MAP 换成该布局的 ROI，模板库切到对应比例（预缩放结果缓存在磁盘）
+"""
+import json
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import cv2
+
+from tools.config import DATA_LAYOUT, LAYOUT_BASE_SIZE, LAYOUT_PROFILE, MATCH_THRESHOLD, ROI_TOOL_CONFIG
+from tools import frame as frame_mod
+from tools.frame import Frame
+from tools.img_tool import match_pyramid
+from tools.tpl_bank import get_bank
+
+log = logging.getLogger(__name__)
+
+# 基准布局的 ROI（导入时拷贝一份，apply 之后 AREA_MAP 会被替换）
+BASE_AREAS: Dict[str, Dict[str, int]] = {k: dict(v) for k, v in frame_mod.AREA_MAP.items()}
+_NAME_RE = re.compile(r"^(\d+)x(\d+)(?:@([\d.]+))?$")
+CALIBRATION_SCALE = 0.25        # 校准时金字塔粗匹配的缩放比例
+
+
+class Layout(NamedTuple):
+    name: str
+    width: int
+    height: int
+    tpl_scale: float                        # 模板相对基准的缩放比例
+    rois: Dict[str, Dict[str, int]]         # 名称 -> ROI 字典，覆盖 AREA_MAP 全部键
+
+
+def _scale_roi(roi: Dict[str, int], sx: float, sy: float) -> Dict[str, int]:
+    return {"left": round(roi["left"] * sx), "top": round(roi["top"] * sy),
+            "width": max(round(roi["width"] * sx), 1), "height": max(round(roi["height"] * sy), 1)}
+
+
+def scaled_layout(width: int, height: int, ui_scale: float = 1.0, name: Optional[str] = None,
+                  tpl_scale: Optional[float] = None) -> Layout:
+    """从基准布局按分辨率等比换算（游戏 UI 跟随纵向分辨率缩放）"""
+    bw, bh = LAYOUT_BASE_SIZE
+    sx, sy = width / bw, height / bh
+    rois = {k: _scale_roi(v, sx, sy) for k, v in BASE_AREAS.items()}
+    if tpl_scale is None:
+        tpl_scale = round(sy * ui_scale, 4)
+    return Layout(name or f"{width}x{height}@{ui_scale:g}", width, height, tpl_scale, rois)
+
+
+def base_layout() -> Layout:
+    return scaled_layout(*LAYOUT_BASE_SIZE, name="base")
+
+
+def load_profile(path: Path) -> Layout:
+    """读取一份布局 JSON（ROI 工具格式，可带 _meta）"""
+    path = Path(path)
+    data = json.loads(path.read_text(encoding="utf-8"))
+    meta = data.pop("_meta", {})
+    m = _NAME_RE.match(path.stem)
+    width = meta.get("width") or (int(m.group(1)) if m else None)
+    height = meta.get("height") or (int(m.group(2)) if m else None)
+    if not width or not height:
+        raise ValueError(f"布局缺少分辨率（_meta 或 宽x高 文件名）：{path}")
+    ui_scale = float(meta.get("ui_scale") or (m.group(3) if m and m.group(3) else 1.0))
+    layout = scaled_layout(int(width), int(height), ui_scale, path.stem, meta.get("tpl_scale"))
+    ignored = []
+    for name, roi in data.items():
+        if name not in BASE_AREAS:
+            ignored.append(name)
+        elif isinstance(roi, dict) and {"left", "top", "width", "height"} <= roi.keys():
+            layout.rois[name] = {k: int(roi[k]) for k in ("left", "top", "width", "height")}
+    if ignored:
+        log.warning("布局 %s 里这些名称不是已知 ROI，已忽略：%s", path.name, ", ".join(ignored))
+    return layout
+
+
+def _has_meta(path: Path) -> bool:
+    try:
+        meta = json.loads(path.read_text(encoding="utf-8")).get("_meta") or {}
+    except (OSError, ValueError):
+        return False
+    return bool(meta.get("width") and meta.get("height"))
+
+
+def profiles(folder: Path = DATA_LAYOUT, tool_config: Optional[Path] = ROI_TOOL_CONFIG) -> List[Layout]:
+    """data/layouts 下的全部布局 + ROI 工具的 roi_config.json（带 _meta 时）"""
+    paths = sorted(Path(folder).glob("*.json"))
+    if tool_config is not None and Path(tool_config).exists():
+        if _has_meta(Path(tool_config)):
+            paths.append(Path(tool_config))
+        else:
+            log.debug("%s 没有 _meta（分辨率），不作为布局", Path(tool_config).name)
+    out = []
+    for path in paths:
+        try:
+            out.append(load_profile(path))
+        except (ValueError, KeyError, json.JSONDecodeError) as e:
+            log.warning("布局文件无效 %s：%s", path.name, e)
+    return out
+
+
+# ================= 自动选择 =================
+def _calibration_score(gray, layout: Layout) -> float:
+    """把场景模板缩放到该布局的比例，取全部场景里的最高分"""
+    best = 0.0
+    for _key, _cn, tpl in get_bank().items("scene"):
+        t = tpl if layout.tpl_scale == 1.0 else cv2.resize(
+            tpl, None, fx=layout.tpl_scale, fy=layout.tpl_scale, interpolation=cv2.INTER_AREA)
+        if t.shape[0] > gray.shape[0] or t.shape[1] > gray.shape[1]:
+            continue
+        score, _ = match_pyramid(gray, t, CALIBRATION_SCALE)
+        best = max(best, score)
+    return best
+
+
+def _screen_size(frame: Optional[Frame]) -> Tuple[int, int]:
+    """(宽, 高)：有帧取帧尺寸，否则问截图后端（不用截整屏）"""
+    if frame is not None:
+        h, w = frame.shape
+        return w, h
+    from tools.capture import get_backend
+    return get_backend().screen_size()
+
+
+def detect(frame: Optional[Frame] = None, folder: Path = DATA_LAYOUT) -> Layout:
+    """
+    按画面尺寸选择布局：同尺寸只有一份就直接用；有多份（不同 UI 缩放）时
+    用场景模板校准，取分数最高的（frame 为 None 时现截一帧）；没有对应文件时从基准布局换算
+    """
+    w, h = _screen_size(frame)
+    candidates = [p for p in profiles(folder) if (p.width, p.height) == (w, h)]
+    if not candidates:
+        candidates = [base_layout() if (w, h) == tuple(LAYOUT_BASE_SIZE) else scaled_layout(w, h)]
+    if len(candidates) == 1:
+        return candidates[0]
+    if frame is None:
+        frame = Frame.grab()
+    get_bank().set_scale(1.0)               # 校准用原始模板现场缩放
+    scored = [(_calibration_score(frame.gray, p), p) for p in candidates]
+    score, best = max(scored, key=lambda t: t[0])
+    if score < MATCH_THRESHOLD:
+        log.warning("布局校准分数偏低（%.3f），当前画面可能不是可识别的场景", score)
+    log.info("布局校准：%s", ", ".join(f"{p.name}={s:.3f}" for s, p in scored))
+    return best
+
+
+# ================= 生效 =================
+_ACTIVE: Optional[Layout] = None
+_LOCK = threading.Lock()
+
+
+def active() -> Optional[Layout]:
+    return _ACTIVE
+
+
+def apply(layout: Layout) -> Layout:
+    """让布局生效：替换 AREA_MAP 的 ROI，模板库切到布局比例，重置场景引擎的位置记忆"""
+    global _ACTIVE
+    from tools.scene_engine import get_engine
+    frame_mod.AREA_MAP.update({k: dict(v) for k, v in layout.rois.items()})
+    get_bank().set_scale(layout.tpl_scale)
+    get_engine().reset()
+    _ACTIVE = layout
+    log.info("布局：%s（%d×%d，模板比例 %.3f）", layout.name, layout.width, layout.height, layout.tpl_scale)
+    return layout
+
+
+def ensure_layout(frame: Optional[Frame] = None) -> Layout:
+    """
+    第一次调用时按 LAYOUT_PROFILE 选择并应用布局，之后直接返回
+    frame 为 None 时按截图后端的屏幕尺寸选择（没有共享帧、只截 ROI 的调用路径）
+    """
+    if _ACTIVE is not None:
+        return _ACTIVE
+    with _LOCK:
+        if _ACTIVE is not None:
+            return _ACTIVE
+        if LAYOUT_PROFILE == "base":
+            layout = base_layout()
+        elif LAYOUT_PROFILE == "auto":
+            layout = detect(frame)
+        else:
+            layout = load_profile(DATA_LAYOUT / f"{LAYOUT_PROFILE}.json")
+        return apply(layout)
+
+
+def reset():
+    """恢复基准布局，下一帧重新选择（例如窗口尺寸变了）"""
+    global _ACTIVE
+    apply(base_layout())
+    _ACTIVE = None
+
+
+def export_profile(layout: Layout, path: Path, ui_scale: Optional[float] = None) -> Path:
+    """按 ROI 工具的格式写出布局（带 _meta），可再用 ROI 工具逐项修正"""
+    data = {"_meta": {"width": layout.width, "height": layout.height, "tpl_scale": layout.tpl_scale}}
+    if ui_scale is not None:
+        data["_meta"]["ui_scale"] = ui_scale
+    data.update(layout.rois)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    return Path(path)
+
+
+if __name__ == "__main__":
+    import argparse
+    from tools.trace import setup_logging
+    setup_logging()
+    ap = argparse.ArgumentParser(description="检测当前画面的布局，或按分辨率生成布局文件")
+    ap.add_argument("--make", metavar="WxH[@UI]", help="从基准布局换算并写到 data/layouts/")
+    args = ap.parse_args()
+    if args.make:
+        m = _NAME_RE.match(args.make)
+        if not m:
+            raise SystemExit("格式：1920x1080 或 1920x1080@1.25")
+        ui = float(m.group(3) or 1.0)
+        lay = scaled_layout(int(m.group(1)), int(m.group(2)), ui, args.make)
+        print("已写出：", export_profile(lay, DATA_LAYOUT / f"{args.make}.json", ui))
+    else:
+        lay = ensure_layout(Frame.grab())
+        print(f"当前布局：{lay.name} {lay.width}×{lay.height} 模板比例 {lay.tpl_scale}")
@@ -1,103 +1,132 @@
 # (1280, 800)
-import pyautogui
+import logging
 import time
-from pathlib import Path
 from typing import Dict, Optional, Tuple
 
-from tools.img_tool import screen_shot, load_tpl, match_once, crop
-from tools.config import Card_AREA, CARD_KIND_MAP, BIG_ENERGY_MAP, SMALL_ENERGY_MAP, MATCH_THRESHOLD, DATA_CARD, ROI_MAP
+from tools import classifier
+from tools.img_tool import screen_shot, best_match, BestMatch, wait_until_stable
+from tools.config import MATCH_THRESHOLD, ROI_CACHE_TOLERANT, CARD_KIND_MAP
+from tools.frame import Frame, ensure_frame, resolve_roi
+from tools.roi_cache import get_cache
+from tools.hand_parser import parse_hand
+from tools.tpl_bank import get_bank
+from tools.trace import setup_logging, traced
+
+log = logging.getLogger(__name__)
 
 
 def click_center_of_screen():
     """点击屏幕中央，用于激活游戏窗口"""
+    import pyautogui                        # 只在真正操作键鼠时导入，识别用不到
     screen_width, screen_height = pyautogui.size()
     center_x, center_y = screen_width // 2, screen_height // 2
     pyautogui.click(center_x, center_y)
     print(f"点击屏幕中间: ({center_x}, {center_y})")
 
 
-def recognize_energy_by_template(card_type: str) -> Optional[int]:
+# 最高分领先第二名不足这个值时视为低置信（类型 / 能量可能认错）
+MIN_MARGIN = 0.05
+
+
+def _energy_target(card_type: str) -> Tuple[str, str]:
+    """攻击牌用小能量 ROI / 模板，其余用大能量"""
+    if card_type == "attack":
+        return "small_card_energy", "small_energy"
+    return "big_card_energy", "big_energy"
+
+
+def score_energy(card_type: str, frame: Optional[Frame] = None) -> BestMatch:
+    """给全部能量模板打分，返回最高分、领先幅度和是否低置信（能量角标不变时命中缓存）"""
+    roi_key, energy_group = _energy_target(card_type)
+    if frame is not None:
+        energy_roi_img = frame.roi(roi_key)
+    else:
+        energy_roi_img = screen_shot(roi=resolve_roi(roi_key))   # 只抓能量区域
+    return get_cache().memo(("energy", energy_group), energy_roi_img,
+                            lambda: best_match(energy_roi_img, _candidates(energy_group),
+                                               MATCH_THRESHOLD, MIN_MARGIN),
+                            tolerant=ROI_CACHE_TOLERANT)
+
+
+def score_card_kind(frame: Optional[Frame] = None) -> BestMatch:
+    """在 Card_AREA 内给全部卡牌类型模板打分（画面不变时命中缓存；分类器打开时改用分类器）"""
+    frame = ensure_frame(frame)
+    if classifier.enabled():
+        card_bgr = frame.roi("card", color=True)
+        return get_cache().memo("card_kind_clf", card_bgr,
+                                lambda: classifier.get_classifier("card_kind").best_match(
+                                    card_bgr, MATCH_THRESHOLD, MIN_MARGIN),
+                                tolerant=ROI_CACHE_TOLERANT)
+    card_roi_img = frame.roi("card")
+    return get_cache().memo("card_kind", card_roi_img,
+                            lambda: best_match(card_roi_img, _candidates("card_kind"),
+                                               MATCH_THRESHOLD, MIN_MARGIN),
+                            tolerant=ROI_CACHE_TOLERANT)
+
+
+def _candidates(group: str):
+    return [(key, tpl) for key, _name, tpl in get_bank().items(group)]
+
+
+def recognize_energy_by_template(card_type: str, frame: Optional[Frame] = None) -> Optional[int]:
     """
     使用模板匹配识别卡牌能量消耗
     根据卡牌类型自动选择大/小能量模板和ROI区域
+    取全部模板里的最高分；领先第二名不足 MIN_MARGIN 时视为无法确定，返回 None
 
     参数:
         card_type: 卡牌类型 ("attack", "defend", "skill", "power", "curse")
+        frame: 已截好的帧，None 时现截一帧
     返回: 能量值(int)或None
     """
-    # 根据卡牌类型选择不同的ROI和模板
-    if card_type == "attack":
-        # 攻击牌使用小能量ROI和小能量模板
-        roi_key = "small_card_energy"
-        energy_map = SMALL_ENERGY_MAP
-        print("  [能量识别] 使用小能量模板（攻击牌）")
-    else:
-        # 其他牌使用大能量ROI和大能量模板
-        roi_key = "big_card_energy"
-        energy_map = BIG_ENERGY_MAP
-        print("  [能量识别] 使用大能量模板（非攻击牌）")
-
-    # 截取能量区域灰度图
-    energy_img = screen_shot(color=False)
-    roi = (ROI_MAP[roi_key]["left"], ROI_MAP[roi_key]["top"],
-           ROI_MAP[roi_key]["width"], ROI_MAP[roi_key]["height"])
-    energy_roi_img = crop(energy_img, roi)
-
-    # 尝试匹配对应能量模板
-    for key, (energy_desc, file_name) in energy_map.items():
-        tpl_path = DATA_CARD / file_name
-        if not tpl_path.exists():
-            print(f"  [能量识别] 模板不存在: {tpl_path}")
-            continue
-
-        tpl = load_tpl(tpl_path)
-        if match_once(energy_roi_img, tpl, MATCH_THRESHOLD):
-            print(f"  [能量识别] 匹配成功: {energy_desc}")
-            # 从key中提取能量值（如 "energy_2" -> 2, "energy_1_small" -> 1）
-            try:
-                energy_cost = int(key.split('_')[1])
-                return energy_cost
-            except (IndexError, ValueError):
-                print(f"  [能量识别] 无法解析能量值: {key}")
-                return None
-
-    print("  [能量识别] 未匹配到任何能量模板")
-    return None
-
-
-def recognize_card_and_energy(current_hotkey: int) -> Tuple[bool, Optional[str], Optional[int], str]:
+    log.info("能量识别使用%s", "小能量模板（攻击牌）" if card_type == "attack" else "大能量模板（非攻击牌）")
+
+    res = score_energy(card_type, frame)
+    if res.key is None:
+        log.info("能量识别：未匹配到任何能量模板")
+        return None
+    if res.ambiguous:
+        log.warning("能量识别低置信：%s 相似度=%.3f 领先=%.3f，不采信", res.key, res.score, res.margin)
+        return None
+    log.info("能量识别成功：%s 相似度=%.3f", res.key, res.score)
+    # 从key中提取能量值（如 "energy_2" -> 2, "energy_1_small" -> 1）
+    try:
+        return int(res.key.split('_')[1])
+    except (IndexError, ValueError):
+        log.warning("无法解析能量值：%s", res.key)
+        return None
+
+
+@traced("card.recognize")
+def recognize_card_and_energy(current_hotkey: int,
+                              frame: Optional[Frame] = None) -> Tuple[bool, Optional[str], Optional[int], str]:
     """
     在 Card_AREA 区域内识别手牌类型和能量消耗
+    类型和能量使用同一帧截图
+    类型领先第二名不足 MIN_MARGIN 时视为无法确定，按识别失败返回（与能量的处理一致）
     返回: (是否识别成功, 卡牌中文名, 能量值, 卡牌类型)
     """
-    # 截取手牌区域灰度图
-    card_img = screen_shot(color=False)
-    roi = (Card_AREA["left"], Card_AREA["top"],
-           Card_AREA["width"], Card_AREA["height"])
-    card_roi_img = crop(card_img, roi)
+    frame = ensure_frame(frame)
 
-    # 尝试匹配每种手牌模板
-    for key, (card_cn, file_name) in CARD_KIND_MAP.items():
-        tpl_path = DATA_CARD / file_name
-        if not tpl_path.exists():
-            print(f"[卡牌类型识别] 模板不存在: {tpl_path}")
-            continue
+    # 给每种手牌模板打分，取最高分（同一画面命中缓存）
+    kind = score_card_kind(frame)
+    if kind.key is not None:
+        # 识别成功，记录卡牌类型和名称
+        card_type, card_name = kind.key, CARD_KIND_MAP[kind.key][0]
+        if kind.ambiguous:
+            log.warning("卡牌类型无法确定：%s 领先第二名仅 %.3f (%s)", card_type, kind.margin,
+                        ", ".join(f"{k}={v:.3f}" for k, v in kind.scores.items()))
+            return False, None, None, ""
 
-        tpl = load_tpl(tpl_path)
-        if match_once(card_roi_img, tpl, MATCH_THRESHOLD):
-            # 识别成功，记录卡牌类型和名称
-            card_type = key
-            card_name = card_cn
+        log.info("卡牌类型：%s (%s) 相似度=%.3f", card_name, card_type, kind.score)
 
-            print(f"[卡牌类型识别] 识别为: {card_name} (类型: {card_type})")
+        # 根据卡牌类型识别能量消耗（智能切换大小能量模板）
+        energy_cost = recognize_energy_by_template(card_type, frame)
 
-            # 根据卡牌类型识别能量消耗（智能切换大小能量模板）
-            energy_cost = recognize_energy_by_template(card_type)
-
-            return True, card_name, energy_cost, card_type
+        return True, card_name, energy_cost, card_type
 
     # 没有匹配到任何卡牌模板
-    print("[卡牌类型识别] 未识别到任何卡牌")
+    log.info("未识别到任何卡牌")
     return False, None, None, ""
 
 
@@ -112,13 +141,29 @@ def print_summary(results: Dict[int, Tuple[str, Optional[int], str]]):
     print("=" * 50)
 
 
+# 按键后等待画面稳定的上限（原来的固定等待时长）
+START_WAIT = 1.0
+SELECT_WAIT = 0.5
+PLAY_WAIT = 0.3
+
+
+def _wait_card_area(max_wait: float, expect_change: bool = True) -> float:
+    """等手牌区域画面稳定，返回相比固定 sleep 省下的秒数"""
+    stable, waited = wait_until_stable(resolve_roi("card"), max_wait, expect_change=expect_change)
+    if not stable:
+        log.info("%.2fs 内画面未稳定", max_wait)
+    return max(max_wait - waited, 0.0)
+
+
 def press_hotkeys_with_recognition():
     """
     循环按下热键，每次按键后识别手牌区域一次
     识别成功则立即再次按下该热键执行游戏操作
     识别失败则退出循环
+    按键后不再固定 sleep，而是等手牌区域画面稳定
     """
-    time.sleep(1)  # 初始等待
+    import pyautogui
+    saved = _wait_card_area(START_WAIT, expect_change=False)  # 初始等待
 
     hotkey_index = 1
     recognition_results: Dict[int, Tuple[str, Optional[int], str]] = {}  # 收集识别结果 (卡牌名, 能量, 类型)
@@ -130,8 +175,8 @@ def press_hotkeys_with_recognition():
         print(f"按下热键: {hotkey_index}（用于选中卡牌识别）")
         print(f"{'=' * 40}")
 
-        # 等待游戏响应
-        time.sleep(0.5)
+        # 等待游戏响应（选中动画结束）
+        saved += _wait_card_area(SELECT_WAIT)
 
         # 识别并获取结果（包含能量值和卡牌类型）
         success, card_name, energy_cost, card_type = recognize_card_and_energy(hotkey_index)
@@ -146,7 +191,7 @@ def press_hotkeys_with_recognition():
             # 第二步：再次按下该热键，执行游戏操作
             print(f"⏳ 再次按下热键: {hotkey_index}（执行游戏操作）")
             pyautogui.press(str(hotkey_index))
-            time.sleep(0.3)  # 等待游戏响应
+            saved += _wait_card_area(PLAY_WAIT)  # 等待游戏响应
 
             print(f"✅ 热键 {hotkey_index} 操作完成")
         else:
@@ -160,6 +205,35 @@ def press_hotkeys_with_recognition():
 
     # 所有卡牌识别完成后，打印汇总
     print_summary(recognition_results)
+    print(f"画面稳定检测共节省等待 {saved:.2f}s")
+
+
+def play_hand_from_single_frame():
+    """
+    一次截图解析整手牌（见 hand_parser.py），热键只用来出牌
+    从最右边的牌开始出，左侧牌的槽位 / 热键不会因出牌而变化
+    """
+    import pyautogui
+    saved = _wait_card_area(START_WAIT, expect_change=False)  # 初始等待
+
+    cards = parse_hand()
+    if not cards:
+        print("\n❌ 未识别到任何手牌")
+        return
+    results: Dict[int, Tuple[str, Optional[int], str]] = {
+        card.slot: (card.name, card.cost, card.type) for card in cards
+    }
+    print_summary(results)
+
+    for card in reversed(cards):
+        energy_str = f"{card.cost}费" if card.cost is not None else "能量未知"
+        print(f"⏳ 出牌: 热键{card.hotkey} {card.name} ({card.type}) - {energy_str}")
+        pyautogui.press(card.hotkey)             # 选中
+        saved += _wait_card_area(SELECT_WAIT)
+        pyautogui.press(card.hotkey)             # 执行
+        saved += _wait_card_area(PLAY_WAIT)
+
+    print(f"画面稳定检测共节省等待 {saved:.2f}s")
 
 
 def test_script():
@@ -170,4 +244,5 @@ def test_script():
 
 
 if __name__ == "__main__":
+    setup_logging()
     test_script()
\ No newline at end of file
@@ -1,99 +1,207 @@
 """
-敌人意图识别 —— 彩色模板匹配版（完整跑 N 次，取最佳）
-针对 debuff.png 增加旋转模板匹配
+敌人意图识别 —— 彩色模板匹配版
+每个模板只算一次响应图，多个敌人靠峰值 + NMS 区分；debuff / debuff2 走粗到细的旋转搜索
+分数落在阈值附近的命中才补拍该命中附近的小区域（自适应共识，见 recognize_intents）
+连续帧用 track_intents / IntentTracker：定位后只在已知图标附近的小窗口里重新匹配
 """
 import cv2
+import logging
 from collections import Counter
 import numpy as np
 from pathlib import Path
-from typing import List, Tuple
-from tools.img_tool import screen_shot
-from tools.config import DATA_ENEMY, INTENT_MAP, ENEMY_AREA
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from tools import classifier
+from tools.img_tool import screen_shot, find_all, find_rotated, nms, batch_match, peaks_in_response
+from tools.frame import Frame, resolve_roi
+from tools.tpl_bank import get_bank
+from tools.trace import setup_logging, traced
+
+log = logging.getLogger(__name__)
 
 BEST_OF_N = 3
 ROT_TPL_NAMES = {"debuff", "debuff2"}
+INTENT_THRESHOLD = 0.80
+NMS_IOU = 0.3
+# 非旋转模板在频域批量匹配（敌人区域只变换一次，模板频谱缓存在模板库里）
+USE_FFT_BATCH = True
+
+# 旋转模板搜索：缩小到 ROT_SCALE、每 ROT_STEP*ROT_COARSE_EVERY 度粗搜，再在原尺度细查相邻角度
+ROT_STEP = 15
+ROT_SCALE = 0.5
+ROT_COARSE_EVERY = 2
+
+# 自适应共识：所有命中都高出阈值 CONSENSUS_MARGIN 时一帧即返回，
+# 只有分数落在 阈值 ± CONSENSUS_MARGIN 内的命中才补拍（只抓该命中附近的小区域）
+ADAPTIVE_CONSENSUS = True
+CONSENSUS_MARGIN = 0.08
+CONSENSUS_PAD = 12
+# 跨帧跟踪：只在已知图标四周 TRACK_PAD 像素的窗口里重新匹配，每 TRACK_REFRESH 次整区域搜一次
+TRACK_PAD = 24
+TRACK_REFRESH = 30
+FALLBACK_INTENT = '未知意图，敌人可能选择防守'
 
-# ================= 旋转模板缓存 =================
-# 只给 debuff.png 预生成多角度模板
-_ROT_TPLS: dict[str, List[Tuple[np.ndarray, float]]] = {}   # angle -> (tpl, angle)
-
-def _load_rot_templates(tpl_path: Path, step: int = 15) -> List[Tuple[np.ndarray, float]]:
-    """返回 [(旋转模板, 角度), ...] 列表，0°–360°"""
-    if tpl_path.stem in _ROT_TPLS:
-        return _ROT_TPLS[tpl_path.stem]
-    base = cv2.imread(str(tpl_path), cv2.IMREAD_COLOR)
-    h, w = base.shape[:2]
-    center = (w // 2, h // 2)
-    rot_tuples = []
-    for angle in range(0, 360, step):
-        M = cv2.getRotationMatrix2D(center, angle, 1.0)
-        # 计算新画布大小，防止裁切
-        cos, sin = np.abs(M[0, 0]), np.abs(M[0, 1])
-        new_w = int((h * sin) + (w * cos))
-        new_h = int((h * cos) + (w * sin))
-        M[0, 2] += (new_w / 2) - center[0]
-        M[1, 2] += (new_h / 2) - center[1]
-        rot = cv2.warpAffine(base, M, (new_w, new_h), borderValue=(0, 0, 0))
-        rot_tuples.append((rot, angle))
-    _ROT_TPLS[tpl_path.stem] = rot_tuples
-    return rot_tuples
-
-# ================= 单次匹配（含旋转逻辑） =================
-def match_color_once(img: np.ndarray, tpl: np.ndarray, threshold: float = 0.8,
-                     tpl_name: str = "") -> Tuple[bool, Tuple[int, int]]:
+
+class IntentHit(NamedTuple):
+    """一个意图图标：ENEMY_AREA 内的坐标、尺寸和相似度"""
+    key: str
+    name: str
+    x: int
+    y: int
+    w: int
+    h: int
+    score: float
+
+# ================= 单次完整识别 =================
+def _find_template(enemy_bgr: np.ndarray, key: str, tpl: np.ndarray, threshold: float,
+                   levels: Dict[float, np.ndarray]) -> List[Tuple[int, int, int, int, float]]:
+    """单个意图模板的全部命中 [(x, y, w, h, 相似度), ...]，旋转模板走粗到细角度搜索"""
+    if key not in ROT_TPL_NAMES:
+        h_t, w_t = tpl.shape[:2]
+        return [(x, y, w_t, h_t, s) for x, y, s in find_all(enemy_bgr, tpl, threshold, NMS_IOU)]
+    bank = get_bank()
+    full = bank.rot_stack("enemy", key, ROT_STEP)
+    small = bank.rot_stack("enemy", key, ROT_STEP, ROT_SCALE)
+    hay_small = levels.get(ROT_SCALE)
+    if hay_small is None:
+        hay_small = levels[ROT_SCALE] = cv2.resize(enemy_bgr, None, fx=ROT_SCALE, fy=ROT_SCALE,
+                                                   interpolation=cv2.INTER_AREA)
+    hits = find_rotated(enemy_bgr, full, small, ROT_SCALE, threshold,
+                        coarse_every=ROT_COARSE_EVERY, nms_iou=NMS_IOU, hay_small=hay_small)
+    return [(x, y, w, h, s) for x, y, w, h, s, _angle in hits]
+
+@traced("enemy.detect_intents")
+def detect_intents(enemy_bgr: np.ndarray, threshold: float = INTENT_THRESHOLD) -> List[IntentHit]:
     """
-    对 debuff.png / debuff2.png 启用多角度匹配，其余模板原样匹配
+    在敌人区域图上找出全部意图图标，不修改输入图
+    不同模板命中同一位置时只保留相似度最高的，结果按从左到右排序
+    分类器打开时（classifier.enabled()）改用分类器，score 为该类概率
     """
-    if tpl_name in ROT_TPL_NAMES:              # <-- 只改这里
-        rot_tuples = _load_rot_templates(DATA_ENEMY / f"{tpl_name}.png")
-        best_val, best_loc = 0, None
-        for rot_tpl, _angle in rot_tuples:
-            res = cv2.matchTemplate(img, rot_tpl, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, max_loc = cv2.minMaxLoc(res)
-            if max_val > best_val:
-                best_val, best_loc = max_val, max_loc
-        if best_val >= threshold:
-            return True, best_loc
-    else:
-        # 原版匹配
-        res = cv2.matchTemplate(img, tpl, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, max_loc = cv2.minMaxLoc(res)
-        if max_val >= threshold:
-            return True, max_loc
-    return False, None
+    bank = get_bank()
+    if classifier.enabled():
+        clf = classifier.get_classifier("enemy")
+        names = dict(zip(clf.keys, clf.names))
+        hits = [IntentHit(key, names[key], x, y, w, h, p) for key, x, y, w, h, p in clf.detect(enemy_bgr, threshold)]
+        hits.sort(key=lambda h: h.x)
+        return hits
+    hits: List[IntentHit] = []
+    levels: Dict[float, np.ndarray] = {}          # 缩小后的敌人区域，两个 debuff 模板共用
+    items = bank.items("enemy", color=True)
+    maps: Dict[str, np.ndarray] = {}
+    if USE_FFT_BATCH:
+        maps = batch_match(enemy_bgr, [(k, t) for k, _, t in items if k not in ROT_TPL_NAMES],
+                           lambda k, t, shape: bank.spectrum("enemy", k, shape, color=True))
+    for key, intent_cn, tpl in items:
+        if key in maps:
+            h_t, w_t = tpl.shape[:2]
+            found = [(x, y, w_t, h_t, s) for x, y, s in
+                     peaks_in_response(maps[key], (h_t, w_t), threshold, NMS_IOU)]
+        else:
+            found = _find_template(enemy_bgr, key, tpl, threshold, levels)
+        for x, y, w, h, s in found:
+            hits.append(IntentHit(key, intent_cn, x, y, w, h, s))
+    if len(hits) > 1:
+        boxes = np.array([(h.x, h.y, h.w, h.h) for h in hits], dtype=np.float32)
+        scores = np.array([h.score for h in hits], dtype=np.float32)
+        hits = [hits[i] for i in nms(boxes, scores, NMS_IOU)]
+    hits.sort(key=lambda h: h.x)
+    return hits
 
-# ================= 单次完整识别 =================
-def _single_count() -> Tuple[int, List[str]]:
-    enemy_bgr = shot_enemy_color()
-    total = 0
-    intents = []
-
-    for key, (intent_cn, file_name) in INTENT_MAP.items():
-        tpl_path = DATA_ENEMY / file_name
-        if not tpl_path.exists():
-            continue
-        tpl = load_tpl_color(tpl_path)
-        tpl_name = tpl_path.stem                 # 用于区分 debuff
+def scan_intents(frame: Optional[Frame] = None, threshold: float = INTENT_THRESHOLD) -> List[IntentHit]:
+    """截图（或使用传入帧）并返回带坐标和相似度的意图列表"""
+    return detect_intents(shot_enemy_color(frame), threshold)
 
-        while True:
-            hit, top_left = match_color_once(enemy_bgr, tpl, threshold=0.80, tpl_name=tpl_name)
-            if not hit:
+def _single_count(frame: Optional[Frame] = None) -> Tuple[int, List[str]]:
+    hits = scan_intents(frame)
+    return len(hits), [h.name for h in hits]
+
+# ================= 自适应共识 =================
+def _rescore(hit: IntentHit, threshold: float) -> Tuple[float, Tuple[int, int]]:
+    """
+    现截该命中附近的小区域，重新匹配同一模板，返回 (最高相似度, 区域尺寸)
+    分类器打开时候选分数是概率，这里也用分类器重新打分，不和模板相似度混着平均
+    """
+    area = resolve_roi("enemy")
+    x0 = max(hit.x - CONSENSUS_PAD, 0)
+    y0 = max(hit.y - CONSENSUS_PAD, 0)
+    w = min(hit.w + 2 * CONSENSUS_PAD, area[2] - x0)
+    h = min(hit.h + 2 * CONSENSUS_PAD, area[3] - y0)
+    patch = screen_shot(color=True, roi=(area[0] + x0, area[1] + y0, w, h))
+    if classifier.enabled():
+        found = classifier.get_classifier("enemy").detect(patch, threshold)
+        return max((f[5] for f in found if f[0] == hit.key), default=0.0), (w, h)
+    tpl = get_bank().get("enemy", hit.key, color=True)
+    found = _find_template(patch, hit.key, tpl, threshold, {})
+    return max((f[4] for f in found), default=0.0), (w, h)
+
+
+@traced("enemy.recognize_intents")
+def recognize_intents(n: int = BEST_OF_N, frame: Optional[Frame] = None,
+                      margin: float = CONSENSUS_MARGIN,
+                      threshold: float = INTENT_THRESHOLD) -> Dict[str, object]:
+    """
+    自适应共识识别（frame 为 None，现截屏幕时）
+    1. 现截敌人区域，以 threshold - margin 为下限找出全部候选
+    2. 分数 >= threshold + margin 的直接采信
+    3. 其余候选最多再补拍 n - 1 次，每次只截该候选附近的小区域，平均分 >= threshold 才保留
+    传入 frame 时（基准测试 / 常驻服务 / 感知服务 / 回放）同一帧重新匹配分数不会变，
+    不做共识，直接按 threshold 判定，frames_used 为 1
+    返回 {"count", "intents", "hits"（最终 IntentHit，score 为平均分）, "frames_used"}
+    frames_used 为拍摄次数（首帧 + 补拍次数最多的那个候选的补拍次数）
+    """
+    if frame is not None:
+        return _intent_result(scan_intents(frame, threshold), 1)
+    candidates = scan_intents(None, threshold - margin)
+    final: List[IntentHit] = []
+    extra_max = 0
+    for hit in candidates:
+        if hit.score >= threshold + margin:
+            final.append(hit)
+            continue
+        scores = [hit.score]
+        for _ in range(n - 1):
+            score, _size = _rescore(hit, threshold - margin)
+            scores.append(score)
+            mean = sum(scores) / len(scores)
+            if abs(mean - threshold) >= margin:       # 平均分已经明确，提前结束
                 break
-            total += 1
-            intents.append(intent_cn)
-            # 涂黑：用原模板尺寸即可（旋转模板已内部处理）
-            h_t, w_t = tpl.shape[:2]
-            x, y = top_left
-            enemy_bgr[y:y+h_t, x:x+w_t] = 0
+        extra_max = max(extra_max, len(scores) - 1)
+        mean = sum(scores) / len(scores)
+        log.info("共识 %s @(%d,%d) 分数=%s 平均=%.3f %s", hit.name, hit.x, hit.y,
+                 ["%.3f" % s for s in scores], mean, "保留" if mean >= threshold else "丢弃")
+        if mean >= threshold:
+            final.append(hit._replace(score=mean))
+    return _intent_result(final, 1 + extra_max)
+
 
-    return total, intents
+def _intent_result(final: List[IntentHit], frames_used: int) -> Dict[str, object]:
+    intents = [h.name for h in final]
+    return {
+        "count": len(final) if final else 1,
+        "intents": intents if intents else [FALLBACK_INTENT],
+        "hits": final,
+        "frames_used": frames_used,
+    }
 
 # ================= N 次取最佳（带打印） =================
-def count_enemies_and_intent(n: int = BEST_OF_N) -> Tuple[int, List[str]]:
+def count_enemies_and_intent(n: int = BEST_OF_N, frame: Optional[Frame] = None,
+                             adaptive: bool = ADAPTIVE_CONSENSUS) -> Tuple[int, List[str]]:
+    """
+    adaptive=True：见 recognize_intents，只对模棱两可的命中补拍
+    adaptive=False：frame 为 None 时重复截图 n 次取共识；
+                    传入 frame 时只在这一帧上识别一次（同一帧重复匹配结果相同）
+    """
+    if adaptive:
+        res = recognize_intents(n, frame)
+        log.info("敌人数量：%d，意图列表：%s，使用帧数：%d",
+                 res["count"], res["intents"], res["frames_used"])
+        return res["count"], res["intents"]
+
+    if frame is not None:
+        n = 1
     rounds = []
     for i in range(1, n + 1):
-        t, its = _single_count()
-        print(f"[Round {i}/{n}] 敌人数量：{t}，意图列表：{its}")
+        t, its = _single_count(frame)
+        log.info("第 %d/%d 轮 敌人数量：%d，意图列表：%s", i, n, t, its)
         rounds.append(its)
 
     long_list = [it for r in rounds for it in r]
@@ -118,21 +226,136 @@ def count_enemies_and_intent(n: int = BEST_OF_N) -> Tuple[int, List[str]]:
 
     # 兜底
     if not final_list:
-        return 1, ['未知意图，敌人可能选择防守']
+        return 1, [FALLBACK_INTENT]
 
     return len(final_list), final_list
+
+# ================= 跨帧跟踪 =================
+class IntentTracker:
+    """
+    战斗中敌人位置基本不动：定位过一次之后，每个已知图标只在其中心附近的固定大小窗口里
+    重新匹配全部意图模板（意图可能换了），窗口大小 = 最大模板（含旋转）+ 2 * pad
+    以下情况退回整区域搜索：还没有位置、场景变了、敌人区域变了（换布局）、
+    任一窗口没找到图标（敌人死亡 / 移动）、距上次整区域搜索已 refresh 次（发现新出现的敌人）
+    """
+
+    def __init__(self, pad: int = TRACK_PAD, refresh: int = TRACK_REFRESH,
+                 threshold: float = INTENT_THRESHOLD):
+        self.pad = pad
+        self.refresh = refresh
+        self.threshold = threshold
+        self.hits: List[IntentHit] = []
+        self._scene: Optional[str] = None
+        self._area: Optional[Tuple[int, int, int, int]] = None
+        self._since_full = 0
+        self._window: Optional[Tuple[int, int]] = None
+        self.full_searches = 0
+        self.tracked_updates = 0
+        self.last_pixels = 0            # 上一次更新实际搜索的像素数
+
+    def reset(self):
+        self.hits = []
+        self._since_full = 0
+
+    def _window_size(self) -> Tuple[int, int]:
+        """(h, w)，按模板库当前比例计算，模板缩放后需要 reset（布局变化时会自动触发）"""
+        if self._window is None:
+            bank = get_bank()
+            h = w = 0
+            for key, _cn, tpl in bank.items("enemy", color=True):
+                th, tw = tpl.shape[:2]
+                if key in ROT_TPL_NAMES:
+                    rs = bank.rot_stack("enemy", key, ROT_STEP)
+                    th, tw = rs.stack.shape[1:3]
+                h, w = max(h, th), max(w, tw)
+            self._window = (h + 2 * self.pad, w + 2 * self.pad)
+        return self._window
+
+    def _full(self, enemy_bgr: np.ndarray) -> List[IntentHit]:
+        self.hits = detect_intents(enemy_bgr, self.threshold)
+        self._since_full = 0
+        self.full_searches += 1
+        self.last_pixels = enemy_bgr.shape[0] * enemy_bgr.shape[1]
+        return self.hits
+
+    def _track(self, enemy_bgr: np.ndarray) -> Optional[List[IntentHit]]:
+        """在各窗口里重新匹配；任一窗口丢失或两个窗口认成同一个图标时返回 None"""
+        H, W = enemy_bgr.shape[:2]
+        wh, ww = self._window_size()
+        wh, ww = min(wh, H), min(ww, W)
+        tracked: List[IntentHit] = []
+        for hit in self.hits:
+            # 窗口以上次图标中心为中心，贴边时平移而不是裁小，保证窗口尺寸固定（频谱缓存可复用）
+            x0 = min(max(hit.x + hit.w // 2 - ww // 2, 0), W - ww)
+            y0 = min(max(hit.y + hit.h // 2 - wh // 2, 0), H - wh)
+            found = detect_intents(enemy_bgr[y0:y0 + wh, x0:x0 + ww], self.threshold)
+            if not found:
+                log.debug("跟踪丢失：%s @(%d,%d)", hit.name, hit.x, hit.y)
+                return None
+            best = max(found, key=lambda h: h.score)
+            tracked.append(best._replace(x=best.x + x0, y=best.y + y0))
+        self.last_pixels = len(self.hits) * wh * ww
+        boxes = np.array([(h.x, h.y, h.w, h.h) for h in tracked], dtype=np.float32)
+        scores = np.array([h.score for h in tracked], dtype=np.float32)
+        if len(nms(boxes, scores, NMS_IOU)) < len(tracked):
+            return None
+        tracked.sort(key=lambda h: h.x)
+        return tracked
+
+    @traced("enemy.track")
+    def update(self, frame: Optional[Frame] = None, scene: Optional[str] = None) -> List[IntentHit]:
+        """返回当前意图列表（与 scan_intents 相同格式）；scene 传入场景键时场景变化触发整区域搜索"""
+        enemy_bgr = shot_enemy_color(frame)     # 先取图：布局按这一帧选定后再读 ROI
+        area = resolve_roi("enemy")
+        if scene != self._scene or area != self._area:
+            self._scene, self._area = scene, area
+            self._window = None
+            self.reset()
+        if not self.hits or self._since_full >= self.refresh:
+            return self._full(enemy_bgr)
+        tracked = self._track(enemy_bgr)
+        if tracked is None:
+            return self._full(enemy_bgr)
+        self.hits = tracked
+        self._since_full += 1
+        self.tracked_updates += 1
+        return tracked
+
+    def stats(self) -> Dict[str, float]:
+        area = self._area[2] * self._area[3] if self._area else 0
+        return {"full": self.full_searches, "tracked": self.tracked_updates,
+                "last_pixels": self.last_pixels,
+                "last_ratio": self.last_pixels / area if area else 0.0}
+
+
+_TRACKER: Optional[IntentTracker] = None
+
+
+def get_intent_tracker() -> IntentTracker:
+    """进程级单例"""
+    global _TRACKER
+    if _TRACKER is None:
+        _TRACKER = IntentTracker()
+    return _TRACKER
+
+
+def track_intents(frame: Optional[Frame] = None, scene: Optional[str] = None) -> List[IntentHit]:
+    """scan_intents 的跟踪版：连续调用时只搜已知图标附近"""
+    return get_intent_tracker().update(frame, scene)
+
 # ================= 工具函数 =================
 def load_tpl_color(tpl_path: Path) -> np.ndarray:
-    return cv2.imread(str(tpl_path), cv2.IMREAD_COLOR)
+    return get_bank().by_path(tpl_path, color=True)
 
-def shot_enemy_color() -> np.ndarray:
-    full_bgr = screen_shot(color=True)
-    roi = ENEMY_AREA
-    x0, y0, w, h = roi["left"], roi["top"], roi["width"], roi["height"]
-    return full_bgr[y0:y0+h, x0:x0+w]
+def shot_enemy_color(frame: Optional[Frame] = None) -> np.ndarray:
+    """返回敌人区域 BGR（传入帧时是零拷贝视图，只读使用）"""
+    if frame is None:
+        return screen_shot(color=True, roi=resolve_roi("enemy"))   # 只抓敌人区域
+    return frame.roi("enemy", color=True)
 
 # ---------- 自测 ----------
 if __name__ == "__main__":
+    setup_logging()
     import time, pprint
     time.sleep(1)
     n, its = count_enemies_and_intent()
@@ -1,29 +1,52 @@
 """
-场景识别入口：全屏模板匹配
+场景识别入口：全屏模板匹配（金字塔粗到细）
 """
+import logging
 from pathlib import Path
 import sys
-import cv2
+from typing import List, Optional, Tuple
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
-from tools.config import SCENE_MAP, DATA_SCENE, MATCH_THRESHOLD
-from tools.img_tool import screen_shot, load_tpl, match_once
+from tools.config import MATCH_THRESHOLD, SCENE_COARSE_SLACK, SCENE_PYRAMID_SCALE
+from tools.img_tool import match_pyramid, match_topk
+from tools.frame import Frame, ensure_frame
+from tools.scene_engine import get_engine
+from tools.tpl_bank import get_bank
+from tools.trace import setup_logging
 
-def match_current_scene():
-    full_screen = screen_shot()
-    for key, (cn_name, file_name) in SCENE_MAP.items():
-        tpl_path = DATA_SCENE / file_name
-        if not tpl_path.exists():
-            print(f"[WARN] 模板缺失：{tpl_path}")
-            continue
-        tpl = load_tpl(tpl_path)
-        if match_once(full_screen, tpl, MATCH_THRESHOLD):
-            print(f"[DEBUG] 命中模板：{key} 相似度="
-                  f"{cv2.minMaxLoc(cv2.matchTemplate(full_screen, tpl, cv2.TM_CCOEFF_NORMED))[1]:.3f}")
+log = logging.getLogger(__name__)
+
+def match_current_scene(frame: Optional[Frame] = None):
+    """按转移图顺序识别当前场景（有状态，见 scene_engine.py）"""
+    res = get_engine().detect(frame)
+    if res.key is not None:
+        log.info("命中模板：%s 相似度=%.3f 环节=%s 匹配次数=%d",
+                 res.key, res.score, res.step, res.matches)
+    return res.name
+
+def match_scene_stateless(frame: Optional[Frame] = None):
+    """按 SCENE_MAP 固定顺序逐个检查，不依赖上一次结果"""
+    frame = ensure_frame(frame)
+    full_screen, levels = frame.gray, frame.levels()
+    for key, cn_name, tpl in get_bank().items("scene"):
+        score, _ = match_pyramid(full_screen, tpl, SCENE_PYRAMID_SCALE, levels=levels,
+                                 reject_below=MATCH_THRESHOLD - SCENE_COARSE_SLACK)
+        if score >= MATCH_THRESHOLD:
+            log.info("命中模板：%s 相似度=%.3f", key, score)
             return cn_name
     return None
 
+def rank_scenes(frame: Optional[Frame] = None, k: int = 3) -> List[Tuple[str, float]]:
+    """返回相似度最高的 k 个场景 [(中文名, 相似度), ...]"""
+    frame = ensure_frame(frame)
+    bank = get_bank()
+    names = {key: cn for key, cn, _ in bank.items("scene")}
+    ranked = match_topk(frame.gray, ((key, tpl) for key, _, tpl in bank.items("scene")),
+                        k, SCENE_PYRAMID_SCALE, levels=frame.levels())
+    return [(names[key], score) for key, score, _ in ranked]
+
 if __name__ == "__main__":
+    setup_logging()
     scene = match_current_scene()
-    print("当前场景：", scene if scene else "未识别到任何场景")
\ No newline at end of file
+    print("当前场景：", scene if scene else "未识别到任何场景")
@@ -1,59 +1,174 @@
 #
-import cv2
+import threading
 import numpy as np
-from pathlib import Path
-from typing import Dict, List, Union, Tuple
-from tools.img_tool import screen_shot, dict2tuple, crop, load_tpl
-from tools.config import (
-    DATA_ENEMY, DATA_CARD, INTENT_MAP,
-    ROI_MAP, Card_AREA, ENEMY_AREA
-)
+from typing import TYPE_CHECKING, Dict, List, Optional, Union, Tuple
+from tools.img_tool import screen_shot, dict2tuple, crop
+from tools.frame import AREA_MAP, Frame, ensure_frame, resolve_roi
+from tools.config import OCR_WARMUP, ROI_CACHE_TOLERANT
+from tools.digit_reader import DIGIT_MIN_CONF, get_digit_reader
+from tools.roi_cache import get_cache
+from tools.trace import setup_logging, span, traced
 # 新增：引入 match_enemy 的接口
-from match_enemy import count_enemies_and_intent as match_enemy_count
+from tools.match_enemy import count_enemies_and_intent as match_enemy_count
 
 # --------------- EasyOCR 初始化 ---------------
-import easyocr
-from typing import Optional
-_READER: Optional[easyocr.Reader] = None
+# easyocr 会连带导入 torch（数秒、数百 MB），只在第一次真正需要 OCR 时导入
+if TYPE_CHECKING:
+    import easyocr
+_READER: Optional["easyocr.Reader"] = None
+_READER_LOCK = threading.Lock()
+_WARMUP_THREAD: Optional[threading.Thread] = None
 
-def _get_reader() -> easyocr.Reader:
+def _get_reader() -> "easyocr.Reader":
     global _READER
     if _READER is None:
-        _READER = easyocr.Reader(["ch_sim", "en"], gpu=False)
+        with _READER_LOCK:                  # 预热线程正在建时这里会等它建完
+            if _READER is None:
+                with span("ocr.build_reader"):
+                    import easyocr
+                    _READER = easyocr.Reader(["ch_sim", "en"], gpu=False)
     return _READER
 
+def warmup_reader(background: bool = True) -> Optional[threading.Thread]:
+    """
+    提前建好 EasyOCR reader 并跑一次空推理，避免第一次战斗识别时卡住加载模型
+    background=True 时在后台线程执行并返回该线程
+    """
+    global _WARMUP_THREAD
+
+    def _run():
+        reader = _get_reader()
+        reader.recognize(np.zeros((32, 64), dtype=np.uint8), detail=0)
+
+    if not background:
+        _run()
+        return None
+    if _WARMUP_THREAD is None:
+        _WARMUP_THREAD = threading.Thread(target=_run, name="ocr-warmup", daemon=True)
+        _WARMUP_THREAD.start()
+    return _WARMUP_THREAD
+
 def _try_int(txt: str, default: int = 0) -> int:
     digits = "".join(c for c in txt if c.isdigit())
     return int(digits) if digits else default
 
 # --------------- 固定 ROI 读取 ---------------
-def _fix_roi_read(name: str) -> int:
-    roi = dict2tuple(ROI_MAP.get(name))
-    if roi is None:
+# EasyOCR 兜底读出的数字存成新字形（逐步补全 data/digit，仓库不带字形，见 digit_reader.py）
+DIGIT_AUTO_HARVEST = True
+
+def _fix_roi_read(name: str, frame: Optional[Frame] = None) -> int:
+    if name not in AREA_MAP:
         return 0
-    patch = crop(screen_shot(), roi)
-    texts = _get_reader().readtext(patch, detail=0)
-    return _try_int("".join(texts))
+    roi = resolve_roi(name)                   # 当前布局的 ROI（还没有布局时先按屏幕尺寸选择）
+    # 没有共享帧时只抓这一小块区域
+    patch = crop(frame.gray, roi) if frame is not None else screen_shot(roi=roi)
+    # 像素没变就直接用上次的读数
+    return get_cache().memo(("ocr", name), patch, lambda: _read_patch(patch),
+                            tolerant=ROI_CACHE_TOLERANT)
+
+def _read_patch(patch: np.ndarray) -> int:
+    # 先用字形模板读，置信度够就不走 EasyOCR
+    digit = get_digit_reader().read(patch)
+    if digit.value is not None and digit.conf >= DIGIT_MIN_CONF:
+        return digit.value
+    with span("ocr.easyocr"):
+        texts = _get_reader().readtext(patch, detail=0)
+    text = "".join(texts)
+    if DIGIT_AUTO_HARVEST:
+        get_digit_reader().harvest(patch, text)
+    return _try_int(text)
 
-# --------------- 灰度 + 空模板保护 ---------------
-def _safe_tpl(path: Path) -> np.ndarray:
-    return load_tpl(path) if path.exists() else np.array([])
+# --------------- 批量 OCR ---------------
+OCR_PACK_GAP = 16       # 拼图时各块之间的空白
+
+def _batch_ocr(patches: List[np.ndarray]) -> List[str]:
+    """
+    把多块灰度图竖着拼成一张，ROI 已知所以跳过文字检测，各块作为 horizontal_list 交给一次 recognize
+    注意：CPU 模式（gpu=False）下 EasyOCR 内部仍逐块跑识别网络，省下的主要是检测器和多次调用的开销
+    """
+    if not patches:
+        return []
+    width = max(p.shape[1] for p in patches)
+    height = sum(p.shape[0] for p in patches) + OCR_PACK_GAP * (len(patches) + 1)
+    canvas = np.zeros((height, width), dtype=np.uint8)
+    boxes, spans = [], []
+    y = OCR_PACK_GAP
+    for p in patches:
+        h, w = p.shape[:2]
+        canvas[y:y + h, :w] = p
+        boxes.append([0, w, y, y + h])          # [x_min, x_max, y_min, y_max]
+        spans.append((y, y + h))
+        y += h + OCR_PACK_GAP
+    reader = _get_reader()
+    with span("ocr.easyocr_batch", n=len(patches)):
+        results = reader.recognize(canvas, horizontal_list=boxes, free_list=[],
+                                   allowlist="0123456789", batch_size=len(patches), detail=1)
+    # 按结果框的纵坐标映射回各块（EasyOCR 内部会按 y 排序）
+    texts = [""] * len(patches)
+    for box, text, _conf in results:
+        cy = (box[0][1] + box[2][1]) / 2
+        for i, (y0, y1) in enumerate(spans):
+            if y0 <= cy <= y1:
+                texts[i] += text
+                break
+    return texts
+
+@traced("ocr.read_fixed_rois")
+def read_fixed_rois(names: List[str], frame: Optional[Frame] = None) -> Dict[str, int]:
+    """
+    读取多个固定数字 ROI：先查像素哈希缓存，再用字形模板，置信度不够的拼成一张图做一次 recognize（跳过检测器）
+    """
+    frame = ensure_frame(frame)
+    cache = get_cache()
+    result: Dict[str, int] = {}
+    pending: List[Tuple[str, np.ndarray, tuple]] = []
+    for name in names:
+        roi = dict2tuple(AREA_MAP.get(name))      # 当前布局的 ROI
+        if roi is None:
+            result[name] = 0
+            continue
+        patch = crop(frame.gray, roi)
+        key = cache.key(("ocr", name), patch, ROI_CACHE_TOLERANT)
+        hit, value = cache.get(key)
+        if hit:
+            result[name] = value
+            continue
+        digit = get_digit_reader().read(patch)
+        if digit.value is not None and digit.conf >= DIGIT_MIN_CONF:
+            result[name] = digit.value
+            cache.put(key, digit.value)
+        else:
+            pending.append((name, patch, key))
+
+    texts = _batch_ocr([p for _, p, _ in pending])
+    for (name, patch, key), text in zip(pending, texts):
+        if DIGIT_AUTO_HARVEST:
+            get_digit_reader().harvest(patch, text)
+        result[name] = _try_int(text)
+        cache.put(key, result[name])
+    # 保持调用方给出的键顺序
+    return {name: result[name] for name in names}
 
 # --------------- 对外唯一接口 ---------------
-def battle_state() -> Dict[str, Union[int, List[str]]]:
-    result = {}
-    for key in ("player_hp", "player_hp_max",
-                "player_energy", "player_energy_max",
-                "player_block", "gold"):
-        result[key] = _fix_roi_read(key)
+@traced("ocr.battle_state")
+def battle_state(frame: Optional[Frame] = None) -> Dict[str, Union[int, List[str]]]:
+    """所有字段取自同一帧截图"""
+    frame = ensure_frame(frame)
+    result = read_fixed_rois(["player_hp", "player_hp_max",
+                              "player_energy", "player_energy_max",
+                              "player_block", "gold"], frame)
 
     # 直接调用 match_enemy 提供的接口
-    enemy_total, enemy_intents = match_enemy_count()
+    enemy_total, enemy_intents = match_enemy_count(frame=frame)
     result["enemy_count"] = enemy_total
     result["enemy_intents"] = enemy_intents
     return result
 
+if OCR_WARMUP:
+    warmup_reader()
+
 if __name__ == "__main__":
+    setup_logging()
     import time, pprint
     time.sleep(1)
     pprint.pprint(battle_state())
\ No newline at end of file
@@ -0,0 +1,272 @@
+"""
+异步感知服务：截图任务按固定频率取帧，各识别器在线程池里并行处理最新帧
+丢旧帧：识别器忙时新帧只覆盖“最新帧”，空闲后直接处理最新的一帧，不排队
+每个识别器出结果就合并出一份新的 PerceptionState，决策延迟取决于最慢的识别器而不是全部之和
+
+async with PerceptionService(rate=10) as svc:
+    state = await svc.latest()              # 等到每个识别器都至少出过一次结果（或出错，见 errors）
+    async for state in svc.subscribe():     # 每次有更新拿到最新状态（中间状态会被跳过）
+        ...
+截图源结束（回放放完）且各识别器处理完最后一帧后，subscribe 结束迭代，
+latest / next_state 抛 PerceptionEnded，不会一直等下去
+识别器是普通的阻塞函数 fn(frame) -> 结果；cv2 计算时释放 GIL，默认用线程池
+需要类型化状态和变化事件时用 tools.game_state.StateTracker（增量更新，只重算变化的 ROI）
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional
+
+from tools.frame import Frame, ensure_frame
+from tools.trace import span
+
+log = logging.getLogger(__name__)
+
+PERCEPTION_RATE = 10.0          # 默认截图频率（Hz）
+
+Recognizer = Callable[[Frame], Any]
+_NO_VALUE = object()
+
+
+class PerceptionEnded(EOFError):
+    """截图源已结束（或服务已停止），不会再有新状态"""
+
+
+class PerceptionState(NamedTuple):
+    """一次合并后的感知结果；各字段可能来自不同帧（frames 记录来源帧号）"""
+    seq: int                            # 状态序号，每次合并 +1
+    ts: float                           # 最新参与合并的帧的截图时间
+    values: Dict[str, Any]              # 识别器名 -> 结果
+    frames: Dict[str, int]              # 识别器名 -> 结果所用的帧号
+    latency: Dict[str, float]           # 识别器名 -> 最近一次耗时（秒）
+    errors: Dict[str, str]              # 识别器名 -> 最近一次异常（成功后清除），出错的识别器可能不在 values 里
+
+
+def default_recognizers() -> Dict[str, Recognizer]:
+    """场景、敌人意图、固定 ROI 数字、手牌；依赖缺失的识别器跳过"""
+    from tools.match_scene import match_current_scene
+    from tools.match_enemy import track_intents
+    from tools.hand_parser import parse_hand
+    recs: Dict[str, Recognizer] = {
+        "scene": match_current_scene,
+        "intents": track_intents,           # 连续帧只搜已知图标附近
+        "hand": parse_hand,
+    }
+    try:
+        from tools.ocr_tool import read_fixed_rois
+        recs["numbers"] = lambda frame: read_fixed_rois(
+            ["player_hp", "player_hp_max", "player_energy", "player_energy_max",
+             "player_block", "gold"], frame)
+    except ImportError as e:
+        log.warning("数字识别不可用：%s", e)
+    return recs
+
+
+class PerceptionService:
+    """
+    rate: 截图频率（Hz）
+    recognizers: 名称 -> fn(frame)，默认见 default_recognizers()
+    executor: 自定义线程 / 进程池（进程池要求识别器和帧可 pickle）
+    grab: 取帧函数，默认用当前截图后端截全屏
+    """
+
+    def __init__(self, rate: float = PERCEPTION_RATE,
+                 recognizers: Optional[Dict[str, Recognizer]] = None,
+                 executor: Optional[Executor] = None,
+                 grab: Optional[Callable[[], Frame]] = None):
+        self.period = 1.0 / rate
+        self.recognizers = recognizers if recognizers is not None else default_recognizers()
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=len(self.recognizers) + 1, thread_name_prefix="perception")
+        self._grab = grab or (lambda: ensure_frame(None))
+        self._frame: Optional[Frame] = None
+        self._frame_seq = 0
+        self._new_frame: Optional[asyncio.Condition] = None
+        self._updated: Optional[asyncio.Condition] = None
+        self._values: Dict[str, Any] = {}
+        self._frames: Dict[str, int] = {}
+        self._latency: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        self._state: Optional[PerceptionState] = None
+        self._seq = 0
+        self._tasks: List[asyncio.Task] = []
+        self._capture_done = False      # 截图源已结束
+        self._running = 0               # 还没退出的识别任务数
+        self._closed = False            # 截图已结束且识别任务都处理完了，不会再有新状态
+        self.dropped = 0                # 识别器没来得及处理就被覆盖的帧数（按识别器累计）
+
+    # ---------------- 生命周期 ----------------
+    async def start(self) -> "PerceptionService":
+        self._new_frame = asyncio.Condition()
+        self._updated = asyncio.Condition()
+        self._capture_done = self._closed = False
+        self._running = len(self.recognizers)
+        self._tasks = [asyncio.create_task(self._capture_loop(), name="perception-capture")]
+        self._tasks += [asyncio.create_task(self._worker(name, fn), name=f"perception-{name}")
+                        for name, fn in self.recognizers.items()]
+        return self
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._close()
+        if self._own_executor:
+            self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+        return False
+
+    # ---------------- 截图 ----------------
+    async def _capture_loop(self):
+        loop = asyncio.get_running_loop()
+        next_t = loop.time()
+        while True:
+            try:
+                frame = await loop.run_in_executor(self._executor, self._grab)
+            except EOFError:                # 回放后端放完了
+                log.info("截图源已结束")
+                await self._end_capture()
+                return
+            except Exception:
+                log.exception("截图出错，感知服务停止取帧")
+                await self._end_capture()
+                return
+            async with self._new_frame:
+                self._frame = frame
+                self._frame_seq += 1
+                self._new_frame.notify_all()
+            next_t += self.period
+            delay = next_t - loop.time()
+            if delay < 0:                   # 截图本身比周期还慢，不追赶
+                next_t = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    async def _end_capture(self):
+        async with self._new_frame:
+            self._capture_done = True
+            self._new_frame.notify_all()
+
+    # ---------------- 识别 ----------------
+    async def _worker(self, name: str, fn: Recognizer):
+        loop = asyncio.get_running_loop()
+        done_seq = 0
+
+        def run(frame: Frame):
+            with span(f"perception.{name}"):
+                return fn(frame)
+
+        try:
+            while True:
+                async with self._new_frame:
+                    await self._new_frame.wait_for(lambda: self._frame_seq > done_seq or self._capture_done)
+                    if self._frame_seq <= done_seq:     # 截图已结束，最后一帧也处理完了
+                        return
+                    frame, seq = self._frame, self._frame_seq
+                if done_seq:
+                    self.dropped += seq - done_seq - 1
+                t0 = time.perf_counter()
+                try:
+                    value = await loop.run_in_executor(self._executor, run, frame)
+                    self._errors.pop(name, None)
+                except Exception as e:          # 单个识别器出错不影响其他识别器，错误也发布出去
+                    log.exception("识别器 %s 出错", name)
+                    self._errors[name] = f"{type(e).__name__}: {e}"
+                    value = _NO_VALUE
+                self._latency[name] = time.perf_counter() - t0
+                done_seq = seq
+                await self._publish(name, value, seq, frame.ts)
+        finally:
+            self._running -= 1
+            if self._running == 0 and self._capture_done:
+                await self._close()
+
+    async def _close(self):
+        if self._updated is None:
+            return
+        async with self._updated:
+            self._closed = True
+            self._updated.notify_all()
+
+    async def _publish(self, name: str, value: Any, frame_seq: int, ts: float):
+        """value 为 _NO_VALUE 表示识别器出错：只更新 errors / latency，保留上一次的结果"""
+        async with self._updated:
+            if value is not _NO_VALUE:
+                self._values[name] = value
+                self._frames[name] = frame_seq
+            self._seq += 1
+            self._state = PerceptionState(self._seq, max(ts, self._state.ts if self._state else 0.0),
+                                    dict(self._values), dict(self._frames),
+                                    dict(self._latency), dict(self._errors))
+            self._updated.notify_all()
+
+    # ---------------- 消费 ----------------
+    @property
+    def state(self) -> Optional[PerceptionState]:
+        """当前最新状态（可能还不完整），不等待"""
+        return self._state
+
+    def _complete(self) -> bool:
+        """每个识别器都出过结果或报过错"""
+        return self._state is not None and \
+            self.recognizers.keys() <= self._state.values.keys() | self._state.errors.keys()
+
+    async def latest(self) -> PerceptionState:
+        """最新的完整状态：每个识别器都至少出过一次结果（或出错）后才返回；服务已结束时抛 PerceptionEnded"""
+        async with self._updated:
+            await self._updated.wait_for(lambda: self._complete() or self._closed)
+            if not self._complete():
+                raise PerceptionEnded("截图源已结束，部分识别器没有出过结果")
+            return self._state
+
+    async def next_state(self, after: int = 0) -> PerceptionState:
+        """等一份序号大于 after 的完整状态；服务已结束、不会再有时抛 PerceptionEnded"""
+        async with self._updated:
+            await self._updated.wait_for(
+                lambda: (self._complete() and self._state.seq > after) or self._closed)
+            if not (self._complete() and self._state.seq > after):
+                raise PerceptionEnded("截图源已结束")
+            return self._state
+
+    async def subscribe(self) -> AsyncIterator[PerceptionState]:
+        """持续产出最新状态；消费者慢时中间状态被跳过；截图源结束后迭代结束"""
+        seq = 0
+        while True:
+            try:
+                state = await self.next_state(seq)
+            except PerceptionEnded:
+                return
+            seq = state.seq
+            yield state
+
+
+async def _demo(seconds: float, rate: float):
+    async with PerceptionService(rate) as svc:
+        end = time.monotonic() + seconds
+        async for st in svc.subscribe():
+            lat = " ".join(f"{k}={v * 1000:.0f}ms" for k, v in st.latency.items())
+            v = st.values
+            log.info("#%d 场景=%s 意图=%d 手牌=%d 数字=%s | %s", st.seq, v.get("scene"),
+                     len(v.get("intents") or []), len(v.get("hand") or []), v.get("numbers"), lat)
+            if time.monotonic() > end:
+                break
+        log.info("丢弃帧数：%d", svc.dropped)
+
+
+if __name__ == "__main__":
+    import argparse
+    from tools.trace import setup_logging
+    setup_logging()
+    ap = argparse.ArgumentParser(description="运行感知服务并打印状态")
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--rate", type=float, default=PERCEPTION_RATE)
+    args = ap.parse_args()
+    asyncio.run(_demo(args.seconds, args.rate))
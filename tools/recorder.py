@@ -0,0 +1,455 @@
+"""
+会话录制 / 回放：把一局游戏录成紧凑的帧库，离线按原速或全速回放
+帧库目录：
+  meta.json       尺寸、分块大小、关键帧间隔
+  frames.bin      PNG 压缩的关键帧 / 差分帧首尾相接（读取时内存映射）
+  index.bin       每帧一行 INDEX_DTYPE（时间戳、偏移、长度、类型、所属关键帧），边录边追加
+  actions.jsonl   按键等操作，带时间戳和当时的帧号
+差分帧只存相对上一帧变化的分块（同一行相邻分块合并成一个矩形），全部无损，回放结果与录制时逐像素一致
+录制：
+  with SessionRecorder("runs/0412") as rec:
+      rec.attach()              # 截图后端换成录制后端，pyautogui.press 记为操作
+      ...正常跑识别 / 出牌...
+回放：STS_CAPTURE=replay STS_REPLAY=runs/0412，或 set_backend(StoreBackend("runs/0412"))
+"""
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from tools.capture import CaptureBackend, Region, get_backend, set_backend
+
+STORE_VERSION = 1
+KEYFRAME_EVERY = 60             # 每隔多少帧强制存一个关键帧（限制随机访问时要叠加的差分数）
+KEYFRAME_RATIO = 0.5            # 变化面积超过这个比例就直接存关键帧
+TILE = 64                       # 差分分块边长
+PNG_LEVEL = 1                   # PNG 压缩级别：录制时要跟得上帧率，取低级别
+
+KIND_KEY, KIND_DIFF = 0, 1
+INDEX_DTYPE = np.dtype([("ts", "<f8"), ("offset", "<i8"), ("length", "<i4"),
+                        ("kind", "u1"), ("key", "<i4")])
+
+
+def _encode(img: np.ndarray) -> bytes:
+    ok, buf = cv2.imencode(".png", img, [cv2.IMWRITE_PNG_COMPRESSION, PNG_LEVEL])
+    if not ok:
+        raise ValueError("PNG 编码失败")
+    return buf.tobytes()
+
+
+def _decode(buf: np.ndarray) -> np.ndarray:
+    return cv2.imdecode(buf, cv2.IMREAD_UNCHANGED)
+
+
+def changed_rects(prev: np.ndarray, cur: np.ndarray, tile: int = TILE) -> List[Tuple[int, int, int, int]]:
+    """按 tile 分块比较两帧，返回变化区域 [(x, y, w, h), ...]（同一行相邻分块已合并）"""
+    h, w = cur.shape[:2]
+    diff = cv2.absdiff(prev, cur)
+    if diff.ndim == 3:
+        diff = diff.max(axis=2)
+    ph, pw = -h % tile, -w % tile
+    if ph or pw:
+        diff = np.pad(diff, ((0, ph), (0, pw)))
+    rows, cols = diff.shape[0] // tile, diff.shape[1] // tile
+    dirty = diff.reshape(rows, tile, cols, tile).max(axis=(1, 3)) > 0
+    rects = []
+    for r in np.flatnonzero(dirty.any(axis=1)):
+        row = dirty[r]
+        c = 0
+        while c < cols:
+            if not row[c]:
+                c += 1
+                continue
+            start = c
+            while c < cols and row[c]:
+                c += 1
+            x, y = start * tile, r * tile
+            rects.append((x, y, min(c * tile, w) - x, min(tile, h - y)))
+    return rects
+
+
+# ================= 录制 =================
+class SessionRecorder:
+    """把帧和操作写进帧库目录；线程安全"""
+
+    def __init__(self, path: Union[str, Path], keyframe_every: int = KEYFRAME_EVERY,
+                 tile: int = TILE):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        if (self.path / "index.bin").exists():
+            raise FileExistsError(f"帧库已存在：{self.path}")
+        self.keyframe_every = keyframe_every
+        self.tile = tile
+        self._frames = open(self.path / "frames.bin", "ab")
+        self._index = open(self.path / "index.bin", "ab")
+        self._actions = open(self.path / "actions.jsonl", "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._last: Optional[np.ndarray] = None     # 上一帧重建结果（差分基准）
+        self._last_key = -1
+        self._count = 0
+        self._offset = 0
+        self._t0 = time.time()
+        self._detach: List[Any] = []
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def _write(self, kind: int, payload: bytes, ts: float) -> int:
+        row = np.zeros(1, dtype=INDEX_DTYPE)
+        if kind == KIND_KEY:
+            self._last_key = self._count
+        row[0] = (ts, self._offset, len(payload), kind, self._last_key)
+        self._frames.write(payload)
+        self._index.write(row.tobytes())
+        self._offset += len(payload)
+        idx = self._count
+        self._count += 1
+        return idx
+
+    def _write_meta(self, shape: Tuple[int, ...]):
+        meta = {"version": STORE_VERSION, "height": shape[0], "width": shape[1],
+                "tile": self.tile, "keyframe_every": self.keyframe_every, "start": self._t0}
+        (self.path / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+    def record(self, bgr: np.ndarray, ts: Optional[float] = None) -> int:
+        """记录一帧全屏 BGR，返回帧号"""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            if self._last is None:
+                self._write_meta(bgr.shape)
+            elif self._last.shape != bgr.shape:
+                raise ValueError(f"帧尺寸变化：{self._last.shape} -> {bgr.shape}")
+            since_key = self._count - self._last_key
+            rects = None if self._last is None or since_key >= self.keyframe_every \
+                else changed_rects(self._last, bgr, self.tile)
+            area = sum(w * h for _x, _y, w, h in rects) if rects is not None else 0
+            if rects is None or area > KEYFRAME_RATIO * bgr.shape[0] * bgr.shape[1]:
+                idx = self._write(KIND_KEY, _encode(bgr), ts)
+            else:
+                idx = self._write(KIND_DIFF, self._diff_payload(bgr, rects), ts)
+            self._last = bgr.copy()
+            return idx
+
+    def record_region(self, region: Tuple[int, int, int, int], patch: np.ndarray,
+                      ts: Optional[float] = None) -> int:
+        """
+        记录一次区域截图：把区域贴到上一帧上作为差分帧（需要已有一帧全屏）
+        区域超出画面的部分裁掉（patch 同步裁剪），完全在画面外时记一个空差分帧
+        距上一个关键帧满 keyframe_every 帧时改存拼好的整帧，与 record 一致
+        """
+        ts = time.time() if ts is None else ts
+        x, y, w, h = region
+        with self._lock:
+            if self._last is None:
+                raise RuntimeError("区域截图前需要先录一帧全屏")
+            H, W = self._last.shape[:2]
+            x0, y0 = max(x, 0), max(y, 0)
+            x1, y1 = min(x + min(w, patch.shape[1]), W), min(y + min(h, patch.shape[0]), H)
+            rects: List[Tuple[int, int, int, int]] = []
+            if x1 > x0 and y1 > y0:
+                patch = patch[y0 - y:y1 - y, x0 - x:x1 - x]
+                old = self._last[y0:y1, x0:x1]
+                rects = [(x0 + rx, y0 + ry, rw, rh) for rx, ry, rw, rh in changed_rects(old, patch, self.tile)]
+                self._last[y0:y1, x0:x1] = patch
+            if self._count - self._last_key >= self.keyframe_every:
+                return self._write(KIND_KEY, _encode(self._last), ts)
+            return self._write(KIND_DIFF, self._diff_payload(self._last, rects), ts)
+
+    @staticmethod
+    def _diff_payload(img: np.ndarray, rects: List[Tuple[int, int, int, int]]) -> bytes:
+        """[n, (x, y, w, h, 长度) * n] int32 头 + 各块 PNG"""
+        blobs = [_encode(img[y:y + h, x:x + w]) for x, y, w, h in rects]
+        head = np.array([len(rects)] + [v for (x, y, w, h), b in zip(rects, blobs)
+                                        for v in (x, y, w, h, len(b))], dtype="<i4")
+        return head.tobytes() + b"".join(blobs)
+
+    def action(self, kind: str, **data):
+        """记录一次操作（时间戳 + 当时最新的帧号）"""
+        rec = {"ts": time.time(), "frame": self._count - 1, "kind": kind, **data}
+        with self._lock:
+            self._actions.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    # ---------------- 接入 ----------------
+    def attach(self, hook_keys: bool = True) -> "SessionRecorder":
+        """截图后端换成录制后端；hook_keys=True 时 pyautogui.press 也被记录"""
+        inner = get_backend()
+        set_backend(RecordingBackend(inner, self), close_old=False)
+        self._detach.append(lambda: set_backend(inner, close_old=False))
+        if hook_keys:
+            import pyautogui
+            press = pyautogui.press
+
+            def recorded_press(keys, *a, **kw):
+                self.action("press", keys=keys)
+                return press(keys, *a, **kw)
+
+            pyautogui.press = recorded_press
+            self._detach.append(lambda: setattr(pyautogui, "press", press))
+        return self
+
+    def close(self):
+        while self._detach:
+            self._detach.pop()()
+        with self._lock:
+            for f in (self._frames, self._index, self._actions):
+                f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class RecordingBackend(CaptureBackend):
+    """包一层真实后端：每次截图都写进帧库"""
+    name = "recording"
+
+    def __init__(self, inner: CaptureBackend, recorder: SessionRecorder):
+        super().__init__()
+        self.inner = inner
+        self.recorder = recorder
+
+    def screen_size(self) -> Tuple[int, int]:
+        return self.inner.screen_size()
+
+    def grab(self, region: Region = None, copy: bool = True) -> np.ndarray:
+        if region is not None and self.recorder.count == 0:
+            self.recorder.record(self.inner.grab(None, copy=False))     # 先录一帧全屏做基准
+        img = self.inner.grab(region, copy=copy)
+        if region is None:
+            self.recorder.record(img)
+        else:
+            self.recorder.record_region(region, img)
+        return img
+
+    def close(self):
+        self.inner.close()
+        super().close()
+
+
+# ================= 读取 =================
+def is_store(path: Union[str, Path]) -> bool:
+    path = Path(path)
+    return (path / "meta.json").exists() and (path / "index.bin").exists()
+
+
+class FrameStore:
+    """
+    帧库读取：frames.bin / index.bin 内存映射，按帧号重建
+    顺序读取时复用上一帧，只叠加一个差分
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.meta: Dict[str, Any] = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+        n = (self.path / "index.bin").stat().st_size // INDEX_DTYPE.itemsize
+        self.index = np.memmap(self.path / "index.bin", dtype=INDEX_DTYPE, mode="r", shape=(n,)) \
+            if n else np.zeros(0, dtype=INDEX_DTYPE)
+        size = (self.path / "frames.bin").stat().st_size
+        self._blob = np.memmap(self.path / "frames.bin", dtype=np.uint8, mode="r") if size else None
+        self._cur_idx = -1
+        self._cur: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.meta["height"], self.meta["width"]
+
+    def timestamps(self) -> np.ndarray:
+        return np.asarray(self.index["ts"])
+
+    def actions(self) -> List[Dict[str, Any]]:
+        path = self.path / "actions.jsonl"
+        if not path.exists():
+            return []
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _payload(self, i: int) -> np.ndarray:
+        row = self.index[i]
+        off, n = int(row["offset"]), int(row["length"])
+        return self._blob[off:off + n]
+
+    def _apply(self, img: np.ndarray, i: int):
+        buf = self._payload(i)
+        n = int(np.frombuffer(buf[:4], dtype="<i4")[0])
+        head = np.frombuffer(buf[4:4 + 20 * n], dtype="<i4").reshape(n, 5)
+        pos = 4 + 20 * n
+        for x, y, w, h, ln in head:
+            img[y:y + h, x:x + w] = _decode(buf[pos:pos + ln]).reshape(h, w, -1)
+            pos += ln
+
+    def frame(self, i: int) -> np.ndarray:
+        """第 i 帧全屏 BGR（只读，调用方需要改写时请 copy）"""
+        if not 0 <= i < len(self):
+            raise IndexError(f"帧号越界：{i}")
+        with self._lock:
+            if self._cur_idx == i:
+                return self._cur
+            key = int(self.index[i]["key"])
+            if self._cur is not None and key <= self._cur_idx < i:
+                img, start = self._cur.copy(), self._cur_idx + 1     # 接着上一帧往后叠
+            else:
+                img, start = _decode(self._payload(key)), key + 1
+            for j in range(start, i + 1):
+                self._apply(img, j)
+            img.flags.writeable = False
+            self._cur_idx, self._cur = i, img
+            return img
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for i in range(len(self)):
+            yield self.frame(i)
+
+
+class StoreBackend(CaptureBackend):
+    """
+    从帧库回放的截图后端
+    advance="every"：每次截图（含区域截图）前进一帧，重现录制时的截图序列
+    advance="full"：只有全屏截图前进，区域截图裁当前帧（同 ReplayBackend）
+    rate=None 全速；rate=每秒帧数；realtime=True 按录制时间戳（speed 为倍速）
+    """
+    name = "store"
+
+    def __init__(self, source: Union[str, Path], loop: bool = False, advance: str = "every",
+                 rate: Optional[float] = None, realtime: bool = False, speed: float = 1.0):
+        super().__init__()
+        self.store = FrameStore(source)
+        if not len(self.store):
+            raise FileNotFoundError(f"帧库为空：{source}")
+        self.loop = loop
+        self.advance = advance
+        self.rate = rate
+        self.realtime = realtime
+        self.speed = speed
+        self._idx = -1
+        self._t_start: Optional[float] = None
+
+    @property
+    def index(self) -> int:
+        return self._idx
+
+    def _pace(self, i: int):
+        if self._t_start is None:
+            self._t_start = time.perf_counter()
+            return
+        if self.realtime:
+            ts = self.store.index["ts"]
+            due = (float(ts[i]) - float(ts[0])) / self.speed
+        elif self.rate:
+            due = i / self.rate
+        else:
+            return
+        delay = self._t_start + due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def next_frame(self) -> np.ndarray:
+        nxt = self._idx + 1
+        if nxt >= len(self.store):
+            if not self.loop:
+                raise EOFError("帧库已回放完")
+            nxt, self._t_start = 0, None
+        self._pace(nxt)
+        self._idx = nxt
+        return self.store.frame(nxt)
+
+    def grab(self, region: Region = None, copy: bool = True) -> np.ndarray:
+        if self._idx < 0 or region is None or self.advance == "every":
+            img = self.next_frame()
+        else:
+            img = self.store.frame(self._idx)
+        if region is not None:
+            x, y, w, h = region
+            img = img[y:y + h, x:x + w]
+        return img.copy() if copy else img
+
+
+# ---------- 命令行 ----------
+def _cmd_record(args):
+    from tools.trace import setup_logging
+    setup_logging()
+    with SessionRecorder(args.out, args.keyframe_every) as rec:
+        rec.attach(hook_keys=not args.no_keys)
+        backend = get_backend()
+        period = 1.0 / args.fps
+        end = time.time() + args.seconds
+        print(f"[REC] 录制到 {args.out}，{args.fps} fps，{args.seconds}s，Ctrl+C 提前结束")
+        try:
+            while time.time() < end:
+                t0 = time.perf_counter()
+                backend.grab(copy=False)
+                time.sleep(max(period - (time.perf_counter() - t0), 0))
+        except KeyboardInterrupt:
+            pass
+        print(f"[REC] 共 {rec.count} 帧")
+
+
+def _cmd_info(args):
+    store = FrameStore(args.path)
+    kinds = np.asarray(store.index["kind"])
+    ts = store.timestamps()
+    size = (store.path / "frames.bin").stat().st_size
+    dur = float(ts[-1] - ts[0]) if len(ts) > 1 else 0.0
+    print(f"帧数：{len(store)}（关键帧 {int((kinds == KIND_KEY).sum())}），"
+          f"时长 {dur:.1f}s，尺寸 {store.shape[1]}×{store.shape[0]}，"
+          f"帧数据 {size / 1e6:.1f}MB（平均每帧 {size / max(len(store), 1) / 1e3:.1f}KB），"
+          f"操作 {len(store.actions())} 次")
+
+
+def _cmd_bench(args):
+    """全速回放整个帧库，逐帧做场景 + 敌人意图识别，报告端到端吞吐"""
+    from tools import trace
+    from tools.config import SCENE_MAP
+    from tools.frame import Frame
+    from tools.match_scene import match_current_scene
+    from tools.match_enemy import scan_intents
+    set_backend(StoreBackend(args.path, advance="full"))
+    backend = get_backend()
+    trace.enable()
+    n, t0 = 0, time.perf_counter()
+    try:
+        while args.limit <= 0 or n < args.limit:
+            with trace.span("recorder.tick"):
+                frame = Frame(bgr=backend.grab(copy=False))
+                scene = match_current_scene(frame)
+                if scene == SCENE_MAP["battle"][0]:
+                    scan_intents(frame)
+            n += 1
+    except EOFError:
+        pass
+    dt = time.perf_counter() - t0
+    print(f"[BENCH] {n} 帧，{dt:.2f}s，{n / dt if dt else 0:.2f} 帧/秒")
+    print(trace.summary())
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="会话录制 / 帧库工具")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("record", help="录制当前屏幕")
+    p.add_argument("out")
+    p.add_argument("--fps", type=float, default=10)
+    p.add_argument("--seconds", type=float, default=600)
+    p.add_argument("--keyframe-every", type=int, default=KEYFRAME_EVERY)
+    p.add_argument("--no-keys", action="store_true", help="不记录 pyautogui 按键")
+    p.set_defaults(fn=_cmd_record)
+    p = sub.add_parser("info", help="帧库概况")
+    p.add_argument("path")
+    p.set_defaults(fn=_cmd_info)
+    p = sub.add_parser("bench", help="全速回放并识别，报告吞吐")
+    p.add_argument("path")
+    p.add_argument("--limit", type=int, default=0)
+    p.set_defaults(fn=_cmd_bench)
+    args = ap.parse_args()
+    args.fn(args)
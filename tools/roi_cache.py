@@ -0,0 +1,98 @@
+"""
+ROI 结果缓存：按 ROI 像素内容的哈希记住识别结果
+HP、金币、卡牌能量角标等区域大多数回合不变，命中缓存就跳过 OCR / 模板匹配
+tolerant=True 时用缩小 + 量化后的感知哈希，对轻微噪点 / 动画抖动不敏感
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from tools.config import ROI_CACHE_SIZE
+
+PHASH_SIZE = 16        # 感知哈希缩放到的边长
+PHASH_SHIFT = 3        # 量化：灰度右移位数（256 -> 32 级）
+
+
+def roi_hash(patch: np.ndarray) -> bytes:
+    """像素精确哈希（含尺寸）"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.asarray(patch.shape, dtype=np.int32).tobytes())
+    h.update(np.ascontiguousarray(patch))
+    return h.digest()
+
+
+def roi_phash(patch: np.ndarray) -> bytes:
+    """感知哈希：缩到 PHASH_SIZE 见方、转灰度、量化后取字节"""
+    gray = patch if patch.ndim == 2 else cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (PHASH_SIZE, PHASH_SIZE), interpolation=cv2.INTER_AREA)
+    return (small >> PHASH_SHIFT).tobytes()
+
+
+class RoiCache:
+    """
+    有界 LRU
+    cache.memo("ocr:player_hp", patch, lambda: 读数)
+    """
+
+    def __init__(self, maxsize: int = ROI_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Tuple[Hashable, bytes], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(namespace: Hashable, patch: np.ndarray, tolerant: bool = False) -> Tuple[Hashable, bytes]:
+        return namespace, (roi_phash(patch) if tolerant else roi_hash(patch))
+
+    def get(self, key: Tuple[Hashable, bytes]) -> Tuple[bool, Any]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Tuple[Hashable, bytes], value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def memo(self, namespace: Hashable, patch: np.ndarray, fn: Callable[[], Any],
+             tolerant: bool = False) -> Any:
+        """命中直接返回缓存值，否则调用 fn() 并缓存"""
+        key = self.key(namespace, patch, tolerant)
+        hit, value = self.get(key)
+        if hit:
+            return value
+        value = fn()
+        self.put(key, value)
+        return value
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data),
+                "hit_rate": self.hits / total if total else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+
+# ================= 进程级单例 =================
+_CACHE: Optional[RoiCache] = None
+
+
+def get_cache() -> RoiCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = RoiCache()
+    return _CACHE
@@ -0,0 +1,188 @@
+"""
+场景引擎：按转移图排序候选 + 缩略直方图预筛 + 命中即停
+检查顺序：上一场景 -> 它的后继场景 -> 预筛通过的其余场景 -> 预筛没通过的场景全图匹配
+稳态下（场景不变或按转移图切换）每次只需 1–2 次模板匹配
+引擎有状态（上一场景、位置记忆），detect / reset 加锁，多线程共用同一个实例
+"""
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from tools.config import SCENE_MAP, SCENE_TRANSITIONS, MATCH_THRESHOLD, SCENE_COARSE_SLACK, SCENE_PYRAMID_SCALE
+from tools.img_tool import match_pyramid
+from tools.frame import Frame, ensure_frame
+from tools.tpl_bank import get_bank
+from tools.trace import traced
+
+LOCAL_PAD = 8               # 已知位置附近的局部匹配窗口边距
+HIST_BINS = 32
+HIST_CUT = 0.5              # Bhattacharyya 距离超过它视为预筛不通过
+REFRESH_EVERY = 30          # 每隔多少次调用，上一场景 / 后继场景即使预筛不通过也按原顺序匹配
+_UNKNOWN = 2.0              # 位置未知、无法预筛时的排序距离（Bhattacharyya 距离最大为 1）
+
+
+class SceneResult(NamedTuple):
+    key: Optional[str]      # SCENE_MAP 的键
+    name: Optional[str]     # 中文名
+    score: float
+    step: str               # 决定结果的环节：prev / successor / prescreen / full_scan / none
+    matches: int            # 本次调用的 matchTemplate 次数
+
+
+def _hist(img: np.ndarray) -> np.ndarray:
+    h = cv2.calcHist([img], [0], None, [HIST_BINS], [0, 256])
+    return cv2.normalize(h, h, 1.0, 0.0, cv2.NORM_L1)
+
+
+class SceneEngine:
+    """
+    有状态的场景识别器
+    engine = SceneEngine()
+    res = engine.detect(frame)   # -> SceneResult
+    """
+
+    def __init__(self, transitions: Optional[Dict[str, List[str]]] = None,
+                 threshold: float = MATCH_THRESHOLD,
+                 hist_cut: float = HIST_CUT, refresh_every: int = REFRESH_EVERY):
+        self.transitions = transitions if transitions is not None else SCENE_TRANSITIONS
+        self.threshold = threshold
+        self.hist_cut = hist_cut
+        self.refresh_every = refresh_every
+        self.prev: Optional[str] = None
+        self._loc: Dict[str, Tuple[int, int]] = {}          # 模板上次命中的左上角
+        self._tpl_hist: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}   # key -> (模板, 直方图)
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.prev = None
+            self._loc.clear()
+            self._calls = 0
+
+    # ---------------- 预筛 ----------------
+    def _prescreen(self, gray: np.ndarray, key: str, tpl: np.ndarray) -> Optional[float]:
+        """模板已知位置处的直方图距离；位置未知返回 None（无法预筛）"""
+        loc = self._loc.get(key)
+        if loc is None:
+            return None
+        x, y = loc
+        th, tw = tpl.shape[:2]
+        patch = gray[y:y + th, x:x + tw]
+        if patch.shape[:2] != (th, tw):
+            return None
+        cached = self._tpl_hist.get(key)
+        if cached is None or cached[0] is not tpl:       # 模板被重载后重新计算
+            cached = self._tpl_hist[key] = (tpl, _hist(tpl))
+        return float(cv2.compareHist(cached[1], _hist(patch), cv2.HISTCMP_BHATTACHARYYA))
+
+    # ---------------- 匹配 ----------------
+    def _match(self, frame: Frame, key: str, tpl: np.ndarray, local: bool) -> Tuple[float, int]:
+        """返回 (相似度, matchTemplate 次数)；local=True 时只在已知位置附近匹配"""
+        gray = frame.gray
+        loc = self._loc.get(key)
+        n = 0
+        if local and loc is not None:
+            th, tw = tpl.shape[:2]
+            x0, y0 = max(loc[0] - LOCAL_PAD, 0), max(loc[1] - LOCAL_PAD, 0)
+            sub = gray[y0:loc[1] + th + LOCAL_PAD, x0:loc[0] + tw + LOCAL_PAD]
+            if sub.shape[0] >= th and sub.shape[1] >= tw:
+                n += 1
+                _, val, _, l = cv2.minMaxLoc(cv2.matchTemplate(sub, tpl, cv2.TM_CCOEFF_NORMED))
+                if val >= self.threshold:
+                    self._loc[key] = (x0 + l[0], y0 + l[1])
+                    return float(val), n
+        reject_below = self.threshold - SCENE_COARSE_SLACK
+        score, l = match_pyramid(gray, tpl, SCENE_PYRAMID_SCALE, levels=frame.levels(),
+                                 reject_below=reject_below)
+        n += 1 if score < reject_below else 2          # 粗匹配被拒就没有精修
+        if score >= self.threshold:
+            self._loc[key] = l
+        return score, n
+
+    def _order(self) -> List[Tuple[str, str]]:
+        """[(key, 环节), ...]：上一场景、后继场景、其余场景"""
+        order: List[Tuple[str, str]] = []
+        seen = set()
+        if self.prev is not None:
+            order.append((self.prev, "prev"))
+            seen.add(self.prev)
+            for nxt in self.transitions.get(self.prev, []):
+                if nxt not in seen and nxt in SCENE_MAP:
+                    order.append((nxt, "successor"))
+                    seen.add(nxt)
+        order.extend((key, "full_scan") for key in SCENE_MAP if key not in seen)
+        return order
+
+    @traced("scene.detect")
+    def detect(self, frame: Optional[Frame] = None) -> SceneResult:
+        frame = ensure_frame(frame)
+        with self._lock:
+            return self._detect(frame)
+
+    def _detect(self, frame: Frame) -> SceneResult:
+        bank = get_bank()
+        gray = frame.gray
+        self._calls += 1
+        refresh = self.refresh_every > 0 and self._calls % self.refresh_every == 0
+
+        matches = 0
+        deferred: List[Tuple[str, np.ndarray]] = []      # 预筛没通过的模板，最后再查
+        rest: List[Tuple[float, str, np.ndarray]] = []   # (预筛距离, key, 模板)
+
+        for key, step in self._order():
+            tpl = bank.get("scene", key)
+            if tpl is None:
+                continue
+            dist = self._prescreen(gray, key, tpl)
+            if step == "full_scan":
+                if dist is None:
+                    rest.append((_UNKNOWN, key, tpl))
+                elif dist <= self.hist_cut:
+                    rest.append((dist, key, tpl))
+                else:
+                    deferred.append((key, tpl))
+                continue
+            # prev / successor：预筛明显不像就先跳过，留到最后
+            if dist is not None and dist > self.hist_cut and not refresh:
+                deferred.append((key, tpl))
+                continue
+            score, n = self._match(frame, key, tpl, local=True)
+            matches += n
+            if score >= self.threshold:
+                return self._hit(key, score, step, matches)
+
+        # 预筛通过的排前面（距离小的优先），位置未知的排在后面
+        rest.sort(key=lambda t: t[0])
+        for dist, key, tpl in rest:
+            known = dist < _UNKNOWN
+            score, n = self._match(frame, key, tpl, local=known)
+            matches += n
+            if score >= self.threshold:
+                return self._hit(key, score, "prescreen" if known else "full_scan", matches)
+
+        # 前面都没命中：预筛没通过的模板也做全图匹配（进入了转移图里没有的场景）
+        for key, tpl in deferred:
+            score, n = self._match(frame, key, tpl, local=False)
+            matches += n
+            if score >= self.threshold:
+                return self._hit(key, score, "full_scan", matches)
+
+        return SceneResult(None, None, 0.0, "none", matches)
+
+    def _hit(self, key: str, score: float, step: str, matches: int) -> SceneResult:
+        self.prev = key
+        return SceneResult(key, SCENE_MAP[key][0], score, step, matches)
+
+
+# ================= 进程级单例 =================
+_ENGINE: Optional[SceneEngine] = None
+
+
+def get_engine() -> SceneEngine:
+    global _ENGINE
+    if _ENGINE is None:
+        _ENGINE = SceneEngine()
+    return _ENGINE
@@ -0,0 +1,248 @@
+"""
+模板库：进程内共享，每张模板只解码一次
+按 config.py 中的映射表分组，灰度 / BGR 两份连续数组常驻内存，
+模板文件 mtime 变化时自动重新加载
+scale != 1 时（布局见 layout.py）读取预缩放好的模板，缩放结果缓存在 TPL_CACHE_DIR，不在调用时缩放
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from tools.config import (
+    DATA_SCENE, DATA_ENEMY, DATA_CARD, TPL_CACHE_DIR,
+    SCENE_MAP, INTENT_MAP, CARD_KIND_MAP, BIG_ENERGY_MAP, SMALL_ENERGY_MAP,
+)
+from tools.img_tool import RotStack, build_rot_stack, tpl_spectrum
+from tools.trace import span
+
+log = logging.getLogger(__name__)
+
+# 分组名 -> (模板目录, 映射表)
+GROUPS: Dict[str, Tuple[Path, Dict[str, Tuple[str, str]]]] = {
+    "scene": (DATA_SCENE, SCENE_MAP),
+    "enemy": (DATA_ENEMY, INTENT_MAP),
+    "card_kind": (DATA_CARD, CARD_KIND_MAP),
+    "big_energy": (DATA_CARD, BIG_ENERGY_MAP),
+    "small_energy": (DATA_CARD, SMALL_ENERGY_MAP),
+}
+
+# 两次 mtime 检查之间的最小间隔（秒），避免热循环里频繁 stat
+MTIME_CHECK_INTERVAL = 1.0
+# 模板频谱缓存上限（字节），超出按最久未用淘汰
+FFT_CACHE_BYTES = 128 * 1024 * 1024
+
+
+class _Entry:
+    """单张模板的缓存项"""
+    __slots__ = ("path", "mtime", "checked", "gray", "bgr", "rot", "resized")
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.mtime = -1.0
+        self.checked = 0.0
+        self.gray: Optional[np.ndarray] = None
+        self.bgr: Optional[np.ndarray] = None
+        self.rot: Dict[Tuple[int, float], RotStack] = {}   # (step, scale) -> 旋转模板堆叠
+        self.resized: Dict[Tuple[float, bool], np.ndarray] = {}    # (factor, 彩色) -> 再缩放的模板
+
+
+class TemplateBank:
+    """
+    模板库
+    bank.get("scene", "battle")            -> 灰度模板
+    bank.get("enemy", "debuff", color=True) -> BGR 模板
+    bank.items("card_kind")                -> [(key, 中文名, 模板), ...]（缺失文件自动跳过）
+    """
+
+    def __init__(self, groups: Optional[Dict[str, Tuple[Path, Dict[str, Tuple[str, str]]]]] = None,
+                 scale: float = 1.0, cache_dir: Path = TPL_CACHE_DIR):
+        self._groups = groups if groups is not None else GROUPS
+        self.scale = scale
+        self.cache_dir = Path(cache_dir)
+        self._entries: Dict[Path, _Entry] = {}
+        self._warned: set = set()
+        self._lock = threading.RLock()
+        # (路径, fft 尺寸, 是否彩色) -> (模板对象, 频谱)，模板重载后对象不同即失效
+        self._fft: "OrderedDict[Tuple[Path, Tuple[int, int], bool], Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._fft_bytes = 0
+
+    # ---------------- 路径 ----------------
+    def path(self, group: str, key: str) -> Path:
+        folder, mapping = self._groups[group]
+        return folder / mapping[key][1]
+
+    def keys(self, group: str) -> List[str]:
+        return list(self._groups[group][1].keys())
+
+    # ---------------- 加载 ----------------
+    def _entry(self, path: Path) -> Optional[_Entry]:
+        """取缓存项；首次访问或 mtime 变化时重新解码，文件不存在返回 None"""
+        with self._lock:
+            entry = self._entries.get(path)
+            now = time.monotonic()
+            if entry is not None and now - entry.checked < MTIME_CHECK_INTERVAL:
+                return entry
+            try:
+                mtime = path.stat().st_mtime
+            except OSError:
+                if path not in self._warned:
+                    log.warning("模板缺失：%s", path)
+                    self._warned.add(path)
+                self._entries.pop(path, None)
+                return None
+            if entry is None:
+                entry = self._entries[path] = _Entry(path)
+            entry.checked = now
+            if mtime != entry.mtime:
+                with span("tpl_bank.load", path=path.name):
+                    bgr = self._read(path, mtime)
+                if bgr is None:
+                    log.warning("模板无法解码：%s", path)
+                    return None
+                entry.bgr = np.ascontiguousarray(bgr)
+                entry.gray = np.ascontiguousarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY))
+                entry.rot.clear()
+                entry.resized.clear()
+                entry.mtime = mtime
+            return entry
+
+    def _scaled_path(self, path: Path) -> Path:
+        return self.cache_dir / f"x{self.scale:.4f}" / path.parent.name / path.name
+
+    def _read(self, path: Path, mtime: float) -> Optional[np.ndarray]:
+        """读取模板；有缩放时优先读磁盘上比原图新的预缩放版本，没有就缩放一次并写入缓存"""
+        if self.scale == 1.0:
+            return cv2.imread(str(path), cv2.IMREAD_COLOR)
+        cached = self._scaled_path(path)
+        try:
+            if cached.stat().st_mtime >= mtime:
+                img = cv2.imread(str(cached), cv2.IMREAD_COLOR)
+                if img is not None:
+                    return img
+        except OSError:
+            pass
+        src = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if src is None:
+            return None
+        interp = cv2.INTER_AREA if self.scale < 1.0 else cv2.INTER_CUBIC
+        img = cv2.resize(src, None, fx=self.scale, fy=self.scale, interpolation=interp)
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        if not cv2.imwrite(str(cached), img):
+            log.warning("预缩放模板写入失败：%s", cached)
+        return img
+
+    def set_scale(self, scale: float):
+        """切换模板缩放比例（换布局时调用），已加载的模板全部失效"""
+        with self._lock:
+            if scale != self.scale:
+                self.scale = scale
+                self.clear()
+
+    def by_path(self, path: Path, color: bool = False) -> Optional[np.ndarray]:
+        """按文件路径取模板（不在映射表里的零散模板也能共享缓存）"""
+        entry = self._entry(Path(path))
+        if entry is None:
+            return None
+        return entry.bgr if color else entry.gray
+
+    def get(self, group: str, key: str, color: bool = False) -> Optional[np.ndarray]:
+        return self.by_path(self.path(group, key), color)
+
+    def items(self, group: str, color: bool = False) -> List[Tuple[str, str, np.ndarray]]:
+        """按映射表顺序返回 [(key, 中文名, 模板), ...]，缺失模板跳过"""
+        _, mapping = self._groups[group]
+        out = []
+        for key, (cn_name, _file) in mapping.items():
+            tpl = self.get(group, key, color)
+            if tpl is not None:
+                out.append((key, cn_name, tpl))
+        return out
+
+    def rot_stack(self, group: str, key: str, step: int = 15, scale: float = 1.0) -> Optional[RotStack]:
+        """BGR 模板的多角度堆叠（可先缩放），按 (模板, step, scale) 缓存"""
+        entry = self._entry(self.path(group, key))
+        if entry is None:
+            return None
+        with self._lock:
+            rs = entry.rot.get((step, scale))
+            if rs is None:
+                rs = entry.rot[(step, scale)] = build_rot_stack(entry.bgr, step, scale)
+            return rs
+
+    def resized(self, group: str, key: str, factor: float, color: bool = False) -> Optional[np.ndarray]:
+        """
+        在布局比例之上再缩放 factor 倍（手牌扇形里的卡牌等），按 (模板, factor, 彩色) 缓存，
+        识别时不再逐次 resize
+        """
+        entry = self._entry(self.path(group, key))
+        if entry is None:
+            return None
+        src = entry.bgr if color else entry.gray
+        if factor == 1.0:
+            return src
+        with self._lock:
+            t = entry.resized.get((factor, color))
+            if t is None:
+                interp = cv2.INTER_AREA if factor < 1.0 else cv2.INTER_CUBIC
+                t = entry.resized[(factor, color)] = np.ascontiguousarray(
+                    cv2.resize(src, None, fx=factor, fy=factor, interpolation=interp))
+            return t
+
+    def rotated(self, group: str, key: str, step: int = 15) -> List[Tuple[np.ndarray, float]]:
+        """返回 BGR 模板的多角度版本 [(旋转模板, 角度), ...]，0°–360°"""
+        rs = self.rot_stack(group, key, step)
+        if rs is None:
+            return []
+        return [(rs.tpl(i), float(angle)) for i, angle in enumerate(rs.angles)]
+
+    def spectrum(self, group: str, key: str, shape: Tuple[int, int], color: bool = False) -> np.ndarray:
+        """补零到 shape 的零均值模板频谱（供 img_tool.batch_match 使用），有界 LRU 缓存"""
+        path = self.path(group, key)
+        tpl = self.by_path(path, color)
+        if tpl is None:
+            raise KeyError(f"模板缺失：{path}")
+        ck = (path, tuple(shape), color)
+        with self._lock:
+            cached = self._fft.get(ck)
+            if cached is not None and cached[0] is tpl:
+                self._fft.move_to_end(ck)
+                return cached[1]
+            spec = tpl_spectrum(tpl, shape)
+            if cached is not None:
+                self._fft_bytes -= cached[1].nbytes
+            self._fft[ck] = (tpl, spec)
+            self._fft_bytes += spec.nbytes
+            while self._fft_bytes > FFT_CACHE_BYTES and len(self._fft) > 1:
+                _, (_t, old) = self._fft.popitem(last=False)
+                self._fft_bytes -= old.nbytes
+            return spec
+
+    def preload(self) -> int:
+        """一次性加载全部分组，返回成功加载的模板数"""
+        return sum(len(self.items(group)) for group in self._groups)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()             # _warned 按路径记、与比例无关，换布局不再重复告警
+            self._fft.clear()
+            self._fft_bytes = 0
+
+
+# ================= 进程级单例 =================
+_BANK: Optional[TemplateBank] = None
+_BANK_LOCK = threading.Lock()
+
+
+def get_bank() -> TemplateBank:
+    global _BANK
+    if _BANK is None:
+        with _BANK_LOCK:
+            if _BANK is None:
+                _BANK = TemplateBank()
+    return _BANK
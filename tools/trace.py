@@ -0,0 +1,213 @@
+"""
+分阶段计时：嵌套 span + 每阶段滚动直方图 + Chrome trace 导出
+with span("match_scene"):
+    with span("matchTemplate", tpl="battle"):
+        ...
+关闭时 span() 直接返回共享的空上下文，开销只有一次全局变量判断
+开关：config.TRACE_ENABLED，环境变量 STS_TRACE=1 可覆盖；运行中用 enable() / disable()
+导出：export_chrome("trace.json") 用 chrome://tracing 或 ui.perfetto.dev 打开；summary() 文本汇总
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from tools.config import TRACE_ENABLED, TRACE_MAX_EVENTS, TRACE_HIST_WINDOW
+
+_ENABLED = os.environ.get("STS_TRACE", "1" if TRACE_ENABLED else "0") not in ("0", "", "false")
+
+
+class _NoopSpan:
+    """关闭时使用的空上下文（全进程共用一个实例）"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "args", "t0", "tracer")
+
+    def __init__(self, tracer: "Tracer", name: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.t0 = 0
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer._record(self.name, self.t0, time.perf_counter_ns() - self.t0, self.args)
+        return False
+
+    def set(self, **args):
+        """在 span 里补充参数（例如命中的模板名），导出到 trace 的 args"""
+        self.args.update(args)
+
+
+class Tracer:
+    """
+    记录完成的 span：最近 max_events 个事件（导出 trace 用，嵌套关系由时间区间体现）
+    和每个阶段最近 window 次耗时（算分位数用）
+    """
+
+    def __init__(self, max_events: int = TRACE_MAX_EVENTS, window: int = TRACE_HIST_WINDOW):
+        self.window = window
+        self._events: Deque[Tuple[str, int, int, int, Dict[str, Any]]] = deque(maxlen=max_events)
+        self._hist: Dict[str, Deque[int]] = {}
+        self._count: Dict[str, int] = {}
+        self._total: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._t_origin = time.perf_counter_ns()
+
+    def _record(self, name: str, t0: int, dur: int, args: Dict[str, Any]):
+        with self._lock:
+            self._events.append((name, t0, dur, threading.get_ident(), args))
+            hist = self._hist.get(name)
+            if hist is None:
+                hist = self._hist[name] = deque(maxlen=self.window)
+            hist.append(dur)
+            self._count[name] = self._count.get(name, 0) + 1
+            self._total[name] = self._total.get(name, 0) + dur
+
+    def span(self, name: str, **args) -> _Span:
+        return _Span(self, name, args)
+
+    # ---------------- 统计 ----------------
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """{阶段: {count, total_ms, p50_ms, p95_ms, max_ms}}，分位数基于最近 window 次"""
+        with self._lock:
+            snap = {k: (np.fromiter(v, dtype=np.int64), self._count[k], self._total[k])
+                    for k, v in self._hist.items()}
+        out = {}
+        for name, (durs, count, total) in snap.items():
+            ms = durs / 1e6
+            out[name] = {"count": count, "total_ms": total / 1e6,
+                         "p50_ms": float(np.percentile(ms, 50)),
+                         "p95_ms": float(np.percentile(ms, 95)),
+                         "max_ms": float(ms.max())}
+        return out
+
+    def summary(self) -> str:
+        """按总耗时降序的文本表"""
+        rows = sorted(self.stats().items(), key=lambda kv: -kv[1]["total_ms"])
+        lines = [f"{'阶段':<28}{'次数':>8}{'总ms':>12}{'p50ms':>10}{'p95ms':>10}{'maxms':>10}"]
+        for name, s in rows:
+            lines.append(f"{name:<28}{s['count']:>8}{s['total_ms']:>12.1f}"
+                         f"{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['max_ms']:>10.2f}")
+        return "\n".join(lines)
+
+    def chrome_events(self) -> List[Dict[str, Any]]:
+        """Chrome trace-event 格式（完整事件 ph="X"，时间单位微秒）"""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self._events)
+        return [{"name": name, "cat": name.split(".", 1)[0], "ph": "X", "pid": pid, "tid": tid,
+                 "ts": (t0 - self._t_origin) / 1000, "dur": dur / 1000,
+                 "args": {k: _jsonable(v) for k, v in args.items()}}
+                for name, t0, dur, tid, args in events]
+
+    def export_chrome(self, path: Union[str, Path]) -> Path:
+        path = Path(path)
+        path.write_text(json.dumps({"traceEvents": self.chrome_events(),
+                                    "displayTimeUnit": "ms"}, ensure_ascii=False), encoding="utf-8")
+        return path
+
+    def reset(self):
+        with self._lock:
+            self._events.clear()
+            self._hist.clear()
+            self._count.clear()
+            self._total.clear()
+            self._t_origin = time.perf_counter_ns()
+
+
+def _jsonable(v: Any) -> Any:
+    return v if isinstance(v, (int, float, str, bool)) or v is None else str(v)
+
+
+# ================= 进程级单例 / 便捷接口 =================
+_TRACER = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _TRACER
+
+
+def enabled() -> bool:
+    return _ENABLED
+
+
+def enable():
+    global _ENABLED
+    _ENABLED = True
+
+
+def disable():
+    global _ENABLED
+    _ENABLED = False
+
+
+def span(name: str, **args) -> Union[_Span, _NoopSpan]:
+    """计时上下文；关闭时返回共享的空上下文"""
+    if not _ENABLED:
+        return _NOOP
+    return _TRACER.span(name, **args)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """函数装饰器版 span，默认用 模块名.函数名"""
+    def deco(fn: Callable) -> Callable:
+        label = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            if not _ENABLED:
+                return fn(*a, **kw)
+            with _TRACER.span(label):
+                return fn(*a, **kw)
+        return wrapper
+    return deco
+
+
+def summary() -> str:
+    return _TRACER.summary()
+
+
+def export_chrome(path: Union[str, Path]) -> Path:
+    return _TRACER.export_chrome(path)
+
+
+def reset():
+    _TRACER.reset()
+
+
+# ================= 日志 =================
+LOG_FORMAT = "%(asctime)s.%(msecs)03d %(levelname)s %(name)s: %(message)s"
+
+
+def setup_logging(level: Union[int, str, None] = None):
+    """
+    命令行入口调用：识别器内部用 logging（热路径不直接 print）
+    level 默认取环境变量 STS_LOG，未设置时为 INFO
+    """
+    level = level or os.environ.get("STS_LOG", "INFO")
+    logging.basicConfig(level=level, format=LOG_FORMAT, datefmt="%H:%M:%S")
@@ -7,13 +7,15 @@ import mss
 from PIL import Image, ImageTk
 from typing import Dict, Optional
 
-CONFIG_FILE = "roi_config.json"
+# 固定存在脚本旁边（不随工作目录变化），tools/layout.py 会直接读取
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "roi_config.json")
 
 
 class ROITool:
     def __init__(self, root: tk.Tk):
         self.root = root
         root.title("ROI 框选工具（纯 tkinter 版）")
+        self.screen: Dict[str, int] = {}      # 最近一次截图的尺寸，随 ROI 一起保存（见 tools/layout.py）
         self.rois: Dict[str, dict] = self.load_rois()
 
         ttk.Button(root, text="开始识图", command=self.run_selector).pack(pady=6)
@@ -26,12 +28,15 @@ class ROITool:
     def load_rois(self) -> Dict[str, dict]:
         if os.path.isfile(CONFIG_FILE):
             with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
+                rois = json.load(f)
+            self.screen = rois.pop("_meta", {})
+            return rois
         return {}
 
     def save_rois(self):
         with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.rois, f, ensure_ascii=False, indent=2)
+            data = {"_meta": self.screen, **self.rois} if self.screen else self.rois
+            json.dump(data, f, ensure_ascii=False, indent=2)
 
     def refresh_listbox(self):
         self.listbox.delete(0, tk.END)
@@ -50,6 +55,7 @@ class ROITool:
     # ---------------- 框选 ----------------
     def run_selector(self):
         full_img = self.grab_fullscreen()
+        self.screen = {**self.screen, "width": full_img.width, "height": full_img.height}
         roi = self.tk_select_roi(full_img)
         if roi is None:                       # 用户按了 ESC
             messagebox.showinfo("提示", "已取消框选")